@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 
 from datetime import datetime
@@ -30,11 +31,30 @@ def create_app():
     register_blueprints(app)
     register_error_handlers(app)
     register_context_processors(app)
+    register_metrics(app)
+
+    from app.utils.rate_limit import init_rate_limit
+    init_rate_limit(app)
+
+    from app.utils.assets import init_assets
+    init_assets(app)
+
+    from app.utils.compression import init_compression
+    init_compression(app)
+
+    from app.utils.profiling import init_profiling
+    init_profiling(app)
     
-    # Initializing services
+    # Initializing services; their threads start after fork, see app.utils.background
     from app.services.librelane_service import LibreLaneService
     LibreLaneService.init_service(app)
 
+    from app.services.mail_service import MailService
+    MailService.init_app(app)
+
+    from app.utils.background import init_background_services
+    init_background_services(app)
+
     return app
 
 
@@ -50,6 +70,34 @@ def register_blueprints(app):
     app.register_blueprint(api_bp, url_prefix=f"{root}/api")
 
 
+def register_metrics(app):
+    """Registration of the metrics endpoint and request latency tracking"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    from flask import g, request
+    from app.routes.metrics import metrics_bp
+    from app.utils.metrics import REQUEST_LATENCY
+
+    app.register_blueprint(metrics_bp, url_prefix=app.config['APPLICATION_ROOT'])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                request.endpoint or 'unknown',
+                request.method,
+                response.status_code
+            )
+        return response
+
+
 def register_context_processors(app):
     """Registration of context processors"""
     
@@ -70,7 +118,7 @@ def register_context_processors(app):
         from flask import session
         if 'session_id' in session:
             from app.services.run_service import RunService
-            current_run = RunService.get_last_run(session['session_id'])
+            current_run = RunService.get_last_run(session['email'], session['session_id'])
             return dict(current_run=current_run)
         return dict(current_run=None)
 
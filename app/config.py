@@ -23,6 +23,10 @@ class Config:
 
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    # Trust the expiry in the signed session cookie instead of loading the Session
+    # row on every request; logouts and re-logins are found in a cached deny list
+    SESSION_CLAIMS = os.environ.get('SESSION_CLAIMS', 'False').lower() == 'true'
+    SESSION_DENYLIST_REFRESH = float(os.environ.get('SESSION_DENYLIST_REFRESH', 5.0))  # seconds
     
     # File folders
     RUNS_FOLDER = os.path.abspath(os.environ.get('RUNS_FOLDER') or 'runs')
@@ -31,17 +35,170 @@ class Config:
     # File Restrictions
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS = {'json', 'v', 'tar', 'tar.gz'}
+
+    # Chunked uploads (/api/uploads) and project archives
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # below MAX_CONTENT_LENGTH of every configuration
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 512 * 1024 * 1024))
+    UPLOAD_SESSION_TTL = 24 * 60 * 60  # unfinished uploads are removed after it
+    ARCHIVE_MAX_MEMBERS = 20000
+    ARCHIVE_MAX_MEMBER_SIZE = 512 * 1024 * 1024
+    ARCHIVE_MAX_TOTAL_SIZE = int(os.environ.get('ARCHIVE_MAX_TOTAL_SIZE', 2 * 1024 * 1024 * 1024))
+    ARCHIVE_MAX_RATIO = 200  # extracted size / compressed size, above it an archive is a bomb
+    # Extracted from archives, other members are skipped
+    ARCHIVE_ALLOWED_EXTENSIONS = {
+        '.json', '.yaml', '.yml', '.conf', '.tcl', '.sdc', '.cfg',
+        '.v', '.vh', '.sv', '.svh', '.vhd', '.vhdl', '.inc', '.txt', '.hex', '.mem',
+        '.lef', '.def', '.lib', '.gds', '.mag', '.spice', '.spef', '.odb', '.cdl', '.xdc',
+    }
     
     # Logging
     LOG_LEVEL = 'INFO'
     LOG_FORMAT = '%(asctime)s | %(name)s | [%(levelname)s] %(message)s'
     
     # Data processing settings
-    PROCESSING_TIMEOUT = 300  # 5 minutes
+    # Wall-clock limit of a run, after which it is killed and failed; 0 disables it.
+    # Place and route of real designs takes hours, so the default leaves plenty of room
+    PROCESSING_TIMEOUT = int(os.environ.get('PROCESSING_TIMEOUT', 12 * 60 * 60))  # 12 hours
+    CANCEL_GRACE_PERIOD = 10  # seconds between SIGTERM and SIGKILL
     MAX_RECORDS_PER_FILE = 100000
+    MAX_CONCURRENT_RUNS = int(os.environ.get('MAX_CONCURRENT_RUNS', 1))
+
+    # Per-user limits, checked atomically when runs are queued (0 disables a limit)
+    USER_MAX_ACTIVE_RUNS = int(os.environ.get('USER_MAX_ACTIVE_RUNS', 64))  # pending + running runs
+    USER_DAILY_RUN_QUOTA = int(os.environ.get('USER_DAILY_RUN_QUOTA', 200))  # runs created in 24 hours
+
+    # Per-run resource limits
+    RUN_MEMORY_LIMIT_MB = int(os.environ['RUN_MEMORY_LIMIT_MB']) if os.environ.get('RUN_MEMORY_LIMIT_MB') else None
+    RUN_NICE = 10
+    RUN_CPUS_PER_RUN = int(os.environ['RUN_CPUS_PER_RUN']) if os.environ.get('RUN_CPUS_PER_RUN') else None
+    RUN_CPU_POOL = os.environ.get('RUN_CPU_POOL')  # e.g. "2-15", defaults to all available CPUs
+    RUN_CGROUP_PARENT = os.environ.get('RUN_CGROUP_PARENT')  # delegated cgroup v2 directory
+    RUN_DEFAULT_MEMORY_MB = 2048  # prediction for users without history
+    MEMORY_RESERVE_MB = 1024  # kept free for the web process and the OS
+
+    # LibreLane (runs are simulated when LIBRELANE_COMMAND is not set)
+    LIBRELANE_COMMAND = os.environ.get('LIBRELANE_COMMAND')
+    LIBRELANE_BASE_DIR = os.environ.get('LIBRELANE_BASE_DIR', '')
+    # First LibreLane step of each stage, passed as --from when rerunning from a checkpoint
+    LIBRELANE_STAGE_STEPS = {
+        'synthesis': 'Yosys.Synthesis',
+        'placement': 'OpenROAD.Floorplan',
+        'routing': 'OpenROAD.GlobalRouting',
+        'timing': 'OpenROAD.STAPostPNR',
+        'power': 'OpenROAD.IRDropReport',
+    }
+
+    # Execution: 'inline' runs workers inside the web process,
+    # 'external' leaves execution to worker.py processes
+    RUN_EXECUTOR = os.environ.get('RUN_EXECUTOR', 'inline')
+    RUN_LEASE_TTL = 60  # seconds without heartbeat before a run is requeued
+    RUN_HEARTBEAT_INTERVAL = 2  # lease renewal and cancellation check
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 2.0))
+    WORKER_PREFETCH = 100  # pending runs kept in a worker's local scheduler
+    WORKER_PREFETCH_PER_EMAIL = 10  # of which at most this many per user
+    # Inline executor: runs only in the web process holding this lock (default: RUNS_FOLDER/.services.lock)
+    BACKGROUND_SERVICES_LOCK = os.environ.get('BACKGROUND_SERVICES_LOCK')
+    BACKGROUND_SERVICES_RETRY = 30.0  # seconds between takeover attempts of the other processes
+
+    # Run scheduling (all weights are in seconds of waiting)
+    SCHEDULER_PRIORITY_STEP = 600  # one priority level is worth 10 minutes
+    SCHEDULER_FAIR_SHARE_STEP = 300  # per run of the same email already queued
+    SCHEDULER_SJF_ENABLED = os.environ.get('SCHEDULER_SJF_ENABLED', 'False').lower() == 'true'
+    SCHEDULER_SJF_WEIGHT = 1.0  # per second of expected runtime
+    # Users may only lower their runs' priority; the listed emails may raise it up to RUN_PRIORITY_MAX
+    RUN_PRIORITY_MIN = -5
+    RUN_PRIORITY_MAX = 5
+    RUN_PRIORITY_RAISE_EMAILS = {
+        email.strip().lower() for email in os.environ.get('RUN_PRIORITY_RAISE_EMAILS', '').split(',') if email.strip()
+    }
+
+    # Queue estimates in api.status and load shedding of new submissions
+    QUEUE_MAX_BACKLOG = int(os.environ.get('QUEUE_MAX_BACKLOG', 24 * 60 * 60))  # seconds of estimated wait, 0 disables
+    QUEUE_CAPACITY = int(os.environ['QUEUE_CAPACITY']) if os.environ.get('QUEUE_CAPACITY') else None  # slots of all workers
+    QUEUE_ESTIMATE_REFRESH = 5.0  # seconds a process reuses its queue snapshot
+    QUEUE_ESTIMATE_HISTORY = 200  # recent completed timings per stage
+    
+    # Log viewer
+    LOG_PAGE_SIZE = 500  # lines per page by default
+    LOG_PAGE_MAX = 2000
+    LOG_SEARCH_SCAN_LIMIT = 50000  # lines searched per request before returning a cursor
+    LOG_SEARCH_MAX_PATTERN = 200
+    LOG_SEARCH_TIME_LIMIT = 2.0  # seconds of searching per request, then a cursor is returned
+    LOG_SEARCH_REGEX_LINE = 4096  # characters of a line a regex sees when re2 is not installed
+    
+    # Logs of finished runs are stored in compressed blocks ('zlib', 'zstd' or '' to keep raw text)
+    LOG_COMPRESSION = os.environ.get('LOG_COMPRESSION', 'zlib')
+    LOG_COMPRESSION_LEVEL = None  # codec default
+    LOG_BLOCK_SIZE = 256 * 1024  # characters per block
+    
+    # Downloads: '' serves files from Python, 'x-accel-redirect' (nginx) or
+    # 'x-sendfile' (Apache, lighttpd) hand the transfer over to the front proxy
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '')
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-runs')  # internal location for RUNS_FOLDER
+    
+    # Results browser
+    RESULTS_LIST_LIMIT = 1000  # entries per directory page
+    RESULTS_PREVIEW_BYTES = 64 * 1024
+
+    # Run metrics
+    METRICS_COMPARE_MAX_RUNS = 200
+    METRICS_TREND_MAX_RUNS = 1000
+
+    # Run history (/api/runs)
+    RUN_HISTORY_PAGE_SIZE = 50
+    RUN_HISTORY_MAX_PAGE_SIZE = 500
+
+    # Parameter sweeps
+    SWEEP_MAX_RUNS = int(os.environ.get('SWEEP_MAX_RUNS', 64))  # child runs per sweep
     
     # API settings
-    API_RATE_LIMIT = "100 per hour"
+    API_RATE_LIMIT = os.environ.get('API_RATE_LIMIT', "100 per hour")  # default for every api.* endpoint
+
+    # Rate limiting: token buckets per endpoint and session (IP for anonymous clients)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'memory')  # 'memory' (per process) or 'sqlite' (shared)
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')  # default: /dev/shm
+    RATE_LIMITS = {
+        # Polled by the status, logs and header scripts every 1-3 seconds
+        'api.status': '120 per minute',
+        'api.logs': '60 per minute',
+        'api.log_lines': '120 per minute',
+        'api.results_tree': '600 per hour',
+        'api.results_preview': '600 per hour',
+        'api.results_file': '600 per hour',
+        'api.upload': '30 per hour',
+        'api.run_history': '600 per hour',
+        # One request per UPLOAD_CHUNK_SIZE of a chunked upload
+        'api.create_upload': '60 per hour',
+        'api.upload_chunk': '6000 per hour',
+        'api.upload_status': '600 per hour',
+        'api.create_sweep': '10 per hour',
+        'api.rerun': '30 per hour',
+    }
+
+    # Monitoring
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # scrapers send `Authorization: Bearer <token>`
+
+    # Request profiling
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))  # seconds
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0))  # 0.0-1.0
+    PROFILING_DIR = os.path.abspath(os.environ.get('PROFILING_DIR') or 'logs/profiles')
+
+    # Static assets: bundles are built into ASSETS_DIR when ASSETS_BUNDLE is on,
+    # unset means "bundle unless DEBUG"
+    ASSETS_BUNDLE = os.environ['ASSETS_BUNDLE'].lower() == 'true' if os.environ.get('ASSETS_BUNDLE') else None
+    ASSETS_DIR = os.path.join(ROOT_PATH, 'static', 'dist')
+
+    # Response compression
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_MIN_SIZE = 1024  # bytes, smaller responses are sent as is
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = {
+        'application/json', 'application/msgpack', 'text/plain',
+        'text/html', 'text/css', 'text/javascript', 'application/javascript'
+    }
 
     # Email (for send magic links)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -50,6 +207,15 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@librelane.example.com')
+    # Without MAIL_ENABLED the magic link is only shown on the login page
+    MAIL_ENABLED = os.environ.get('MAIL_ENABLED', 'False').lower() == 'true'
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', 'False').lower() == 'true'  # SMTPS, e.g. port 465
+    MAIL_TIMEOUT = 10  # seconds per SMTP operation
+    MAIL_QUEUE_SIZE = 1000
+    MAIL_BATCH_SIZE = 50  # messages sent over one connection before checking the queue again
+    MAIL_IDLE_TIMEOUT = 30  # seconds an unused SMTP connection stays open
+    MAIL_MAX_ATTEMPTS = 5
+    MAIL_RETRY_BACKOFF = 2.0  # seconds, doubled after every failed attempt
     
     @staticmethod
     def init_app(app):
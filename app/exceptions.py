@@ -1,7 +1,10 @@
 class FileValidationError(Exception):
     """Custom exception for validation errors"""
     def __init__(self, message, details=None):
-        super().__init__(message, code=400, details=details)
+        super().__init__(message)
+        self.message = message
+        self.code = 400
+        self.details = details
 
 
 class ProcessingError(Exception):
@@ -13,19 +16,38 @@ class ProcessingError(Exception):
 
 
 class RunLimitExceededError(Exception):
-    """The limit of simultaneous launches has been exceeded"""
-    def __init__(self, message="You already have an active run", details=None):
-        super().__init__(message, code=429, details=details)
+    """The user's limit of queued or daily runs has been exceeded"""
+    def __init__(self, message="Run limit exceeded", details=None, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.code = 429
+        self.details = details
+        self.retry_after = retry_after  # seconds until a run fits again, if known
+
+
+class QueueFullError(Exception):
+    """The estimated backlog is too long to accept more runs"""
+    def __init__(self, message="The queue is full", details=None, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.code = 503
+        self.details = details
+        self.retry_after = retry_after  # seconds until the backlog is expected to fit again
 
 
 class SessionExpiredError(Exception):
     """Session expired"""
     def __init__(self, message="Session expired", details=None):
-        super().__init__(message, code=401, details=details)
+        super().__init__(message)
+        self.message = message
+        self.code = 401
+        self.details = details
 
 
 class InvalidTokenError(Exception):
     """Invalid token"""
     def __init__(self, message="Invalid token", details=None):
-        super().__init__(message, code=401, details=details)
-
+        super().__init__(message)
+        self.message = message
+        self.code = 401
+        self.details = details
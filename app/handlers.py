@@ -74,16 +74,63 @@ def register_error_handlers(app):
     @app.errorhandler(429)
     def too_many_requests_error(error):
         """Error 429 - Too many requests"""
-        logger.warning(f' Too many requests from {request.remote_addr}')
+        logger.warning(f' Too many requests from {request.remote_addr} to {request.endpoint}')
         
-        if request.is_json:
-            return jsonify({
+        retry_after = getattr(error, 'retry_after', None)
+        if request.is_json or request.blueprint == 'api':
+            response = jsonify({
                 'error': 'Too many requests',
                 'message': 'Rate limit exceeded. Please try again later.',
+                'retry_after': retry_after,
                 'code': 429
-            }), 429
-        
-        return render_template('errors/429.html'), 429
+            })
+        else:
+            response = app.make_response(render_template('errors/429.html', retry_after=retry_after))
+        
+        response.status_code = 429
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    @app.errorhandler(RunLimitExceededError)
+    def run_limit_error(error):
+        """A per-user run limit (QuotaService) - 429 with Retry-After for the daily quota"""
+        logger.info(f'Run limit exceeded for {request.endpoint}: {error.message}')
+
+        if request.is_json or request.blueprint == 'api':
+            response = jsonify({
+                'success': False,
+                'error': error.message,
+                'details': error.details,
+                'retry_after': error.retry_after,
+                'code': 429
+            })
+        else:
+            response = app.make_response(render_template('errors/429.html', retry_after=error.retry_after))
+
+        response.status_code = 429
+        if error.retry_after is not None:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    @app.errorhandler(QueueFullError)
+    def queue_full_error(error):
+        """Load shedding at submit time (QueueService) - 503 with Retry-After"""
+        if request.is_json or request.blueprint == 'api':
+            response = jsonify({
+                'success': False,
+                'error': error.message,
+                'details': error.details,
+                'retry_after': error.retry_after,
+                'code': 503
+            })
+        else:
+            response = app.make_response(render_template('errors/503.html'))
+
+        response.status_code = 503
+        if error.retry_after is not None:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
 
     @app.errorhandler(500)
     def internal_error(error):
@@ -4,6 +4,9 @@ import json
 from datetime import datetime
 
 from app import db
+from app.models.run_log_block import RunLogBlock
+from app.models.run_metric import RunMetric  # noqa: F401 (registers the table)
+from app.models.sweep import Sweep  # noqa: F401
 
 
 class RunStatus(enum.Enum):
@@ -24,7 +27,17 @@ class RunStage(enum.Enum):
     FINISHED = 'finished'
 
 
+STAGE_VALUES = tuple(stage.value for stage in RunStage)
+
+
 class Run(db.Model):
+    __table_args__ = (
+        db.Index('ix_run_status_created', 'status', 'created_at'),
+        # Run history pages (RunService.get_run_history)
+        db.Index('ix_run_email_created', 'email', 'created_at', 'id'),
+        db.Index('ix_run_email_status_created', 'email', 'status', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), nullable=False, index=True)
     session_id = db.Column(db.Integer, db.ForeignKey('session.id'))
@@ -33,20 +46,40 @@ class Run(db.Model):
     config_filename = db.Column(db.String(200))
     sources_filenames = db.Column(db.Text, default='[]')
     archive_filename = db.Column(db.String(200))
+    archive_etag = db.Column(db.String(64))  # sha256 архива
+    design_name = db.Column(db.String(200))  # DESIGN_NAME из конфигурации
+
+    # Параметрический перебор (sweep)
+    sweep_id = db.Column(db.Integer, db.ForeignKey('sweep.id'), index=True)
+    sweep_params = db.Column(db.Text)  # JSON значений сетки для этого запуска
+
+    # Перезапуск с контрольной точки стадии
+    parent_run_id = db.Column(db.Integer, db.ForeignKey('run.id'), index=True)
+    rerun_from_stage = db.Column(db.Enum(RunStage))
     
     # Статус выполнения
     status = db.Column(db.Enum(RunStatus), default=RunStatus.PENDING)
     current_stage = db.Column(db.Enum(RunStage), default=RunStage.NONE)
     completed_stages = db.Column(db.Text, default='[]')  # JSON список выполненных стадий
     progress = db.Column(db.Integer, default=0)  # 0-100%
+    priority = db.Column(db.Integer, default=0)  # выше - раньше в очереди
+    
+    # Аренда запуска исполнителем (worker)
+    lease_owner = db.Column(db.String(120))
+    lease_expires_at = db.Column(db.DateTime)
+    
+    # Ресурсы
+    resource_limits = db.Column(db.Text)  # JSON применённых ограничений
+    peak_memory_mb = db.Column(db.Integer)
     
     # Временные метки
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Логи
+    # Логи (после завершения запуска хранятся сжатыми в RunLogBlock)
     log_content = db.Column(db.Text)
+    log_compressed = db.Column(db.Boolean, default=False, nullable=False)
     
     # Связи
     session = db.relationship('Session', backref=db.backref('runs', lazy=True))
@@ -59,6 +92,18 @@ class Run(db.Model):
     def completed_stages_list(self, value):
         self.completed_stages = json.dumps(value)
     
+    @property
+    def log_length(self):
+        if self.log_compressed:
+            return RunLogBlock.total_length(self.id)
+        return len(self.log_content or '')
+    
+    def read_log(self, start=0, end=None):
+        """Part of the log, compressed logs decompress only the blocks needed"""
+        if self.log_compressed:
+            return RunLogBlock.read(self.id, start, end)
+        return (self.log_content or '')[start:end]
+    
     @property
     def duration(self):
         if self.start_time and self.end_time:
@@ -69,15 +114,9 @@ class Run(db.Model):
     
     @property
     def pending_stages(self):
-        all_stages = [stage for stage in RunStage]
-        completed = self.completed_stages_list
-        current = self.current_stage.value
-        
-        pending = []
-        for stage in all_stages:
-            if stage.value not in completed and stage.value != current:
-                pending.append(stage.value)
-        return pending
+        done = set(self.completed_stages_list)
+        done.add(self.current_stage.value)
+        return [value for value in STAGE_VALUES if value not in done]
     
     @property
     def f_completed(self):
@@ -94,19 +133,40 @@ class Run(db.Model):
         """Запуск завершен (успешно или с ошибкой)"""
         return self.status in [RunStatus.COMPLETED, RunStatus.FAILED, RunStatus.CANCELLED]
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'status': self.status.value,
-            'current_stage': self.current_stage.value,
-            'completed_stages': self.completed_stages_list,
-            'pending_stages': self.pending_stages,
-            'progress': self.progress,
-            'start_time': self.start_time.isoformat() if self.start_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None,
-            'duration': str(self.duration) if self.duration else None,
-            'log_content': self.log_content,
-            'is_finished': self.is_finished,
-            'is_running': self.is_running
-        }
+    # Поля to_dict вычисляются только по запросу
+    DICT_FIELDS = {
+        'id': lambda run: run.id,
+        'status': lambda run: run.status.value,
+        'current_stage': lambda run: run.current_stage.value,
+        'completed_stages': lambda run: run.completed_stages_list,
+        'pending_stages': lambda run: run.pending_stages,
+        'progress': lambda run: run.progress,
+        'priority': lambda run: run.priority,
+        'design_name': lambda run: run.design_name,
+        'sweep_id': lambda run: run.sweep_id,
+        'sweep_params': lambda run: json.loads(run.sweep_params) if run.sweep_params else None,
+        'parent_run_id': lambda run: run.parent_run_id,
+        'rerun_from_stage': lambda run: run.rerun_from_stage.value if run.rerun_from_stage else None,
+        'created_at': lambda run: run.created_at.isoformat() if run.created_at else None,
+        'start_time': lambda run: run.start_time.isoformat() if run.start_time else None,
+        'end_time': lambda run: run.end_time.isoformat() if run.end_time else None,
+        'duration': lambda run: str(run.duration) if run.duration else None,
+        'resource_limits': lambda run: json.loads(run.resource_limits) if run.resource_limits else None,
+        'peak_memory_mb': lambda run: run.peak_memory_mb,
+        'log_content': lambda run: run.read_log() if run.log_compressed else run.log_content,
+        'is_finished': lambda run: run.is_finished,
+        'is_running': lambda run: run.is_running
+    }
+
+    # Поля истории запусков: без логов и JSON-полей ресурсов
+    HISTORY_FIELDS = (
+        'id', 'status', 'current_stage', 'progress', 'priority', 'design_name', 'sweep_id',
+        'parent_run_id', 'rerun_from_stage', 'created_at', 'start_time', 'end_time', 'duration',
+        'peak_memory_mb', 'is_finished'
+    )
+
+    def to_dict(self, fields=None):
+        if fields is None:
+            fields = self.DICT_FIELDS
+        return {name: self.DICT_FIELDS[name](self) for name in fields}
 
@@ -0,0 +1,58 @@
+from sqlalchemy import select
+
+from app import db
+from app.utils.compression import decompress_block
+
+
+class RunLogBlock(db.Model):
+    """Independently compressed piece of the log of a finished run.
+
+    offset and length are in characters of the uncompressed log, the
+    same units as RunLogLine, so a range maps to the blocks it overlaps.
+    """
+    __tablename__ = 'run_log_block'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'seq', name='uq_run_log_block_seq'),
+        db.Index('ix_run_log_block_offset', 'run_id', 'offset'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('run.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+
+    offset = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    @property
+    def text(self):
+        return decompress_block(self.data, self.codec).decode('utf-8')
+
+    @staticmethod
+    def read(run_id, start=0, end=None):
+        """Text in [start, end), decompressing only the overlapping blocks"""
+        statement = select(RunLogBlock).where(
+            RunLogBlock.run_id == run_id,
+            RunLogBlock.offset + RunLogBlock.length > start
+        )
+        if end is not None:
+            statement = statement.where(RunLogBlock.offset < end)
+        blocks = db.session.execute(statement.order_by(RunLogBlock.offset)).scalars().all()
+        if not blocks:
+            return ''
+
+        text = ''.join(block.text for block in blocks)
+        base = blocks[0].offset
+        return text[start - base:None if end is None else end - base]
+
+    @staticmethod
+    def total_length(run_id):
+        last = db.session.execute(
+            select(RunLogBlock.offset + RunLogBlock.length)
+            .where(RunLogBlock.run_id == run_id)
+            .order_by(RunLogBlock.seq.desc())
+            .limit(1)
+        ).scalar()
+        return last or 0
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from app import db
+from app.models.run import RunStage
+
+
+class RunLogLine(db.Model):
+    """Structured index entry of a single line of Run.log_content.
+
+    The text itself stays in the run log; offset and length (in characters)
+    locate the line in it.
+    """
+    __tablename__ = 'run_log_line'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'seq', name='uq_run_log_line_seq'),
+        db.Index('ix_run_log_line_stage', 'run_id', 'stage', 'seq'),
+        db.Index('ix_run_log_line_level', 'run_id', 'level', 'seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('run.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # номер строки в логе, с 0
+
+    offset = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    stream = db.Column(db.String(10), nullable=False, default='stdout')
+    stage = db.Column(db.Enum(RunStage), nullable=False, default=RunStage.NONE)
+    level = db.Column(db.String(10), nullable=False, default='INFO')
+
+    def to_dict(self, text=None):
+        return {
+            'seq': self.seq,
+            'timestamp': self.timestamp.isoformat(),
+            'stream': self.stream,
+            'stage': self.stage.value,
+            'level': self.level,
+            'text': text
+        }
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from app import db
+
+
+class RunMetric(db.Model):
+    """Single PPA metric of a finished run, extracted from LibreLane reports"""
+    __tablename__ = 'run_metric'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'name', name='uq_run_metric_name'),
+        # Trend of a metric over the history of a design
+        db.Index('ix_run_metric_design', 'email', 'design_name', 'name', 'created_at', 'value'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('run.id'), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    design_name = db.Column(db.String(200))
+
+    name = db.Column(db.String(64), nullable=False)
+    value = db.Column(db.Float)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'name': self.name,
+            'value': self.value
+        }
@@ -6,15 +6,20 @@ from app import db
 
 
 class Session(db.Model):
+    # Ids of deleted sessions are not handed out again: runs refer to them
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), nullable=False, index=True)
     token = db.Column(db.String(32), unique=True, nullable=False)
+    jti = db.Column(db.String(32), unique=True, index=True)  # случайный идентификатор для списка отозванных
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
     
     def __init__(self, email):
         self.email = email
         self.token = secrets.token_urlsafe(16)
+        self.jti = secrets.token_hex(16)
         self.expires_at = datetime.utcnow() + timedelta(hours=4)
     
     def is_valid(self):
@@ -27,3 +32,12 @@ class Session(db.Model):
             'token': self.token,
             'expires_at': self.expires_at.isoformat()
         }
+
+
+class RevokedSession(db.Model):
+    """Session ended before its expiry, the deny list of the signed session claims"""
+    __tablename__ = 'revoked_session'
+
+    id = db.Column(db.Integer, primary_key=True)  # порядок отзыва, по нему дочитывается кэш
+    jti = db.Column(db.String(32), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # после этого запись не нужна
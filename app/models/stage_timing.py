@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from app import db
+from app.models.run import RunStage
+
+
+class StageTiming(db.Model):
+    """Start and end time of a single stage of a run"""
+    __tablename__ = 'stage_timing'
+    __table_args__ = (
+        # Covers the per-stage duration scans of the statistics API
+        db.Index('ix_stage_timing_stage_started', 'stage', 'completed', 'started_at', 'duration'),
+        db.Index('ix_stage_timing_email_stage_started', 'email', 'stage', 'started_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('run.id'), nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=False)
+    stage = db.Column(db.Enum(RunStage), nullable=False)
+
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration = db.Column(db.Float)  # seconds
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+
+    def finish(self, finished_at=None, completed=True):
+        self.finished_at = finished_at or datetime.utcnow()
+        self.duration = (self.finished_at - self.started_at).total_seconds()
+        self.completed = completed
+
+    def to_dict(self):
+        return {
+            'stage': self.stage.value,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.duration,
+            'completed': self.completed
+        }
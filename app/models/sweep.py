@@ -0,0 +1,33 @@
+import json
+
+from datetime import datetime
+
+from app import db
+
+
+class Sweep(db.Model):
+    """Parameter sweep: one upload expanded into a child run per grid point"""
+    __tablename__ = 'sweep'
+
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False, index=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'))
+
+    name = db.Column(db.String(200))
+    design_name = db.Column(db.String(200))
+    parameters = db.Column(db.Text, nullable=False, default='{}')  # JSON сетка: ключ конфигурации -> список значений
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def grid(self):
+        return json.loads(self.parameters)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'design_name': self.design_name,
+            'parameters': self.grid,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
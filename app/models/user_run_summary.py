@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from app import db
+from app.models.run import RunStatus
+
+
+class UserRunSummary(db.Model):
+    """Per-email run counters, kept up to date by RunSummaryService"""
+    __tablename__ = 'user_run_summary'
+
+    email = db.Column(db.String(120), primary_key=True)
+
+    # Количество запусков по статусам
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    running = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    # Длительность успешно завершенных запусков (сек)
+    completed_duration = db.Column(db.Float, nullable=False, default=0.0)
+    timed_runs = db.Column(db.Integer, nullable=False, default=0)  # завершенные запуски с известной длительностью
+
+    last_run_id = db.Column(db.Integer)  # последний созданный запуск
+    active_run_id = db.Column(db.Integer)  # самый старый из pending/running
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def active(self):
+        return self.pending + self.running
+
+    @property
+    def average_duration(self):
+        return self.completed_duration / self.timed_runs if self.timed_runs else None
+
+    def count(self, status):
+        return getattr(self, RunStatus(status).value)
+
+    def to_dict(self):
+        return {
+            'counts': {status.value: self.count(status) for status in RunStatus},
+            'total': self.total,
+            'active': self.active,
+            'completed_duration': self.completed_duration,
+            'average_duration': self.average_duration,
+            'last_run_id': self.last_run_id,
+            'active_run_id': self.active_run_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -1,98 +1,285 @@
 import os
+import re
+import json
+import time
+import shutil
 import logging
 
+from datetime import datetime, timedelta
+
 from flask import Blueprint
-from flask import flash, jsonify, redirect, send_file, request, session, url_for
+from flask import current_app, flash, jsonify, redirect, request, session, url_for
+from sqlalchemy.orm import defer
 
+from app import db
+from app.exceptions import QueueFullError, RunLimitExceededError
 from app.models.run import Run
 from app.utils.decorators import (
     login_required, 
-    no_active_run_required,
     run_ownership_required,
     run_finished_required,
     run_not_completed_required
 )
 from app.services.run_service import RunService
 from app.services.librelane_service import LibreLaneService
+from app.utils.archives import is_archive
+from app.utils.downloads import send_run_file
+from app.utils.metrics import UPLOAD_SIZE, VALIDATION_DURATION
+from app.utils.serialization import api_response, parse_fields
 
 
 api_bp = Blueprint('api', __name__)
 
 logger = logging.getLogger(__name__)
 
+# Поля, доступные через ?fields= (и возвращаемые по умолчанию)
+STATUS_FIELDS = tuple(name for name in Run.DICT_FIELDS if name != 'log_content')
+QUEUE_FIELDS = ('queue_position', 'estimated_start', 'estimated_finish')  # QueueService.estimate
+LOGS_FIELDS = ('id', 'status', 'log_content')
+
 
 @api_bp.route('/upload', methods=['POST'])
 @login_required
-@no_active_run_required
 def upload():
+    from app.services.queue_service import QueueService
+    from app.services.quota_service import QuotaService
+
     try:
-        uploaded_files = request.files.getlist('files')
-        if not uploaded_files or all(not file.filename for file in uploaded_files):
-            return jsonify({'success': False, 'error': 'Нет загруженных файлов'}), 400
-        
-        config_files = []
-        source_files = []
-
-        for file in uploaded_files:
-            if not file.filename:
-                continue
-
-            filename_lower = file.filename.lower()
-            if any(filename_lower.endswith(ext) for ext in ['.json', '.yaml', '.yml', '.conf']):
-                config_files.append(file)
-            elif any(filename_lower.endswith(ext) for ext in ['.v', '.vh', '.sv']):
-                source_files.append(file)
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'Неподдерживаемый формат файла: {file.filename}'
-                }), 400
-        
-        from app.services.validation_service import FileValidationService
-        is_valid, validation_result = FileValidationService.validate_upload(
-            config_files[0] if config_files else None,
-            source_files
-        )
-        if not is_valid:
-            return jsonify({
-                'success': False,
-                'error': 'Ошибки валидации файлов',
-                'details': validation_result['errors']
-            }), 400
-        if validation_result['warnings']:
-            logging.warning(f"File upload warnings: {validation_result['warnings']}")
-        
-
-        run = RunService.create_run(session['session_id'], session['email'])
-        
-        config_file = config_files[0]
+        # Cheap early rejection; the limits are enforced again when the run is created
+        QueueService.check_capacity()
+        QuotaService.check(session['email'])
+
+        upload_ids = request.form.getlist('uploads')
+        if upload_ids or any(is_archive(file.filename or '') for file in request.files.getlist('files')):
+            return _upload_project(upload_ids)
+
+        config_file, source_files, warnings, error = _read_upload_files()
+        if error:
+            return error
+
+        run = RunService.create_run(session['session_id'], session['email'], priority=_read_priority())
+
         if RunService.save_uploaded_files(run.id, config_file, source_files):
             LibreLaneService.submit_run(run.id)
             return jsonify({
                 'success': True,
                 'run_id': run.id,
-                'warnings': validation_result.get('warnings', [])
+                'warnings': warnings
             })
         else:
             return jsonify({'success': False, 'error': 'Ошибка сохранения файлов'}), 500
-            
+
+    except (QueueFullError, RunLimitExceededError):
+        raise
     except Exception as e:
         logging.error(f"Upload error: {str(e)}")
         return jsonify({'success': False, 'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
 
+def _upload_project(upload_ids):
+    """Run from chunked uploads (`uploads` ids) and/or tar archives, `config` picks the configuration"""
+    from app.services.upload_service import UploadService
+
+    UPLOAD_SIZE.observe(request.content_length or 0)
+    files = [file for file in request.files.getlist('files') if file.filename]
+    try:
+        project_dir, config_filename, input_filenames, warnings = UploadService.build_project(
+            session['email'],
+            upload_ids,
+            files,
+            config_name=request.form.get('config') or None
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        run = RunService.create_run(session['session_id'], session['email'], priority=_read_priority())
+        saved = RunService.save_project_dir(run.id, project_dir, config_filename, input_filenames)
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+    if not saved:
+        return jsonify({'success': False, 'error': 'Ошибка сохранения файлов'}), 500
+
+    for upload_id in upload_ids:
+        UploadService.discard(upload_id)
+    LibreLaneService.submit_run(run.id)
+    return jsonify({
+        'success': True,
+        'run_id': run.id,
+        'warnings': warnings
+    })
+
+
+def _read_upload_files():
+    """Splits and validates request.files: (config, sources, warnings, error response)"""
+    uploaded_files = request.files.getlist('files')
+    if not uploaded_files or all(not file.filename for file in uploaded_files):
+        return None, None, None, (jsonify({'success': False, 'error': 'Нет загруженных файлов'}), 400)
+
+    config_files = []
+    source_files = []
+
+    for file in uploaded_files:
+        if not file.filename:
+            continue
+
+        filename_lower = file.filename.lower()
+        if any(filename_lower.endswith(ext) for ext in ['.json', '.yaml', '.yml', '.conf']):
+            config_files.append(file)
+        elif any(filename_lower.endswith(ext) for ext in ['.v', '.vh', '.sv']):
+            source_files.append(file)
+        else:
+            return None, None, None, (jsonify({
+                'success': False,
+                'error': f'Неподдерживаемый формат файла: {file.filename}'
+            }), 400)
+
+    UPLOAD_SIZE.observe(request.content_length or 0)
+
+    from app.services.validation_service import FileValidationService
+    validation_started = time.perf_counter()
+    is_valid, validation_result = FileValidationService.validate_upload(
+        config_files[0] if config_files else None,
+        source_files
+    )
+    VALIDATION_DURATION.observe(time.perf_counter() - validation_started)
+    if not is_valid:
+        return None, None, None, (jsonify({
+            'success': False,
+            'error': 'Ошибки валидации файлов',
+            'details': validation_result['errors']
+        }), 400)
+    if validation_result['warnings']:
+        logging.warning(f"File upload warnings: {validation_result['warnings']}")
+
+    return config_files[0], source_files, validation_result['warnings'], None
+
+
+def _read_priority():
+    """Requested priority: up to 0 for everyone, higher only for RUN_PRIORITY_RAISE_EMAILS"""
+    config = current_app.config
+    priority = request.form.get('priority', 0, type=int)
+    # A raised priority outweighs the fair-share step, so it is not for everyone
+    highest = config['RUN_PRIORITY_MAX'] if session['email'].lower() in config['RUN_PRIORITY_RAISE_EMAILS'] else 0
+    return max(config['RUN_PRIORITY_MIN'], min(priority, highest))
+
+
+@api_bp.route('/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    """Starts a chunked upload: JSON {filename, size, sha256 (optional)}"""
+    from app.services.upload_service import UploadService
+
+    data = request.get_json(silent=True) or {}
+    try:
+        meta = UploadService.create(session['email'], data.get('filename'), data.get('size'), data.get('sha256'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    status = UploadService.status(meta)
+    status['chunk_size'] = current_app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(status), 201
+
+
+@api_bp.route('/uploads/<upload_id>')
+@login_required
+def upload_status(upload_id):
+    """Received offset of an upload, to resume it from"""
+    from app.services.upload_service import UploadService
+
+    meta = UploadService.get(upload_id, session['email'])
+    if not meta:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(UploadService.status(meta))
+
+
+@api_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Raw chunk at the offset given by `Content-Range: bytes <start>-<end>/<size>`"""
+    from werkzeug.http import parse_content_range_header
+    from app.services.upload_service import UploadService
+
+    meta = UploadService.get(upload_id, session['email'])
+    if not meta:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' \
+            or content_range.length not in (None, meta['size']) or content_range.stop > meta['size']:
+        return jsonify({'error': f"Content-Range must be bytes <start>-<end>/{meta['size']}"}), 400
+    if request.content_length != content_range.stop - content_range.start:
+        return jsonify({'error': 'Content-Length does not match Content-Range'}), 400
+
+    try:
+        offset = UploadService.write_chunk(meta, content_range.start, request.stream, request.content_length)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': UploadService.offset(meta)}), 409
+
+    return jsonify({'upload_id': upload_id, 'offset': offset, 'size': meta['size']})
+
+
+@api_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """Checks size and checksum; the upload can then be passed to /upload as `uploads`"""
+    from app.services.upload_service import UploadService
+
+    meta = UploadService.get(upload_id, session['email'])
+    if not meta:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        meta = UploadService.complete(meta)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': UploadService.offset(meta)}), 409
+    return jsonify(UploadService.status(meta))
+
+
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def discard_upload(upload_id):
+    from app.services.upload_service import UploadService
+
+    if not UploadService.get(upload_id, session['email']):
+        return jsonify({'error': 'Upload not found'}), 404
+    UploadService.discard(upload_id)
+    return jsonify({'success': True})
+
+
+@api_bp.route('/quota')
+@login_required
+def quota():
+    """Active and daily run counts of the user against their limits"""
+    from app.services.quota_service import QuotaService
+
+    return jsonify(QuotaService.usage(session['email']))
+
+
 @api_bp.route('/<int:run_id>/status')
 @login_required
 @run_ownership_required
 def status(run_id):  # TODO: replace on WebSockets or Long Polling
-    run = Run.query.get(run_id)
+    # Polled every few seconds: STATUS_FIELDS never need the log
+    run = db.session.get(Run, run_id, options=[defer(Run.log_content)])
     
     if not run or run.session_id != session['session_id']:
         return jsonify({'error': 'Run not found'}), 404
     
-    result_dict = run.to_dict()
-    result_dict.pop('log_content')
-    return jsonify(result_dict)
+    try:
+        fields = parse_fields(STATUS_FIELDS + QUEUE_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if fields is None:
+        fields = STATUS_FIELDS + QUEUE_FIELDS
+    result = run.to_dict([name for name in fields if name not in QUEUE_FIELDS])
+    if any(name in QUEUE_FIELDS for name in fields):
+        from app.services.queue_service import QueueService
+
+        estimate = QueueService.estimate(run)
+        result.update({name: estimate[name] for name in fields if name in QUEUE_FIELDS})
+    return api_response(result)
 
 
 @api_bp.route('/<int:run_id>/logs')
@@ -104,11 +291,76 @@ def logs(run_id):
     if not run:
         return jsonify({'error': 'Run not found'}), 404
     
-    return jsonify({
-        'id': run.id,
-        'status': run.status.value,
-        'log_content': run.log_content,
+    try:
+        fields = parse_fields(LOGS_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    tail = request.args.get('tail', type=int)
+    if start is None and end is None and tail is None:
+        return api_response(run.to_dict(fields if fields is not None else LOGS_FIELDS))
+
+    # Character range of the log: ?start=&end= or the last ?tail= characters
+    result = run.to_dict([name for name in fields or LOGS_FIELDS if name != 'log_content'])
+    log_length = run.log_length
+    if tail is not None:
+        start, end = max(log_length - max(tail, 0), 0), None
+    start = max(start or 0, 0)
+    result.update({
+        'log_content': run.read_log(start, end),
+        'start': start,
+        'log_length': log_length
     })
+    return api_response(result)
+
+
+@api_bp.route('/<int:run_id>/logs/lines')
+@login_required
+@run_ownership_required
+def log_lines(run_id):
+    """Filtered page of log lines: stage, level, q (+regex), after/before/tail, limit"""
+    from app.services.log_service import LEVELS, LogService
+    from app.models.run import RunStage
+
+    run = Run.query.get(run_id)
+    if not run:
+        return jsonify({'error': 'Run not found'}), 404
+
+    try:
+        stages = [RunStage(value) for value in _list_arg('stage')]
+        levels = [value.upper() for value in _list_arg('level')]
+        if any(level not in LEVELS for level in levels):
+            raise ValueError(f"Unknown level, expected one of: {', '.join(LEVELS)}")
+
+        search = request.args.get('q') or None
+        regex = request.args.get('regex', 'false').lower() in ('1', 'true')
+        if search and len(search) > current_app.config['LOG_SEARCH_MAX_PATTERN']:
+            raise ValueError('Search pattern is too long')
+
+        result = LogService.query_lines(
+            run,
+            stages=stages,
+            levels=levels,
+            search=search,
+            regex=regex,
+            after=request.args.get('after', type=int),
+            before=request.args.get('before', type=int),
+            tail=request.args.get('tail', 'false').lower() in ('1', 'true'),
+            limit=request.args.get('limit', type=int)
+        )
+    except re.error as e:
+        return jsonify({'error': f'Invalid regular expression: {str(e)}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result.update({'id': run.id, 'status': run.status.value})
+    return api_response(result)
+
+
+def _list_arg(name):
+    return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
 
 
 @api_bp.route('/<int:run_id>/download')
@@ -129,7 +381,212 @@ def download_results(run_id):
         flash('Archive not found', 'error')
         return redirect(url_for('website.results', run_id=run_id))
     
-    return send_file(archive_path, as_attachment=True, download_name=run.archive_filename)
+    # Stable content hash as ETag, so If-Range resumes survive restarts;
+    # archives built before it was stored fall back to mtime/size
+    return send_run_file(
+        archive_path,
+        run.archive_filename,
+        mimetype='application/zip',
+        etag=run.archive_etag or True
+    )
+
+
+@api_bp.route('/<int:run_id>/results/tree')
+@login_required
+@run_ownership_required
+@run_finished_required
+def results_tree(run_id):
+    """One directory level of the run folder: ?path=&offset=&limit="""
+    from app.services.results_service import ResultsService
+
+    listing = ResultsService.list_directory(
+        run_id,
+        request.args.get('path', ''),
+        offset=max(request.args.get('offset', 0, type=int), 0),
+        limit=min(request.args.get('limit', current_app.config['RESULTS_LIST_LIMIT'], type=int),
+                  current_app.config['RESULTS_LIST_LIMIT'])
+    )
+    if listing is None:
+        return jsonify({'error': 'Directory not found'}), 404
+    return api_response(listing)
+
+
+@api_bp.route('/<int:run_id>/results/file')
+@login_required
+@run_ownership_required
+@run_finished_required
+def results_file(run_id):
+    """Single result file with Range support; text files are shown inline"""
+    from app.services.results_service import ResultsService
+
+    path = ResultsService.resolve_file(run_id, request.args.get('path', ''))
+    if path is None:
+        return jsonify({'error': 'File not found'}), 404
+
+    as_text = ResultsService.is_text(path) and request.args.get('download') is None
+    response = send_run_file(
+        path,
+        os.path.basename(path),
+        as_attachment=not as_text,
+        mimetype='text/plain' if as_text else None
+    )
+    if as_text:
+        response.charset = 'utf-8'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    return response
+
+
+@api_bp.route('/<int:run_id>/results/preview')
+@login_required
+@run_ownership_required
+@run_finished_required
+def results_preview(run_id):
+    """First RESULTS_PREVIEW_BYTES of a file as text"""
+    from app.services.results_service import ResultsService
+
+    relative_path = request.args.get('path', '')
+    path = ResultsService.resolve_file(run_id, relative_path)
+    if path is None:
+        return jsonify({'error': 'File not found'}), 404
+
+    preview = ResultsService.preview(path)
+    preview['path'] = relative_path.strip('/')
+    return api_response(preview)
+
+
+@api_bp.route('/<int:run_id>/checkpoints')
+@login_required
+@run_ownership_required
+def checkpoints(run_id):
+    from app.services.checkpoint_service import CheckpointService
+
+    return jsonify({
+        'id': run_id,
+        'checkpoints': [stage.value for stage in CheckpointService.list_checkpoints(run_id)],
+        'resumable_stages': [stage.value for stage in CheckpointService.resumable_stages(run_id)]
+    })
+
+
+@api_bp.route('/<int:run_id>/rerun', methods=['POST'])
+@login_required
+@run_finished_required
+def rerun(run_id):
+    """New run from a stage of a finished one: from_stage, optional overrides {CONFIG_KEY: value}"""
+    from app.models.run import RunStage
+    from app.services.checkpoint_service import CheckpointService
+    from app.services.queue_service import QueueService
+
+    QueueService.check_capacity()
+    data = request.get_json(silent=True) or request.form
+    try:
+        from_stage = RunStage(data.get('from_stage', ''))
+        overrides = data.get('overrides') or {}
+        if isinstance(overrides, str):
+            overrides = json.loads(overrides)
+
+        run = CheckpointService.create_rerun(
+            Run.query.get(run_id),
+            from_stage,
+            overrides=overrides,
+            session_id=session['session_id']
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    LibreLaneService.submit_run(run.id)
+    return jsonify({
+        'success': True,
+        'run_id': run.id,
+        'parent_run_id': run_id,
+        'from_stage': from_stage.value
+    })
+
+
+@api_bp.route('/sweeps', methods=['POST'])
+@login_required
+def create_sweep():
+    """One source set plus a JSON grid {CONFIG_KEY: [values]} -> a child run per combination"""
+    from app.services.queue_service import QueueService
+    from app.services.sweep_service import SweepService
+
+    try:
+        QueueService.check_capacity()
+        config_file, source_files, warnings, error = _read_upload_files()
+        if error:
+            return error
+
+        try:
+            grid = json.loads(request.form.get('grid', ''))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'grid must be a JSON object {"KEY": [values]}'}), 400
+
+        try:
+            sweep, runs = SweepService.create_sweep(
+                session['session_id'],
+                session['email'],
+                config_file,
+                source_files,
+                grid,
+                name=request.form.get('name') or None,
+                priority=_read_priority()
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        for run in runs:
+            LibreLaneService.submit_run(run.id)
+
+        return jsonify({
+            'success': True,
+            'sweep_id': sweep.id,
+            'run_ids': [run.id for run in runs],
+            'warnings': warnings
+        })
+
+    except (QueueFullError, RunLimitExceededError):
+        raise
+    except Exception as e:
+        logging.error(f"Sweep upload error: {str(e)}")
+        return jsonify({'success': False, 'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+
+@api_bp.route('/sweeps/<int:sweep_id>')
+@login_required
+def sweep_summary(sweep_id):
+    """Status of every child run with its grid values and metrics; ?format=csv for a table"""
+    from app.models.sweep import Sweep
+    from app.services.sweep_service import SweepService
+
+    sweep = Sweep.query.get(sweep_id)
+    if not sweep or sweep.email != session['email']:
+        return jsonify({'error': 'Sweep not found'}), 404
+
+    summary = SweepService.summary(sweep)
+    if request.args.get('format') == 'csv':
+        return current_app.response_class(
+            SweepService.summary_csv(summary),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=sweep_{sweep_id}.csv'}
+        )
+    return api_response(summary)
+
+
+@api_bp.route('/sweeps/<int:sweep_id>/cancel', methods=['POST'])
+@login_required
+def cancel_sweep(sweep_id):
+    from app.models.sweep import Sweep
+    from app.services.sweep_service import SweepService
+
+    sweep = Sweep.query.get(sweep_id)
+    if not sweep or sweep.email != session['email']:
+        return jsonify({'error': 'Sweep not found'}), 404
+
+    cancelled = [
+        run.id for run in SweepService.get_runs(sweep_id)
+        if not run.is_finished and LibreLaneService.cancel_run(run.id)
+    ]
+    return jsonify({'success': True, 'cancelled': cancelled})
 
 
 @api_bp.route('/<int:run_id>/cancel', methods=['POST'])
@@ -144,3 +601,139 @@ def cancel_run(run_id):
     
     return redirect(url_for('website.results', run_id=run_id))
 
+
+
+@api_bp.route('/stats/stages')
+@login_required
+def stage_stats():
+    """Stage duration statistics over a time window, ?email= narrows them to the user's own runs"""
+    email = request.args.get('email')
+    if email and email != session['email']:
+        return jsonify({'error': 'Statistics of other users are not available'}), 403
+
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        days = request.args.get('days', type=int)
+
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        if days and not since:
+            since = datetime.utcnow() - timedelta(days=days)
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected ISO 8601'}), 400
+
+    from app.services.stats_service import StatsService
+    stats = StatsService.stage_duration_stats(
+        since=since,
+        until=until,
+        email=email
+    )
+    return jsonify({
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat() if until else None,
+        'stages': stats
+    })
+
+
+@api_bp.route('/<int:run_id>/metrics')
+@login_required
+@run_ownership_required
+def run_metrics(run_id):
+    from app.models.run_metric import RunMetric
+
+    run = Run.query.get(run_id)
+    if not run:
+        return jsonify({'error': 'Run not found'}), 404
+
+    metrics = RunMetric.query.filter_by(run_id=run_id).all()
+    return api_response({
+        'id': run.id,
+        'design_name': run.design_name,
+        'metrics': {metric.name: metric.value for metric in metrics}
+    })
+
+
+@api_bp.route('/runs')
+@login_required
+def run_history():
+    """The user's runs, newest first: ?limit=&cursor=&status=completed,failed&since=&until=&fields="""
+    from app.models.run import RunStatus
+
+    try:
+        fields = parse_fields(Run.HISTORY_FIELDS) or Run.HISTORY_FIELDS
+        statuses = [RunStatus(value) for value in _list_arg('status')]
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    limit = request.args.get('limit', current_app.config['RUN_HISTORY_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), current_app.config['RUN_HISTORY_MAX_PAGE_SIZE'])
+    try:
+        runs, next_cursor = RunService.get_run_history(
+            session['email'],
+            limit,
+            cursor=request.args.get('cursor') or None,
+            statuses=statuses,
+            since=since,
+            until=until
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return api_response({
+        'runs': [run.to_dict(fields) for run in runs],
+        'next_cursor': next_cursor
+    })
+
+
+@api_bp.route('/runs/summary')
+@login_required
+def run_summary():
+    """Run counts by status, completed run durations and the last/active run of the user"""
+    from app.services.run_summary_service import RunSummaryService
+
+    return api_response(RunSummaryService.get(session['email']).to_dict())
+
+
+@api_bp.route('/runs/compare')
+@login_required
+def compare_runs():
+    """Metrics of up to METRICS_COMPARE_MAX_RUNS of the user's runs: ?ids=1,2,3&metrics=..."""
+    from app.services.run_metrics_service import METRICS, RunMetricsService
+
+    try:
+        run_ids = list(dict.fromkeys(int(value) for value in _list_arg('ids')))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of run ids'}), 400
+    if not run_ids:
+        return jsonify({'error': 'No run ids given'}), 400
+    if len(run_ids) > current_app.config['METRICS_COMPARE_MAX_RUNS']:
+        return jsonify({
+            'error': f"At most {current_app.config['METRICS_COMPARE_MAX_RUNS']} runs can be compared"
+        }), 400
+
+    names = _list_arg('metrics') or None
+    unknown = [name for name in names or [] if name not in METRICS]
+    if unknown:
+        return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+
+    return api_response(RunMetricsService.compare(session['email'], run_ids, names))
+
+
+@api_bp.route('/designs/<design_name>/trend')
+@login_required
+def design_trend(design_name):
+    """History of one metric of a design across the user's runs: ?metric=&limit="""
+    from app.services.run_metrics_service import METRICS, RunMetricsService
+
+    name = request.args.get('metric', 'setup_wns')
+    if name not in METRICS:
+        return jsonify({'error': f"Unknown metric, expected one of: {', '.join(METRICS)}"}), 400
+
+    limit = request.args.get('limit', 100, type=int)
+    limit = min(max(limit, 1), current_app.config['METRICS_TREND_MAX_RUNS'])
+    return api_response(RunMetricsService.trend(session['email'], design_name, name, limit=limit))
@@ -1,3 +1,4 @@
+import re
 import logging
 
 from datetime import timedelta
@@ -5,27 +6,43 @@ from flask import Blueprint
 from flask import render_template, request, redirect, url_for, flash, session, jsonify, current_app
 
 from app.services.auth_service import AuthService
+from app.services.mail_service import MailService
 
 
 auth_bp = Blueprint('auth', __name__)
 
 logger = logging.getLogger(__name__)
 
+# One address without whitespace or line breaks; delivery checks the rest
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+')
+
 
 @auth_bp.route('/', methods=['GET', 'POST'])
 def email_login():
     if request.method == 'POST':
-        email = request.form.get('email')
+        email = (request.form.get('email') or '').strip()
         if not email:
             flash('Please enter your email address', 'error')
             return render_template('auth/email_login.html')
+        if not EMAIL_PATTERN.fullmatch(email):
+            flash('Please enter a valid email address', 'error')
+            return render_template('auth/email_login.html')
         
         # Создаем сессию
         session_obj = AuthService.create_session(email)
         
-        # В реальном приложении отправить email с ссылкой
         magic_link = url_for('auth.magic_login', token=session_obj.token, _external=True)
 
+        # Queued for the background sender, the request does not wait on SMTP;
+        # with mail enabled the link is shown on the page only in debug mode
+        if MailService.enabled():
+            queued = MailService.send_magic_link(email, magic_link, session_obj.expires_at)
+            if not current_app.debug:
+                if not queued:
+                    flash('Could not send the login email, please try again later', 'error')
+                    return render_template('auth/email_login.html', email=email)
+                return render_template('auth/email_login.html', email=email, link_sent=True)
+
         logger.debug("=" * 60)
         logger.debug(f"MAGIC LINK for {email}:")
         logger.debug(f"{magic_link}")
@@ -45,8 +62,8 @@ def magic_login(token):
         return redirect(url_for('auth.email_login'))
     
     # Устанавливаем сессию
-    session['session_id'] = session_obj.id
-    session['email'] = session_obj.email
+    # The signed cookie carries id, jti, email and expiry (see AuthService.check_login)
+    session.update(AuthService.session_claim(session_obj))
     session.permanent = True
 
     logger.debug("=" * 50)
@@ -62,9 +79,11 @@ def magic_login(token):
 
 @auth_bp.route('/logout')
 def logout():
+    email = session.get('email')
+    if 'session_id' in session:
+        AuthService.revoke_session(session)
     session.clear()
 
-    email = session.get('email')
     if email:
         logger.debug("=" * 40)
         logger.debug(f"USER LOGGED OUT: {email}")
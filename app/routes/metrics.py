@@ -0,0 +1,16 @@
+import hmac
+
+from flask import Blueprint, Response, current_app, request
+
+from app.utils.metrics import registry, CONTENT_TYPE
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Forbidden\n', status=403, content_type='text/plain')
+    return Response(registry.render(), content_type=CONTENT_TYPE)
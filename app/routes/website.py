@@ -5,7 +5,7 @@ from flask import flash, redirect, render_template, request, session, url_for, j
 
 from app.utils.decorators import (
     login_required, 
-    no_active_run_required, 
+    run_quota_required,
     run_ownership_required,
     run_finished_required,
     run_not_completed_required,
@@ -26,7 +26,7 @@ def help():
 
 @site_bp.route('/upload')
 @login_required
-@no_active_run_required
+@run_quota_required
 def upload():
     return render_template('pages/upload.html')
 
@@ -49,9 +49,10 @@ def status(run_id):
 @login_required
 @run_ownership_required
 def logs(run_id):
-    from app.models.run import Run
+    from app.models.run import Run, RunStage
+    from app.services.log_service import LEVELS
     run = Run.query.get(run_id)
-    return render_template('pages/logs.html', run=run)
+    return render_template('pages/logs.html', run=run, stages=list(RunStage), levels=LEVELS)
 
 
 @site_bp.route('/<int:run_id>/results')
@@ -1,39 +1,146 @@
-from app.models.session import Session
+from app.models.session import Session, RevokedSession
 from app import db
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+import os
+import time
 import secrets
+import threading
 
 class AuthService:
+    # Deny list of the signed session claims: Session.jti -> expires_at,
+    # read incrementally from RevokedSession (see is_revoked)
+    _revoked = {}
+    _revoked_cursor = 0
+    _revoked_refreshed = None
+    _revoked_lock = threading.Lock()
+
     @staticmethod
     def create_session(email):
         # Очищаем старые сессии для этого email
+        old_sessions = Session.query.filter_by(email=email).all()
+        AuthService._deny(old_sessions)
         Session.query.filter_by(email=email).delete()
-        
+
         session = Session(email=email)
         db.session.add(session)
         db.session.commit()
-        
+
         return session
-    
+
     @staticmethod
     def get_session_by_token(token):
         return Session.query.filter_by(token=token).first()
-    
+
     @staticmethod
     def validate_session(token):
         session = AuthService.get_session_by_token(token)
         if session and session.is_valid():
             return session
         return None
-    
+
+    @staticmethod
+    def session_claim(session_obj):
+        """Fields stored in the (signed) Flask session on login"""
+        return {
+            'session_id': session_obj.id,
+            'jti': session_obj.jti,
+            'email': session_obj.email,
+            'expires_at': int(session_obj.expires_at.replace(tzinfo=timezone.utc).timestamp())
+        }
+
+    @staticmethod
+    def check_login(flask_session):
+        """Whether the logged in Flask session is still valid.
+
+        With SESSION_CLAIMS the expiry carried by the session cookie is
+        trusted (the cookie is signed with SECRET_KEY) and revocations are
+        looked up in the cached deny list, so no query is made. Otherwise,
+        and for cookies issued before the claims were enabled, the Session
+        row is loaded.
+        """
+        if current_app.config['SESSION_CLAIMS'] and flask_session.get('jti') and 'expires_at' in flask_session:
+            return time.time() < flask_session['expires_at'] \
+                and not AuthService.is_revoked(flask_session['jti'])
+
+        session_obj = db.session.get(Session, flask_session['session_id'])
+        if not session_obj or not AuthService._issued_for(session_obj, flask_session) \
+                or not session_obj.is_valid():
+            return False
+        if current_app.config['SESSION_CLAIMS'] and session_obj.jti:
+            flask_session.update(AuthService.session_claim(session_obj))
+        return True
+
+    @staticmethod
+    def revoke_session(flask_session):
+        """Ends the session a Flask session is logged in with before its expiry (logout)"""
+        session_obj = db.session.get(Session, flask_session['session_id'])
+        if session_obj is None or not AuthService._issued_for(session_obj, flask_session):
+            return
+        AuthService._deny([session_obj])
+        db.session.delete(session_obj)
+        db.session.commit()
+
+    @staticmethod
+    def _issued_for(session_obj, flask_session):
+        """Whether the Session row is the one the cookie was issued for, not a later one with its id"""
+        if flask_session.get('jti'):
+            return session_obj.jti == flask_session['jti']
+        return session_obj.email == flask_session.get('email')
+
+    @classmethod
+    def is_revoked(cls, jti):
+        """Deny list lookup, refreshed from the database at most every SESSION_DENYLIST_REFRESH seconds"""
+        now = time.monotonic()
+        refreshed = cls._revoked_refreshed
+        if refreshed is None or now - refreshed >= current_app.config['SESSION_DENYLIST_REFRESH']:
+            with cls._revoked_lock:
+                if cls._revoked_refreshed is refreshed:
+                    cls._refresh_revoked()
+                    cls._revoked_refreshed = now
+        return jti in cls._revoked
+
+    @classmethod
+    def _refresh_revoked(cls):
+        """Reads revocations newer than the last one seen and forgets expired ones"""
+        utcnow = datetime.utcnow()
+        rows = db.session.query(RevokedSession.id, RevokedSession.jti, RevokedSession.expires_at) \
+            .filter(RevokedSession.id > cls._revoked_cursor, RevokedSession.expires_at > utcnow) \
+            .order_by(RevokedSession.id) \
+            .all()
+        # Copy-on-write: readers check membership without taking the lock
+        revoked = {jti: expires_at for jti, expires_at in cls._revoked.items() if expires_at > utcnow}
+        for row_id, jti, expires_at in rows:
+            revoked[jti] = expires_at
+            cls._revoked_cursor = row_id
+        cls._revoked = revoked
+
+    @classmethod
+    def _deny(cls, sessions):
+        """Records still valid sessions in the deny list, committed by the caller"""
+        utcnow = datetime.utcnow()
+        live = [session for session in sessions if session.jti and session.expires_at > utcnow]
+        for session in live:
+            db.session.add(RevokedSession(jti=session.jti, expires_at=session.expires_at))
+        if live:
+            # This process sees its own revocations at once, others on their next refresh
+            with cls._revoked_lock:
+                cls._revoked = {**cls._revoked, **{session.jti: session.expires_at for session in live}}
+
     @staticmethod
     def cleanup_expired_sessions():
         expired = Session.query.filter(Session.expires_at < datetime.utcnow()).all()
         for session in expired:
             db.session.delete(session)
+        RevokedSession.query.filter(RevokedSession.expires_at < datetime.utcnow()).delete()
         db.session.commit()
-    
-    @staticmethod
-    def get_session_runs(session_id):
-        from app.models.run import Run
-        return Run.query.filter_by(session_id=session_id).order_by(Run.created_at.desc()).all()
+
+
+def _reset_after_fork():
+    # The lock may have been held by another thread; the child refreshes on its first check
+    AuthService._revoked_lock = threading.Lock()
+    AuthService._revoked_refreshed = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import shutil
+import logging
+
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.run import Run, RunStage
+from app.services.quota_service import QuotaService
+from app.services.run_service import RunService
+from app.services.run_summary_service import RunSummaryService
+from app.services.sweep_service import CONFIG_KEY_PATTERN
+from app.utils.files import link_or_copy
+
+
+logger = logging.getLogger(__name__)
+
+# Stages that leave outputs to resume from, in flow order
+STAGES = (RunStage.SYNTHESIS, RunStage.PLACEMENT, RunStage.ROUTING, RunStage.TIMING, RunStage.POWER)
+CHECKPOINT_DIR = 'checkpoints'
+STATE_FILENAME = 'state_out.json'
+_STEP_DIR = re.compile(r'^(\d+)-')
+
+
+class CheckpointService:
+    """Per-stage checkpoints of run directories and reruns from them.
+
+    A checkpoint is a manifest of the files the run directory held when a
+    stage completed. LibreLane writes every step into its own directory
+    and never rewrites earlier ones, so a rerun can hard-link those files
+    instead of copying them.
+    """
+
+    @staticmethod
+    def _manifest_path(run_id, stage):
+        return os.path.join(RunService.get_project_folder(run_id), CHECKPOINT_DIR, f'{stage.value}.json')
+
+    @staticmethod
+    def save(run_id, stage):
+        """Records the outputs present after `stage` completed.
+
+        Stage markers are noticed only once the next stage has started, so
+        LibreLane step directories (`<n>-<step-id>`) from the step starting
+        the next stage on are left out, and the state to resume from is the
+        state_out.json of the latest step before it.
+        """
+        run = Run.query.get(run_id)
+        if not run or stage not in STAGES:
+            return None
+
+        run_dir = RunService.get_project_folder(run_id)
+        skipped = set(json.loads(run.sources_filenames or '[]')) | {run.config_filename, 'output.log'}
+        boundary = CheckpointService._next_stage_step_number(run_dir, stage)
+
+        paths = []
+        state = None
+        for root, dirs, files in os.walk(run_dir):
+            if root == run_dir:
+                dirs[:] = [name for name in dirs if name != CHECKPOINT_DIR]
+            step = _step_number(os.path.relpath(root, run_dir))
+            if boundary is not None and step is not None and step >= boundary:
+                dirs[:] = []
+                continue
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), run_dir).replace(os.sep, '/')
+                if relative in skipped or (root == run_dir and name.startswith('results_')):
+                    continue
+                paths.append(relative)
+                if name == STATE_FILENAME:
+                    key = (-1 if step is None else step, os.path.getmtime(os.path.join(root, name)))
+                    if state is None or key >= state[0]:
+                        state = (key, relative)
+
+        manifest = {
+            'stage': stage.value,
+            'created_at': datetime.utcnow().isoformat(),
+            'paths': sorted(paths),
+            'state': state[1] if state else None
+        }
+        path = CheckpointService._manifest_path(run_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f'{path}.tmp', path)
+
+        logger.info(f"Checkpoint of run {run_id} after {stage.value}: {len(paths)} files")
+        return manifest
+
+    @staticmethod
+    def _next_stage_step_number(run_dir, stage):
+        """Number of the step directory that starts the stage after `stage`, if any"""
+        index = STAGES.index(stage)
+        if index + 1 == len(STAGES):
+            return None
+        step_id = CheckpointService.stage_step(STAGES[index + 1])
+        if not step_id:
+            return None
+
+        suffix = '-' + _step_slug(step_id)
+        numbers = [
+            _step_number(name)
+            for root, dirs, files in os.walk(run_dir)
+            for name in dirs
+            if name.lower().endswith(suffix) and _step_number(name) is not None
+        ]
+        return min(numbers) if numbers else None
+
+    @staticmethod
+    def started_stages(run_dir):
+        """Stages whose first LibreLane step already has a directory in run_dir, in flow order.
+
+        LibreLane creates `<n>-<step-id>` when a step starts. Step
+        directories are not descended into, which keeps the walk short.
+        """
+        slugs = {}
+        for stage in STAGES:
+            step_id = CheckpointService.stage_step(stage)
+            if step_id:
+                slugs[_step_slug(step_id)] = stage
+
+        started = set()
+        for root, dirs, files in os.walk(run_dir):
+            if root == run_dir:
+                dirs[:] = [name for name in dirs if name != CHECKPOINT_DIR]
+            for name in dirs:
+                if _STEP_DIR.match(name):
+                    stage = slugs.get(_STEP_DIR.sub('', name, count=1).lower())
+                    if stage:
+                        started.add(stage)
+            dirs[:] = [name for name in dirs if not _STEP_DIR.match(name)]
+        return [stage for stage in STAGES if stage in started]
+
+    @staticmethod
+    def load(run_id, stage):
+        try:
+            with open(CheckpointService._manifest_path(run_id, stage)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def list_checkpoints(run_id):
+        """Stages of the run that have a checkpoint"""
+        return [stage for stage in STAGES if os.path.isfile(CheckpointService._manifest_path(run_id, stage))]
+
+    @staticmethod
+    def resumable_stages(run_id):
+        """Stages a rerun can start from: the first one, or any after a checkpoint"""
+        checkpoints = set(CheckpointService.list_checkpoints(run_id))
+        return [
+            stage for index, stage in enumerate(STAGES)
+            if index == 0 or STAGES[index - 1] in checkpoints
+        ]
+
+    @staticmethod
+    def initial_state(run):
+        """state_out.json a rerun starts from, None for a full run"""
+        if not run.rerun_from_stage or run.rerun_from_stage == STAGES[0]:
+            return None
+        previous = STAGES[STAGES.index(run.rerun_from_stage) - 1]
+        manifest = CheckpointService.load(run.id, previous)
+        if not manifest or not manifest['state']:
+            return None
+        return os.path.join(RunService.get_project_folder(run.id), manifest['state'])
+
+    @staticmethod
+    def create_rerun(parent, from_stage, overrides=None, session_id=None):
+        """Pending run that repeats `parent` from `from_stage` on.
+
+        Sources and the outputs of the stages before `from_stage` are
+        hard-linked from the parent; overrides are applied to a copy of
+        the configuration.
+        """
+        if not parent.is_finished:
+            raise ValueError('Only finished runs can be rerun')
+        if from_stage not in STAGES:
+            raise ValueError(f"Stage must be one of: {', '.join(stage.value for stage in STAGES)}")
+
+        overrides = overrides or {}
+        if not isinstance(overrides, dict):
+            raise ValueError('Overrides must be an object of configuration keys')
+        for key in overrides:
+            if not CONFIG_KEY_PATTERN.match(key):
+                raise ValueError(f'Invalid configuration key: {key}')
+
+        index = STAGES.index(from_stage)
+        kept_stages = STAGES[:index]
+        manifest = None
+        if kept_stages:
+            manifest = CheckpointService.load(parent.id, kept_stages[-1])
+            if manifest is None:
+                raise ValueError(f'Run {parent.id} has no checkpoint after {kept_stages[-1].value}')
+
+        config = None
+        if overrides:
+            config = RunService.load_config(parent.id)
+            if not isinstance(config, dict):
+                raise ValueError('Overrides need a JSON or YAML configuration')
+            config.update(overrides)
+
+        source_filenames = json.loads(parent.sources_filenames or '[]')
+        run = Run(
+            session_id=session_id or parent.session_id,
+            email=parent.email,
+            priority=parent.priority,
+            design_name=parent.design_name,
+            config_filename='config.json' if config is not None else parent.config_filename,
+            sources_filenames=json.dumps(source_filenames),
+            parent_run_id=parent.id,
+            rerun_from_stage=from_stage,
+            completed_stages=json.dumps([stage.value for stage in kept_stages])
+        )
+        db.session.add(run)
+        db.session.flush()
+        # Before anything is written to disk; rolls the run back when over quota
+        QuotaService.enforce(run.email)
+        RunSummaryService.runs_created(run.email, [run])
+
+        parent_dir = RunService.get_project_folder(parent.id)
+        run_dir = RunService.get_project_folder(run.id)
+        try:
+            os.makedirs(os.path.join(run_dir, CHECKPOINT_DIR), exist_ok=True)
+            for filename in source_filenames:
+                destination = os.path.join(run_dir, filename)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                link_or_copy(os.path.join(parent_dir, filename), destination)
+
+            if config is not None:
+                with open(os.path.join(run_dir, run.config_filename), 'w') as f:
+                    json.dump(config, f, indent=2)
+            else:
+                config_filename = secure_filename(parent.config_filename)
+                link_or_copy(os.path.join(parent_dir, config_filename), os.path.join(run_dir, config_filename))
+
+            for relative in manifest['paths'] if manifest else ():
+                source = os.path.join(parent_dir, relative)
+                if not os.path.isfile(source):
+                    continue
+                destination = os.path.join(run_dir, relative)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                link_or_copy(source, destination)
+
+            # Checkpoints of the reused stages stay valid for the new run
+            for stage in kept_stages:
+                if not os.path.isfile(CheckpointService._manifest_path(parent.id, stage)):
+                    continue
+                link_or_copy(
+                    CheckpointService._manifest_path(parent.id, stage),
+                    CheckpointService._manifest_path(run.id, stage)
+                )
+
+            RunService._commit('create_rerun')
+        except Exception:
+            db.session.rollback()
+            # The id can be reused by the next run, which must not find these files
+            shutil.rmtree(run_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Created run {run.id} rerunning run {parent.id} from {from_stage.value}")
+        return run
+
+    @staticmethod
+    def stage_step(stage):
+        """LibreLane step (--from) that starts a stage"""
+        return current_app.config['LIBRELANE_STAGE_STEPS'].get(stage.value)
+
+
+def _step_slug(step_id):
+    """Step id as LibreLane names its directory: OpenROAD.GlobalRouting -> openroad-globalrouting"""
+    return step_id.lower().replace('.', '-')
+
+
+def _step_number(relative_dir):
+    """Number of the first LibreLane step directory in a relative path"""
+    for part in relative_dir.replace(os.sep, '/').split('/'):
+        match = _STEP_DIR.match(part)
+        if match:
+            return int(match.group(1))
+    return None
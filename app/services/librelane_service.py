@@ -1,6 +1,9 @@
 import os
 import time
 import queue
+import signal
+import socket
+import logging
 import threading
 import subprocess
 
@@ -8,50 +11,263 @@ from datetime import datetime
 
 from flask import current_app
 
+from app import db
 from app.models.run import RunStatus, RunStage
+from app.services.checkpoint_service import STAGES, CheckpointService
+from app.services.log_service import LogService
 from app.services.run_service import RunService
+from app.services.scheduler import RunScheduler
+from app.utils.metrics import registry, RUN_STAGE_DURATION
+from app.utils.resources import (
+    CgroupLimiter,
+    apply_process_limits,
+    available_memory_mb,
+    parse_cpu_list,
+    process_group_rss_mb
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class LibreLaneService:
-    _run_queue = queue.Queue()
+    _run_queue = RunScheduler()
     _active_runs = {}
-    _worker_thread = None
+    _memory_reservations = {}
+    _worker_threads = []
+    _heartbeat_thread = None
+    _cgroups = None
+    _worker_id = None
+    _services_pid = None
     _app = None
 
     @classmethod
     def init_service(cls, app):
         cls._app = app
-        cls._start_worker()
+        cls._run_queue.configure(
+            priority_step=app.config['SCHEDULER_PRIORITY_STEP'],
+            fair_share_step=app.config['SCHEDULER_FAIR_SHARE_STEP'],
+            sjf_weight=app.config['SCHEDULER_SJF_WEIGHT'] if app.config['SCHEDULER_SJF_ENABLED'] else 0.0
+        )
+        cls._register_metrics()
 
     @classmethod
-    def _start_worker(cls):
-        if cls._worker_thread and cls._worker_thread.is_alive():
+    def start_background_services(cls, app):
+        """Starts the inline executor in the current process.
+
+        Must run after any fork (see app.utils.background): threads do not
+        survive fork(), and only one process should own the executor.
+        """
+        cls._app = app
+        # With an external executor the web tier only enqueues and reads status
+        if app.config['RUN_EXECUTOR'] != 'inline' or cls._services_pid == os.getpid():
             return
+        cls._services_pid = os.getpid()
+        cls._start_executor()
+
+        # Runs submitted through the other web processes are claimed from the database
+        threading.Thread(target=cls._poll_loop, args=(threading.Event(),), daemon=True).start()
+
+    @classmethod
+    def _start_executor(cls):
+        cls._worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        cls._cgroups = CgroupLimiter.detect(cls._app.config['RUN_CGROUP_PARENT'])
+        cls._start_workers(cls._app.config['MAX_CONCURRENT_RUNS'])
+
+        if not (cls._heartbeat_thread and cls._heartbeat_thread.is_alive()):
+            cls._heartbeat_thread = threading.Thread(target=cls._heartbeat_loop, daemon=True)
+            cls._heartbeat_thread.start()
+
+    @classmethod
+    def run_worker(cls, app):
+        """Runs the execution engine in the current process until SIGTERM/SIGINT.
+
+        Pending runs are discovered in the shared database and claimed with
+        leases, so any number of such workers can share RUNS_FOLDER.
+        """
+        cls._app = app
+        cls._start_executor()
+
+        stop = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *args: stop.set())
+
+        logger.info(f"Worker {cls._worker_id} started with {app.config['MAX_CONCURRENT_RUNS']} slots")
+        cls._poll_loop(stop)
+
+        logger.info(f"Worker {cls._worker_id} shutting down, requeueing active runs")
+        cls._run_queue.close()
+        for active in list(cls._active_runs.values()):
+            active.request_stop('shutdown')
+            if active.process is not None:
+                _signal_process_group(active.process, signal.SIGTERM)
+        for thread in cls._worker_threads:
+            thread.join(timeout=app.config['CANCEL_GRACE_PERIOD'] + 5)
+
+    @classmethod
+    def _poll_loop(cls, stop):
+        while not stop.is_set():
+            try:
+                with cls._app.app_context():
+                    cls._poll_pending_runs()
+            except Exception as e:
+                logger.error(f"Worker {cls._worker_id} failed to poll runs: {str(e)}")
+            stop.wait(cls._app.config['WORKER_POLL_INTERVAL'])
+
+    @classmethod
+    def _poll_pending_runs(cls):
+        requeued = RunService.requeue_expired_runs()
+        if requeued:
+            logger.warning(f"Requeued runs with expired leases: {requeued}")
+
+        config = cls._app.config
+        capacity = config['WORKER_PREFETCH'] - cls._run_queue.qsize()
+        if capacity <= 0:
+            return
+        # The whole window is read, runs already queued here take part of it
+        for run in RunService.get_claimable_runs(config['WORKER_PREFETCH'], config['WORKER_PREFETCH_PER_EMAIL']):
+            if capacity <= 0:
+                break
+            if run.id not in cls._run_queue and run.id not in cls._active_runs:
+                cls._enqueue(run)
+                capacity -= 1
+
+    @classmethod
+    def _heartbeat_loop(cls):
+        """Renews leases of active runs and picks up cancellations made elsewhere.
+
+        A run whose lease could not be renewed has expired and may already
+        run on another worker: it is stopped here without writing anything
+        more to it.
+        """
+        interval = cls._app.config['RUN_HEARTBEAT_INTERVAL']
+        while True:
+            time.sleep(interval)
+            run_ids = list(cls._active_runs)
+            if not run_ids:
+                continue
+            try:
+                with cls._app.app_context():
+                    renewed = set(RunService.renew_leases(run_ids, cls._worker_id, cls._app.config['RUN_LEASE_TTL']))
+                    for run_id in run_ids:
+                        active = cls._active_runs.get(run_id)
+                        if run_id in renewed or not active or active.stop_event.is_set():
+                            continue
+                        logger.error(f"Worker {cls._worker_id} lost the lease of run {run_id}, stopping it")
+                        active.request_stop('lease_lost')
+                        if active.process is not None:
+                            _signal_process_group(active.process, signal.SIGTERM)
+                    for run_id in RunService.get_cancelled_run_ids(run_ids):
+                        active = cls._active_runs.get(run_id)
+                        if active and not active.stop_event.is_set():
+                            active.request_stop('cancelled')
+                            if active.process is not None:
+                                _signal_process_group(active.process, signal.SIGTERM)
+            except Exception as e:
+                logger.error(f"Lease heartbeat failed: {str(e)}")
+
+    @classmethod
+    def _register_metrics(cls):
+        # Read from the database: the executor may run in another web
+        # process or in worker.py processes, which expose no metrics
+        registry.gauge(
+            'librelane_queue_depth',
+            'Runs waiting to be executed',
+            lambda: RunService.count_runs(RunStatus.PENDING)
+        )
+        registry.gauge(
+            'librelane_active_runs',
+            'Runs currently being executed',
+            lambda: RunService.count_runs(RunStatus.RUNNING)
+        )
+
+    @classmethod
+    def _start_workers(cls, count):
+        cls._worker_threads = [thread for thread in cls._worker_threads if thread.is_alive()]
         
-        cls._worker_thread = threading.Thread(target=cls._worker_loop, daemon=True)
-        cls._worker_thread.start()
+        while len(cls._worker_threads) < count:
+            thread = threading.Thread(target=cls._worker_loop, daemon=True)
+            thread.start()
+            cls._worker_threads.append(thread)
 
     @classmethod
     def _worker_loop(cls):
         while True:
-            run_id = cls._run_queue.get()
+            run_id = cls._run_queue.get(admit=cls._admit)
             if run_id is None:
                 break
             
-            with cls._app.app_context():
-                cls._execute_librelane(run_id)
-            
-            cls._run_queue.task_done()
+            try:
+                with cls._app.app_context():
+                    if not RunService.claim_run(run_id, cls._worker_id, current_app.config['RUN_LEASE_TTL']):
+                        # Cancelled or claimed by another worker meanwhile
+                        continue
+                    try:
+                        if current_app.config.get('LIBRELANE_COMMAND'):
+                            cls._librelane(run_id)
+                        else:
+                            cls._execute_librelane(run_id)
+                    finally:
+                        RunService.release_lease(run_id, cls._worker_id)
+            finally:
+                cls._memory_reservations.pop(run_id, None)
+                cls._run_queue.notify()
+
+    @classmethod
+    def _admit(cls, entry):
+        """Admits a queued run only if its predicted memory fits the free headroom.
+
+        Called under the scheduler lock, so the reservation made here is
+        visible to the next admission check right away.
+        """
+        predicted = entry.memory_mb or 0
+        if cls._memory_reservations and predicted:
+            available = available_memory_mb()
+            if available is not None:
+                # Runs that are still ramping up will take more than they use now
+                ramp_up = sum(
+                    max(0, reserved - cls._observed_memory(run_id))
+                    for run_id, reserved in cls._memory_reservations.items()
+                )
+                headroom = available - cls._app.config['MEMORY_RESERVE_MB'] - ramp_up
+                if predicted > headroom:
+                    return False
+
+        cls._memory_reservations[entry.run_id] = predicted
+        return True
+
+    @classmethod
+    def _observed_memory(cls, run_id):
+        active = cls._active_runs.get(run_id)
+        return active.peak_memory_mb or 0 if active else 0
+
+    @classmethod
+    def _allocate_cpus(cls):
+        """Picks RUN_CPUS_PER_RUN CPUs, preferring ones no other run is pinned to"""
+        per_run = cls._app.config['RUN_CPUS_PER_RUN']
+        if not per_run or not hasattr(os, 'sched_getaffinity'):
+            return None
+
+        pool = parse_cpu_list(cls._app.config['RUN_CPU_POOL']) if cls._app.config['RUN_CPU_POOL'] \
+            else os.sched_getaffinity(0)
+        usage = {cpu: 0 for cpu in pool}
+        for active in list(cls._active_runs.values()):
+            for cpu in active.cpus or ():
+                if cpu in usage:
+                    usage[cpu] += 1
+        return set(sorted(usage, key=lambda cpu: (usage[cpu], cpu))[:per_run])
 
     @classmethod
     def _execute_librelane(cls, run_id):
+        """Simulated LibreLane run, used when LIBRELANE_COMMAND is not set"""
         from app.models.run import Run
         
         run = Run.query.get(run_id)
         if not run:
             return
         
-        cls._active_runs[run_id] = True
+        active = _ActiveRun(run_id, current_app.config['PROCESSING_TIMEOUT'])
+        cls._active_runs[run_id] = active
 
         try:
             # Обновляем статус
@@ -67,12 +283,18 @@ class LibreLaneService:
                 (RunStage.FINISHED, 100, "Finalizing...")
             ]
             
-            completed_stages = []
+            completed_stages = run.completed_stages_list
             for stage, target_progress, stage_message in stages:
                 # Проверяем не отменен ли запуск
-                if run_id not in cls._active_runs:
+                if active.should_stop():
                     break
+
+                # Стадии, взятые из контрольной точки родительского запуска
+                if stage.value in completed_stages:
+                    continue
                 
+                stage_started = time.monotonic()
+
                 # Обновляем текущую стадию
                 RunService.update_run_stage(
                     run_id, 
@@ -87,11 +309,10 @@ class LibreLaneService:
                 
                 # Имитация прогресса внутри стадии
                 for step in range(5):
-                    if run_id not in cls._active_runs:
+                    active.stop_event.wait(0.5)  # Имитация работы
+                    if active.should_stop():
                         break
                     
-                    time.sleep(0.5)  # Имитация работы
-                    
                     # Постепенно увеличиваем прогресс
                     current_progress = target_progress - 10 + (step * 2)
                     RunService.update_run_stage(
@@ -103,8 +324,12 @@ class LibreLaneService:
                     
                     # Добавляем прогресс в логи
                     RunService.update_run_logs(run_id, log_content=f"Progress: {current_progress}%\n")
+
+                if active.should_stop():
+                    break
                 
                 # Завершаем стадию
+                RUN_STAGE_DURATION.observe(time.monotonic() - stage_started, stage.value)
                 completed_stages.append(stage.value)
                 RunService.update_run_stage(
                     run_id, 
@@ -114,22 +339,17 @@ class LibreLaneService:
                 )
                 
                 RunService.update_run_logs(run_id, log_content=f"Stage {stage.value} completed\n")
+                cls._save_checkpoint(run_id, stage)
             
-            # Завершаем запуск
-            if cls._active_runs.get(run_id):
-                RunService.set_run_status(run_id, 'completed', end_time=datetime.utcnow())
-                # Создаем архив с результатами
-                archive_path = RunService.create_results_archive(run_id)
-                if archive_path:
-                    RunService.update_run_logs(run_id, log_content=f"\nResults archived: {archive_path}\n")
-                RunService.update_run_logs(run_id, log_content="\n=== RUN COMPLETED SUCCESSFULLY ===\n")
-            else:
-                RunService.set_run_status(run_id, 'cancelled', end_time=datetime.utcnow())
-                RunService.update_run_logs(run_id, log_content="\n=== RUN CANCELLED ===\n")
+            cls._finish_run(active, succeeded=True)
 
         except Exception as e:
-            RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
-            RunService.update_run_logs(run_id, log_content=str(e))
+            if active.lease_lost:
+                logger.warning(f"Run {run_id} failed after losing its lease: {str(e)}")
+            else:
+                RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
+                RunService.update_run_logs(run_id, log_content=str(e))
+                RunService.compress_logs(run_id)
         finally:
             cls._active_runs.pop(run_id, None)
 
@@ -141,6 +361,12 @@ class LibreLaneService:
         if not run:
             return
         
+        active = _ActiveRun(run_id, current_app.config['PROCESSING_TIMEOUT'])
+        active.completed_stages = run.completed_stages_list
+        cls._active_runs[run_id] = active
+        grace_period = current_app.config['CANCEL_GRACE_PERIOD']
+        process = None
+
         try:
             project_dir = RunService.get_project_folder(run_id)
             config_path = os.path.join(project_dir, run.config_filename)
@@ -156,56 +382,241 @@ class LibreLaneService:
                 '--run-dir', project_dir,
                 '--log', os.path.join(project_dir, 'output.log')
             ]
+            if run.rerun_from_stage:
+                # Earlier stages' outputs are hard-linked from the parent run
+                cmd += ['--from', CheckpointService.stage_step(run.rerun_from_stage)]
+                initial_state = CheckpointService.initial_state(run)
+                if initial_state:
+                    cmd += ['--with-initial-state', initial_state]
             
+            active.cpus = cls._allocate_cpus()
+            if cls._cgroups:
+                # Limits are in place before LibreLane starts
+                cls._cgroups.prepare(
+                    run_id,
+                    memory_mb=current_app.config['RUN_MEMORY_LIMIT_MB'],
+                    cpus=active.cpus
+                )
+                cmd = cls._cgroups.wrap_command(run_id, cmd)
+
+            # Own session/process group, so yosys, openroad and other child
+            # tools can be signalled together with LibreLane itself
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                cwd=librelane_base_dir or None
+                bufsize=1,
+                cwd=librelane_base_dir or None,
+                start_new_session=True
             )
-            
-            cls._active_runs[run_id] = process
-            
-            output_lines = []
+            active.process = process
+            cls._apply_limits(active)
+
+            output = queue.Queue()
+            readers = [
+                threading.Thread(target=_pump_stream, args=(process.stdout, '', output), daemon=True),
+                threading.Thread(target=_pump_stream, args=(process.stderr, 'STDERR: ', output), daemon=True)
+            ]
+            for reader in readers:
+                reader.start()
+
             while True:
-                if run_id not in cls._active_runs or cls._active_runs[run_id] is False:
-                    process.terminate()
-                    RunService.set_run_status(run_id, 'cancelled', end_time=datetime.utcnow())
+                if active.should_stop():
+                    _terminate_process_group(process, grace_period)
                     break
-                if process.poll() is not None:
+
+                active.sample_memory()
+                if active.scan_due():
+                    cls._track_step_dirs(active, project_dir)
+
+                chunk = _drain_output(output, timeout=0.5)
+                if chunk:
+                    RunService.update_run_logs(run_id, log_content=chunk)
+                    cls._track_stages(active, chunk)
+                elif process.poll() is not None:
                     break
-                stdout_line = process.stdout.readline()
-                if stdout_line:
-                    RunService.update_run_logs(run_id, log_content=stdout_line)
-                stderr_line = process.stderr.readline()
-                if stderr_line:
-                    RunService.update_run_logs(run_id, log_content=f"STDERR: {stderr_line}")
-            
-            stdout, stderr = process.communicate()
-            if stdout:
-                RunService.update_run_logs(run_id, log_content=stdout)
-            if stderr:
-                RunService.update_run_logs(run_id, log_content=stderr)
-            
-            if process.returncode == 0:
-                RunService.set_run_status(run_id, 'completed', end_time=datetime.utcnow())
-                RunService.complete(run_id)
-            else:
-                RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
-            RunService.create_results_archive(run_id)
+
+            process.wait()
+            for reader in readers:
+                reader.join(timeout=grace_period)
+
+            chunk = _drain_output(output)
+            if chunk and not active.lease_lost:
+                RunService.update_run_logs(run_id, log_content=chunk)
+                cls._track_stages(active, chunk)
+            if not active.lease_lost:
+                cls._track_step_dirs(active, project_dir)
+
+            cls._finish_run(active, succeeded=process.returncode == 0)
                 
         except Exception as e:
-            RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
-            RunService.update_run_logs(run_id, log_content=str(e))
+            if active.lease_lost:
+                logger.warning(f"Run {run_id} failed after losing its lease: {str(e)}")
+            else:
+                RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
+                RunService.update_run_logs(run_id, log_content=str(e))
+                RunService.compress_logs(run_id)
         finally:
-            if process and process.poll() is None:
-                process.terminate()
+            if process is not None:
+                # Reap whatever is left of the group, even after a clean exit
+                _terminate_process_group(process, grace_period)
+                cls._record_peak_memory(active)
+            elif cls._cgroups:
+                cls._cgroups.release(run_id)
             cls._active_runs.pop(run_id, None)
 
+    @classmethod
+    def _apply_limits(cls, active):
+        """Applies per-run resource limits and records them on the run"""
+        config = cls._app.config
+
+        limits = apply_process_limits(
+            active.process.pid,
+            memory_mb=config['RUN_MEMORY_LIMIT_MB'],
+            nice=config['RUN_NICE'],
+            cpus=active.cpus
+        )
+        if cls._cgroups:
+            limits['cgroup'] = cls._cgroups.path(active.run_id)
+
+        RunService.set_run_resources(active.run_id, limits=limits)
+
+    @classmethod
+    def _record_peak_memory(cls, active):
+        peak = active.peak_memory_mb
+        if cls._cgroups:
+            peak = cls._cgroups.peak_memory_mb(active.run_id) or peak
+            cls._cgroups.release(active.run_id)
+        if peak and not active.lease_lost:
+            RunService.set_run_resources(active.run_id, peak_memory_mb=peak)
+
+    @classmethod
+    def _finish_run(cls, active, succeeded):
+        """Commits the final status of a run and compresses its log"""
+        run_id = active.run_id
+
+        if active.lease_lost:
+            # The run belongs to another worker now, its status is theirs to write
+            logger.warning(f"Run {run_id} stopped after losing its lease, leaving its status alone")
+            return
+        if active.stop_reason == 'shutdown':
+            RunService.requeue_run(run_id)
+            RunService.update_run_logs(run_id, log_content="\n=== WORKER SHUT DOWN, RUN REQUEUED ===\n")
+        elif active.stop_reason == 'cancelled':
+            RunService.set_run_status(run_id, 'cancelled', end_time=datetime.utcnow())
+            RunService.update_run_logs(run_id, log_content="\n=== RUN CANCELLED ===\n")
+        elif active.stop_reason == 'timeout':
+            RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
+            RunService.update_run_logs(
+                run_id,
+                log_content=f"\n=== RUN TIMED OUT after {current_app.config['PROCESSING_TIMEOUT']}s ===\n"
+            )
+        elif succeeded:
+            cls._complete_stage(active)
+            RunService.set_run_status(run_id, 'completed', end_time=datetime.utcnow())
+            cls._record_metrics(run_id)
+            # Создаем архив с результатами
+            archive_path = RunService.create_results_archive(run_id)
+            if archive_path:
+                RunService.update_run_logs(run_id, log_content=f"\nResults archived: {archive_path}\n")
+            RunService.update_run_logs(run_id, log_content="\n=== RUN COMPLETED SUCCESSFULLY ===\n")
+        else:
+            RunService.set_run_status(run_id, 'failed', end_time=datetime.utcnow())
+            RunService.create_results_archive(run_id)
+            RunService.update_run_logs(run_id, log_content="\n=== RUN FAILED ===\n")
+        # The worker has stopped appending, a requeued run is left uncompressed
+        RunService.compress_logs(run_id)
+
+    @classmethod
+    def _track_stages(cls, active, chunk):
+        """Follows `=== STAGE ===` markers of the output, printed by wrapper scripts"""
+        for stage in LogService.detect_stages(chunk):
+            if stage != active.stage:
+                cls._enter_stage(active, stage)
+
+    @classmethod
+    def _track_step_dirs(cls, active, run_dir):
+        """Follows the step directories LibreLane creates (see LIBRELANE_STAGE_STEPS)"""
+        current = STAGES.index(active.stage) if active.stage in STAGES else -1
+        for stage in CheckpointService.started_stages(run_dir):
+            # Entered in flow order, so every stage passed through is checkpointed
+            if STAGES.index(stage) > current:
+                cls._enter_stage(active, stage)
+
+    @classmethod
+    def _enter_stage(cls, active, stage):
+        """A new stage completes the previous one"""
+        cls._complete_stage(active)
+        active.stage = stage
+        RunService.update_run_stage(
+            active.run_id,
+            stage.value,
+            active.completed_stages,
+            _stage_progress(active.completed_stages)
+        )
+
+    @classmethod
+    def _complete_stage(cls, active):
+        """Marks the current stage completed and checkpoints its outputs"""
+        stage = active.stage
+        if stage is None or stage.value in active.completed_stages:
+            return
+        active.completed_stages.append(stage.value)
+        RunService.update_run_stage(
+            active.run_id,
+            stage.value,
+            active.completed_stages,
+            _stage_progress(active.completed_stages)
+        )
+        cls._save_checkpoint(active.run_id, stage)
+
+    @classmethod
+    def _save_checkpoint(cls, run_id, stage):
+        try:
+            CheckpointService.save(run_id, stage)
+        except Exception as e:
+            logger.error(f"Failed to checkpoint run {run_id} after {stage.value}: {str(e)}")
+
+    @classmethod
+    def _record_metrics(cls, run_id):
+        """Extracts PPA metrics; a broken report must not fail the run"""
+        # Imported here to keep numpy out of the web processes' startup
+        from app.services.run_metrics_service import RunMetricsService
+
+        try:
+            RunMetricsService.record_metrics(run_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to record metrics of run {run_id}: {str(e)}")
+
     @classmethod
     def submit_run(cls, run_id):
-        cls._run_queue.put(run_id)
+        # External workers, or the web process owning the inline executor,
+        # pick pending runs up from the database
+        if current_app.config['RUN_EXECUTOR'] != 'inline' or cls._services_pid != os.getpid():
+            return
+
+        from app.models.run import Run
+
+        run = Run.query.get(run_id)
+        if run:
+            cls._enqueue(run)
+
+    @classmethod
+    def _enqueue(cls, run):
+        expected_runtime = None
+        if current_app.config['SCHEDULER_SJF_ENABLED']:
+            expected_runtime = RunService.get_expected_runtime(run.email)
+
+        cls._run_queue.put(
+            run.id,
+            run.email,
+            priority=run.priority or 0,
+            expected_runtime=expected_runtime,
+            submitted_at=run.created_at.timestamp() if run.created_at else None,
+            memory_mb=RunService.get_expected_memory(run.email)
+        )
 
     @classmethod
     def cancel_run(cls, run_id):
@@ -213,24 +624,132 @@ class LibreLaneService:
         
         run = Run.query.get(run_id)
         if not run:
-            return
-        run.status = RunStatus.CANCELLED
-
-        if run_id in cls._active_runs:
-            # FIXME
-            """
-            process = cls._active_runs[run_id]
-            if process and process.poll() is None:
-                try:
-                    process.terminate()
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    process.wait()
-
-                RunService.update_run_logs(run_id, log_content="Run was cancelled by user\n")
-            """
-            
-            cls._active_runs.pop(run_id, None)
+            return False
+
+        if cls._run_queue.remove(run_id):
+            RunService.set_run_status(run_id, 'cancelled', end_time=datetime.utcnow())
+            RunService.update_run_logs(run_id, log_content="Run was cancelled by user\n")
+            RunService.compress_logs(run_id)
+            return True
+
+        active = cls._active_runs.get(run_id)
+        if active:
+            # The worker escalates to SIGKILL and commits the final status and
+            # log itself; writing them here would race with its appends
+            active.request_stop('cancelled')
+            if active.process is not None:
+                _signal_process_group(active.process, signal.SIGTERM)
+            return True
+
+        # Queued or running in another process: its executor notices the
+        # status on the next lease heartbeat or claim attempt
+        if run.status in (RunStatus.PENDING, RunStatus.RUNNING):
+            pending = run.status == RunStatus.PENDING
+            RunService.set_run_status(run_id, 'cancelled', end_time=datetime.utcnow() if pending else None)
+            RunService.update_run_logs(run_id, log_content="Run was cancelled by user\n")
+            if pending:
+                # A running one is compressed by its executor once it stops
+                RunService.compress_logs(run_id)
             return True
         return False
+
+
+class _ActiveRun:
+    """Execution state of a run owned by a worker thread"""
+
+    MEMORY_SAMPLE_INTERVAL = 2.0
+    STEP_SCAN_INTERVAL = 2.0
+
+    def __init__(self, run_id, timeout=None):
+        self.run_id = run_id
+        self.process = None
+        self.cpus = None
+        self.peak_memory_mb = None
+        self.stage = None
+        self.completed_stages = []
+        self.stop_reason = None
+        self.stop_event = threading.Event()
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._next_sample = 0.0
+        self._next_scan = 0.0
+
+    def sample_memory(self):
+        """Tracks peak RSS of the process group, at most every MEMORY_SAMPLE_INTERVAL"""
+        now = time.monotonic()
+        if self.process is None or now < self._next_sample:
+            return
+        self._next_sample = now + self.MEMORY_SAMPLE_INTERVAL
+        rss = process_group_rss_mb(self.process.pid)
+        if rss is not None:
+            self.peak_memory_mb = max(self.peak_memory_mb or 0, rss)
+
+    def scan_due(self):
+        """Whether the run directory should be checked for new steps, at most every STEP_SCAN_INTERVAL"""
+        now = time.monotonic()
+        if now < self._next_scan:
+            return False
+        self._next_scan = now + self.STEP_SCAN_INTERVAL
+        return True
+
+    def request_stop(self, reason):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        self.stop_event.set()
+
+    @property
+    def lease_lost(self):
+        return self.stop_reason == 'lease_lost'
+
+    def should_stop(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.request_stop('timeout')
+        return self.stop_event.is_set()
+
+
+def _stage_progress(completed_stages):
+    done = sum(1 for stage in STAGES if stage.value in completed_stages)
+    return int(100 * done / len(STAGES))
+
+
+def _pump_stream(stream, prefix, output):
+    for line in iter(stream.readline, ''):
+        output.put(prefix + line)
+    stream.close()
+
+
+def _drain_output(output, timeout=None, max_lines=1000):
+    """Collects pending output lines into one chunk, waiting up to timeout for the first"""
+    lines = []
+    try:
+        lines.append(output.get(timeout=timeout) if timeout else output.get_nowait())
+        while len(lines) < max_lines:
+            lines.append(output.get_nowait())
+    except queue.Empty:
+        pass
+    return ''.join(lines)
+
+
+def _signal_process_group(process, sig):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, sig)
+        elif sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _terminate_process_group(process, grace_period):
+    """SIGTERM to the whole group, SIGKILL after grace_period, then reap"""
+    if process.poll() is None:
+        _signal_process_group(process, signal.SIGTERM)
+        try:
+            process.wait(timeout=grace_period)
+        except subprocess.TimeoutExpired:
+            pass
+    # Children may outlive the leader (or ignore SIGTERM), so the group
+    # is always killed once the leader is gone or out of time
+    _signal_process_group(process, getattr(signal, 'SIGKILL', signal.SIGTERM))
+    process.wait()
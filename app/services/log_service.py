@@ -0,0 +1,470 @@
+import re
+import time
+import bisect
+import logging
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from app import db
+from app.models.run import RunStage
+from app.models.run_log_block import RunLogBlock
+from app.models.run_log_line import RunLogLine
+from app.utils.compression import compress_block, zstandard
+
+try:
+    import re2
+except ImportError:  # optional dependency
+    re2 = None
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+# Checked in order, the first match wins
+_LEVEL_PATTERNS = (
+    ('ERROR', re.compile(r'\b(error|fatal|critical)\b', re.IGNORECASE)),
+    ('WARNING', re.compile(r'\bwarn(ing)?\b', re.IGNORECASE)),
+    ('DEBUG', re.compile(r'\bdebug\b', re.IGNORECASE)),
+)
+_TIMESTAMP_PREFIX = re.compile(r'^\[\d{2}:\d{2}:\d{2}\] ')
+_STAGE_MARKER = re.compile(r'^=== (\w+) ===$')
+_STAGE_VALUES = {stage.value: stage for stage in RunStage}
+
+STDERR_PREFIX = 'STDERR: '
+
+# Characters the overlap check of search quantifiers tries: ASCII and a few others
+_PROBE_CHARS = tuple(chr(code) for code in range(128)) + ('\u00a0', '\u00e9', '\u0416', '\u0663', '\u4e2d')
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: str.isdecimal,
+    sre_parse.CATEGORY_SPACE: str.isspace,
+    sre_parse.CATEGORY_WORD: lambda char: char.isalnum() or char == '_',
+}
+
+
+class LogService:
+    """Line index of run logs and server-side filtering over it"""
+
+    @staticmethod
+    def append(run, text):
+        """Appends text to the run log, returns the previous log length"""
+        if run.log_compressed:
+            return LogService._append_compressed(run, text)
+
+        old_length = len(run.log_content or '')
+        if run.log_content:
+            run.log_content += text
+        else:
+            run.log_content = text
+        return old_length
+
+    @staticmethod
+    def compress(run):
+        """Moves a log into independently compressed blocks.
+
+        Each block is LOG_BLOCK_SIZE characters, so a range or tail read
+        decompresses only the blocks it overlaps.
+        """
+        if run.log_compressed:
+            return 0
+        text = run.log_content or ''
+        blocks = LogService._build_blocks(run.id, text, 0, 0)
+        if blocks:
+            db.session.execute(insert(RunLogBlock), blocks)
+        run.log_content = None
+        run.log_compressed = True
+        return len(blocks)
+
+    @staticmethod
+    def _append_compressed(run, text):
+        block_size = current_app.config['LOG_BLOCK_SIZE']
+        last = db.session.execute(
+            select(RunLogBlock)
+            .where(RunLogBlock.run_id == run.id)
+            .order_by(RunLogBlock.seq.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+        if last is None:
+            blocks = LogService._build_blocks(run.id, text, 0, 0)
+            old_length = 0
+        elif last.length < block_size:
+            # The last block is rewritten together with the new text
+            old_length = last.offset + last.length
+            blocks = LogService._build_blocks(run.id, last.text + text, last.offset, last.seq)
+            first = blocks.pop(0)
+            last.length = first['length']
+            last.codec = first['codec']
+            last.data = first['data']
+        else:
+            old_length = last.offset + last.length
+            blocks = LogService._build_blocks(run.id, text, old_length, last.seq + 1)
+
+        if blocks:
+            db.session.execute(insert(RunLogBlock), blocks)
+        return old_length
+
+    @staticmethod
+    def _build_blocks(run_id, text, offset, seq):
+        config = current_app.config
+        block_size = config['LOG_BLOCK_SIZE']
+        codec = config['LOG_COMPRESSION']
+        if codec == 'zstd' and zstandard is None:
+            codec = 'zlib'
+
+        blocks = []
+        for start in range(0, len(text), block_size):
+            chunk = text[start:start + block_size]
+            blocks.append({
+                'run_id': run_id,
+                'seq': seq,
+                'offset': offset + start,
+                'length': len(chunk),
+                'codec': codec,
+                'data': compress_block(chunk.encode('utf-8'), codec, config['LOG_COMPRESSION_LEVEL'])
+            })
+            seq += 1
+        return blocks
+
+    @staticmethod
+    def index_appended(run, old_length, timestamp=None):
+        """Indexes the lines of the run log starting at old_length.
+
+        An incomplete last line is re-parsed together with the new text.
+        A run without any indexed lines is indexed from the beginning,
+        which also backfills logs written before the index existed.
+        Must be called inside the transaction that appended the text.
+        """
+        timestamp = timestamp or datetime.utcnow()
+
+        last = db.session.execute(
+            select(RunLogLine)
+            .where(RunLogLine.run_id == run.id)
+            .order_by(RunLogLine.seq.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+        if last is None:
+            start, seq = 0, 0
+            stage = run.current_stage if old_length == 0 else RunStage.NONE
+        elif last.offset + last.length == old_length:
+            # The last line had no line break yet, it continues in the new text
+            start, seq, stage = last.offset, last.seq, last.stage
+        else:
+            start, seq, stage = old_length, last.seq + 1, run.current_stage
+
+        rows = LogService.parse_lines(run.read_log(start), start, seq, stage, timestamp)
+        if not rows:
+            return 0
+
+        if last is not None and rows[0]['seq'] == last.seq:
+            first = rows.pop(0)
+            last.length = first['length']
+            last.stream = first['stream']
+            last.stage = first['stage']
+            last.level = first['level']
+
+        if rows:
+            for row in rows:
+                row['run_id'] = run.id
+            db.session.execute(insert(RunLogLine), rows)
+        return len(rows)
+
+    @staticmethod
+    def parse_lines(text, base_offset, seq, stage, timestamp):
+        """Splits text found at base_offset of the log into line index rows"""
+        rows = []
+        offset = 0
+        length = len(text)
+
+        while offset < length:
+            end = text.find('\n', offset)
+            if end == -1:
+                end = length
+            line = text[offset:end]
+            stage = LogService._detect_stage(line) or stage
+
+            rows.append({
+                'seq': seq,
+                'offset': base_offset + offset,
+                'length': end - offset,
+                'timestamp': timestamp,
+                'stream': 'stderr' if STDERR_PREFIX in line[:20] else 'stdout',
+                'stage': stage,
+                'level': LogService.detect_level(line)
+            })
+            seq += 1
+            offset = end + 1
+        return rows
+
+    @staticmethod
+    def detect_level(text):
+        for level, pattern in _LEVEL_PATTERNS:
+            if pattern.search(text):
+                return level
+        return 'INFO'
+
+    @staticmethod
+    def detect_stages(text):
+        """Stages announced by `=== STAGE ===` marker lines of text, in order"""
+        stages = []
+        if '===' not in text:
+            return stages
+        for line in text.splitlines():
+            stage = LogService._detect_stage(line)
+            if stage:
+                stages.append(stage)
+        return stages
+
+    @staticmethod
+    def _detect_stage(text):
+        match = _STAGE_MARKER.match(_TIMESTAMP_PREFIX.sub('', text).strip())
+        if match:
+            return _STAGE_VALUES.get(match.group(1).lower())
+        return None
+
+    @staticmethod
+    def query_lines(run, stages=None, levels=None, search=None, regex=False,
+                    after=None, before=None, tail=False, limit=None):
+        """Returns up to `limit` matching lines and cursors to continue from.
+
+        Stage and level filters and the cursor are resolved by the
+        (run_id, stage|level, seq) indexes. Text search runs only over
+        those candidates, in batches, and stops after LOG_SEARCH_SCAN_LIMIT
+        lines; `has_more` then tells the client to continue from the cursor.
+        Lines are read backwards from `before`, or from the end with `tail`.
+        A search also stops after LOG_SEARCH_TIME_LIMIT seconds the same way.
+        """
+        config = current_app.config
+        limit = min(limit or config['LOG_PAGE_SIZE'], config['LOG_PAGE_MAX'])
+        scan_limit = config['LOG_SEARCH_SCAN_LIMIT']
+        deadline = time.monotonic() + config['LOG_SEARCH_TIME_LIMIT'] if search else None
+        batch_size = max(limit, 1000) if search else limit + 1
+        backwards = tail or before is not None
+
+        if not LogService.is_indexed(run):
+            LogService.index_appended(run, run.log_length)
+            db.session.commit()
+
+        matcher = LogService._matcher(search, regex)
+        text_of = LogService._text_reader(run)
+
+        statement = select(RunLogLine).where(RunLogLine.run_id == run.id)
+        if stages:
+            statement = statement.where(RunLogLine.stage.in_(stages))
+        if levels:
+            statement = statement.where(RunLogLine.level.in_(levels))
+
+        cursor = before if backwards else after
+        lines = []
+        scanned = 0
+        first_seq = last_seq = None
+        has_more = False
+
+        while True:
+            batch_statement = statement
+            if backwards:
+                if cursor is not None:
+                    batch_statement = batch_statement.where(RunLogLine.seq < cursor)
+                batch_statement = batch_statement.order_by(RunLogLine.seq.desc())
+            else:
+                if cursor is not None:
+                    batch_statement = batch_statement.where(RunLogLine.seq > cursor)
+                batch_statement = batch_statement.order_by(RunLogLine.seq)
+            batch = db.session.execute(batch_statement.limit(batch_size)).scalars().all()
+
+            for line in batch:
+                if len(lines) >= limit or scanned >= scan_limit \
+                        or (deadline is not None and time.monotonic() >= deadline):
+                    has_more = True
+                    break
+                scanned += 1
+                cursor = line.seq
+                first_seq = line.seq if first_seq is None else min(first_seq, line.seq)
+                last_seq = line.seq if last_seq is None else max(last_seq, line.seq)
+
+                text = text_of(line)
+                if matcher is None or matcher(text):
+                    lines.append(line.to_dict(text))
+
+            if has_more or len(batch) < batch_size:
+                break
+
+        if backwards:
+            lines.reverse()
+
+        return {
+            'lines': lines,
+            'after': last_seq if last_seq is not None else after,
+            'before': first_seq if first_seq is not None else before,
+            'has_more': has_more,
+            'scanned': scanned
+        }
+
+    @staticmethod
+    def is_indexed(run):
+        return db.session.execute(
+            select(RunLogLine.id).where(RunLogLine.run_id == run.id).limit(1)
+        ).first() is not None
+
+    @staticmethod
+    def _matcher(search, regex):
+        if not search:
+            return None
+        if regex:
+            pattern = LogService._compile_search(search)
+            if re2 is None:
+                # Bounds the time a single backtracking match can take
+                end = current_app.config['LOG_SEARCH_REGEX_LINE']
+                return lambda text: pattern.search(text, 0, end) is not None
+            return lambda text: pattern.search(text) is not None
+        needle = search.lower()
+        return lambda text: needle in text.lower()
+
+    @staticmethod
+    def _compile_search(search):
+        """Compiles a user supplied pattern without exposing the server to ReDoS.
+
+        re2 matches in linear time and is used when installed. Python's
+        backtracking `re` only gets patterns whose backtracking stays
+        bounded: no backreferences, no repeats or alternations inside a
+        repeat, at most one unbounded quantifier, and no two variable
+        length repeats that can match the same characters (`.*.*X`,
+        `[ab]{1,60}[ab]{1,60}c`). Such patterns then only see the first
+        LOG_SEARCH_REGEX_LINE characters of each line.
+        """
+        if re2 is not None:
+            try:
+                return re2.compile(search)
+            except re2.error as e:
+                raise re.error(str(e))
+
+        repeats = []
+        LogService._check_backtracking(sre_parse.parse(search), repeats)
+        if sum(1 for high, chars in repeats if high == sre_parse.MAXREPEAT) > 1:
+            raise re.error('at most one unbounded quantifier is supported in log search')
+        for index, (_, chars) in enumerate(repeats):
+            if any(chars & other for _, other in repeats[index + 1:]):
+                raise re.error('quantifiers that can match the same characters are not supported in log search')
+        return re.compile(search)
+
+    @staticmethod
+    def _check_backtracking(items, repeats, in_repeat=False):
+        """Raises re.error for constructs that backtrack exponentially.
+
+        Collects (max, characters) of every variable length repeat into
+        `repeats`, characters being those of _PROBE_CHARS it can match.
+        """
+        for op, av in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) \
+                    or op == getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+                low, high, body = av
+                if high > 1:
+                    if in_repeat:
+                        raise re.error('nested quantifiers are not supported in log search')
+                    if low != high:
+                        repeats.append((high, _matched_chars(body)))
+                LogService._check_backtracking(body, repeats, in_repeat or high > 1)
+            elif op == sre_parse.BRANCH:
+                if in_repeat:
+                    raise re.error('alternations inside a quantifier are not supported in log search')
+                for branch in av[1]:
+                    LogService._check_backtracking(branch, repeats, in_repeat)
+            elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+                raise re.error('backreferences are not supported in log search')
+            elif op == sre_parse.SUBPATTERN:
+                LogService._check_backtracking(av[-1], repeats, in_repeat)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                LogService._check_backtracking(av[1], repeats, in_repeat)
+            elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+                LogService._check_backtracking(av, repeats, in_repeat)
+
+    @staticmethod
+    def _text_reader(run):
+        if not run.log_compressed:
+            content = run.log_content or ''
+            return lambda line: content[line.offset:line.offset + line.length]
+
+        # Blocks are decompressed on first use and kept for the request
+        blocks = db.session.execute(
+            select(RunLogBlock.id, RunLogBlock.offset, RunLogBlock.length)
+            .where(RunLogBlock.run_id == run.id)
+            .order_by(RunLogBlock.offset)
+        ).all()
+        starts = [block.offset for block in blocks]
+        cache = {}
+
+        def block_text(index):
+            if index not in cache:
+                cache[index] = db.session.get(RunLogBlock, blocks[index].id).text
+            return cache[index]
+
+        def read(line):
+            index = bisect.bisect_right(starts, line.offset) - 1
+            parts = []
+            position, end = line.offset, line.offset + line.length
+            while index < len(blocks) and position < end:
+                block = blocks[index]
+                parts.append(block_text(index)[position - block.offset:end - block.offset])
+                position = block.offset + block.length
+                index += 1
+            return ''.join(parts)
+
+        return read
+
+
+def _matched_chars(items):
+    """Characters of _PROBE_CHARS that some single character item of a parsed pattern matches"""
+    chars = set()
+    for op, av in items:
+        if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN):
+            chars.update(char for char in _PROBE_CHARS if _item_matches(op, av, char))
+        elif op == sre_parse.SUBPATTERN:
+            chars |= _matched_chars(av[-1])
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                chars |= _matched_chars(branch)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) \
+                or op == getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            chars |= _matched_chars(av[2])
+    return chars
+
+
+def _item_matches(op, av, char):
+    if op == sre_parse.LITERAL:
+        return ord(char) == av
+    if op == sre_parse.NOT_LITERAL:
+        return ord(char) != av
+    if op == sre_parse.ANY:
+        return char != '\n'
+    # IN: a character class
+    negate = False
+    matched = False
+    for item_op, item_av in av:
+        if item_op == sre_parse.NEGATE:
+            negate = True
+        elif item_op == sre_parse.LITERAL:
+            matched = matched or ord(char) == item_av
+        elif item_op == sre_parse.RANGE:
+            matched = matched or item_av[0] <= ord(char) <= item_av[1]
+        elif item_op == sre_parse.CATEGORY:
+            matched = matched or _category_matches(item_av, char)
+    return matched != negate
+
+
+def _category_matches(category, char):
+    for positive, test in _CATEGORIES.items():
+        if category == positive:
+            return test(char)
+    # CATEGORY_NOT_DIGIT and friends
+    positive = getattr(sre_parse, category.name.replace('NOT_', ''), None)
+    if positive in _CATEGORIES:
+        return not _CATEGORIES[positive](char)
+    return True
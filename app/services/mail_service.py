@@ -0,0 +1,255 @@
+import os
+import time
+import heapq
+import atexit
+import smtplib
+import logging
+import itertools
+import threading
+
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+from flask import render_template
+
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+MAIL_MESSAGES = registry.counter(
+    'mail_messages_total',
+    'Outgoing mail by outcome (sent, retried, dropped)',
+    labelnames=('outcome',),
+)
+
+
+class _Mail:
+    __slots__ = ('message', 'attempts')
+
+    def __init__(self, message):
+        self.message = message
+        self.attempts = 0
+
+
+class MailService:
+    """Outgoing mail, delivered by a background sender thread.
+
+    send() only renders and queues the message, so requests never wait on
+    SMTP. The sender drains up to MAIL_BATCH_SIZE due messages at a time
+    over one SMTP connection, which it keeps open until it has been idle
+    for MAIL_IDLE_TIMEOUT seconds. Failed deliveries are rescheduled with
+    exponential backoff (MAIL_RETRY_BACKOFF * 2^attempt) up to
+    MAIL_MAX_ATTEMPTS; a queued retry does not hold up other messages.
+
+    Like the run executor, the thread starts lazily in the process that
+    sends, so the app stays safe to fork (gunicorn --preload).
+    """
+
+    _pending = []  # heap of (due, seq, _Mail)
+    _seq = itertools.count()
+    _condition = threading.Condition()
+    _thread = None
+    _sending = False
+    _config = None
+
+    @classmethod
+    def init_app(cls, app):
+        cls._config = {
+            key: value for key, value in app.config.items()
+            if key.startswith('MAIL_') or key == 'APP_NAME'
+        }
+        registry.gauge(
+            'mail_queue_depth',
+            'Messages waiting to be sent',
+            lambda: len(cls._pending)
+        )
+
+    @classmethod
+    def enabled(cls):
+        return bool(cls._config and cls._config['MAIL_ENABLED'])
+
+    @classmethod
+    def send_magic_link(cls, email, magic_link, expires_at):
+        """Queues the login link for `email`; False if mail is disabled or the queue is full"""
+        context = dict(magic_link=magic_link, expires_at=expires_at, app_name=cls._config['APP_NAME'])
+        return cls.send(
+            email,
+            f"Вход в {cls._config['APP_NAME']}",
+            render_template('email/magic_link.txt', **context),
+            html=render_template('email/magic_link.html', **context)
+        )
+
+    @classmethod
+    def send(cls, to, subject, body, html=None):
+        """Queues a message and returns at once; False if it was not queued"""
+        if not cls.enabled():
+            return False
+        if any(char in to for char in '\r\n'):
+            # Would end the To header and inject others; EmailMessage raises on it
+            logger.error(f"Refusing to send mail to {to!r}: line break in the address")
+            return False
+
+        message = EmailMessage()
+        message['From'] = cls._config['MAIL_DEFAULT_SENDER']
+        message['To'] = to
+        message['Subject'] = subject
+        message['Message-ID'] = make_msgid(domain=cls._config['MAIL_DEFAULT_SENDER'].rpartition('@')[2] or None)
+        message.set_content(body)
+        if html:
+            message.add_alternative(html, subtype='html')
+
+        with cls._condition:
+            if len(cls._pending) >= cls._config['MAIL_QUEUE_SIZE']:
+                logger.error(f"Mail queue is full, dropping message to {to}")
+                MAIL_MESSAGES.inc('dropped')
+                return False
+            heapq.heappush(cls._pending, (time.monotonic(), next(cls._seq), _Mail(message)))
+            cls._ensure_sender()
+            cls._condition.notify()
+        return True
+
+    @classmethod
+    def flush(cls, timeout=10.0):
+        """Waits until no message is due or being sent; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with cls._condition:
+            while cls._sending or (cls._pending and cls._pending[0][0] <= time.monotonic()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not (cls._thread and cls._thread.is_alive()):
+                    return False
+                cls._condition.wait(min(remaining, 0.1))
+        return True
+
+    @classmethod
+    def _ensure_sender(cls):
+        if cls._thread and cls._thread.is_alive():
+            return
+        cls._thread = threading.Thread(target=cls._sender_loop, name='mail-sender', daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def _next_batch(cls):
+        """Blocks until messages are due, None after MAIL_IDLE_TIMEOUT without any"""
+        idle_until = time.monotonic() + cls._config['MAIL_IDLE_TIMEOUT']
+        with cls._condition:
+            cls._sending = False
+            cls._condition.notify_all()
+            while True:
+                now = time.monotonic()
+                if cls._pending and cls._pending[0][0] <= now:
+                    batch = []
+                    while cls._pending and cls._pending[0][0] <= now \
+                            and len(batch) < cls._config['MAIL_BATCH_SIZE']:
+                        batch.append(heapq.heappop(cls._pending)[2])
+                    cls._sending = True
+                    return batch
+                if now >= idle_until:
+                    return None
+                wait = idle_until - now
+                if cls._pending:
+                    wait = min(wait, cls._pending[0][0] - now)
+                cls._condition.wait(wait)
+
+    @classmethod
+    def _sender_loop(cls):
+        connection = None
+        while True:
+            batch = cls._next_batch()
+            if batch is None:
+                connection = _close(connection)
+                continue
+            for mail in batch:
+                try:
+                    connection = cls._deliver(connection, mail)
+                except Exception as e:
+                    # e.g. an address that cannot be encoded; keep the sender alive
+                    MAIL_MESSAGES.inc('dropped')
+                    logger.error(f"Mail to {mail.message['To']} dropped: {str(e)}")
+                    connection = _close(connection)
+
+    @classmethod
+    def _deliver(cls, connection, mail):
+        """Sends one message, returns the connection to keep using"""
+        reused = connection is not None
+        while True:
+            try:
+                if connection is None:
+                    connection = cls._connect()
+                connection.send_message(mail.message)
+            except smtplib.SMTPServerDisconnected as e:
+                connection = _close(connection)
+                if reused:
+                    # The server dropped the idle connection, not this message
+                    reused = False
+                    continue
+                cls._retry(mail, e)
+                return None
+            except (smtplib.SMTPException, OSError) as e:
+                if _is_permanent(e):
+                    MAIL_MESSAGES.inc('dropped')
+                    logger.error(f"Mail to {mail.message['To']} refused: {str(e)}")
+                    return connection
+                cls._retry(mail, e)
+                # After an SMTP reply the connection itself is still fine
+                return connection if isinstance(e, smtplib.SMTPResponseException) else _close(connection)
+
+            MAIL_MESSAGES.inc('sent')
+            logger.info(f"Mail sent to {mail.message['To']}")
+            return connection
+
+    @classmethod
+    def _retry(cls, mail, error):
+        mail.attempts += 1
+        if mail.attempts >= cls._config['MAIL_MAX_ATTEMPTS']:
+            MAIL_MESSAGES.inc('dropped')
+            logger.error(f"Giving up on mail to {mail.message['To']} after {mail.attempts} attempts: {str(error)}")
+            return
+
+        delay = cls._config['MAIL_RETRY_BACKOFF'] * 2 ** (mail.attempts - 1)
+        MAIL_MESSAGES.inc('retried')
+        logger.warning(f"Mail to {mail.message['To']} failed ({str(error)}), retrying in {delay:g}s")
+        with cls._condition:
+            heapq.heappush(cls._pending, (time.monotonic() + delay, next(cls._seq), mail))
+
+    @classmethod
+    def _connect(cls):
+        config = cls._config
+        smtp_class = smtplib.SMTP_SSL if config['MAIL_USE_SSL'] else smtplib.SMTP
+        connection = smtp_class(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT'])
+        if config['MAIL_USE_TLS'] and not config['MAIL_USE_SSL']:
+            connection.starttls()
+        if config['MAIL_USERNAME']:
+            connection.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'] or '')
+        return connection
+
+
+def _is_permanent(error):
+    """Refused by the server for this message (5xx), retrying cannot help"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _close(connection):
+    if connection is not None:
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+    return None
+
+
+def _reset_after_fork():
+    # The parent's sender delivers what it queued; the child starts empty
+    MailService._condition = threading.Condition()
+    MailService._pending = []
+    MailService._thread = None
+    MailService._sending = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Give queued messages a chance to leave with the process
+atexit.register(MailService.flush, timeout=5.0)
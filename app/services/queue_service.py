@@ -0,0 +1,221 @@
+import json
+import math
+import heapq
+import logging
+import threading
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.exceptions import QueueFullError
+from app.models.run import Run, RunStatus
+from app.models.stage_timing import StageTiming
+from app.services.checkpoint_service import STAGES
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+RUNS_SHED = registry.counter(
+    'runs_shed_total',
+    'Submissions rejected with 503 because the estimated backlog was too long',
+)
+
+
+class _Snapshot:
+    __slots__ = ('taken_at', 'estimates', 'backlog', 'capacity')
+
+    def __init__(self, taken_at, estimates, backlog, capacity):
+        self.taken_at = taken_at
+        self.estimates = estimates  # run id -> (queue position, start, finish)
+        self.backlog = backlog  # seconds until a new run would start, None if unknown
+        self.capacity = capacity
+
+
+class QueueService:
+    """Queue positions, start/finish estimates and load shedding.
+
+    A snapshot of the queue is computed at most every QUEUE_ESTIMATE_REFRESH
+    seconds per process: pending runs are put in the order the scheduler
+    would score them (age, priority, fair share), and their runtimes are
+    estimated from the mean of the last QUEUE_ESTIMATE_HISTORY completed
+    timings of every stage they still have to run. The runs are then laid
+    out on the execution slots, which free up as the running runs finish.
+    Status polls read the snapshot and make no queries of their own.
+    """
+
+    _snapshot = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def estimate(cls, run):
+        """{'queue_position', 'estimated_start', 'estimated_finish'} of a run; None values if unknown"""
+        result = {'queue_position': None, 'estimated_start': None, 'estimated_finish': None}
+        if run.status not in (RunStatus.PENDING, RunStatus.RUNNING):
+            return result
+
+        snapshot = cls._get_snapshot()
+        if run.id not in snapshot.estimates:
+            # Queued or started after the snapshot was taken
+            snapshot = cls._get_snapshot(force=True)
+        position, start, finish = snapshot.estimates.get(run.id, (None, None, None))
+        result.update({
+            'queue_position': position,
+            'estimated_start': start.isoformat() if start else None,
+            'estimated_finish': finish.isoformat() if finish else None
+        })
+        return result
+
+    @classmethod
+    def backlog(cls):
+        """Estimated seconds until a run submitted now would start, None if unknown"""
+        return cls._get_snapshot().backlog
+
+    @classmethod
+    def check_capacity(cls):
+        """Raises QueueFullError while the estimated backlog exceeds QUEUE_MAX_BACKLOG"""
+        limit = current_app.config['QUEUE_MAX_BACKLOG']
+        if not limit:
+            return
+        backlog = cls.backlog()
+        if backlog is None or backlog <= limit:
+            return
+
+        RUNS_SHED.inc()
+        retry_after = max(1, math.ceil(backlog - limit))
+        logger.warning(f"Shedding a submission: estimated backlog {backlog:.0f}s exceeds {limit}s")
+        raise QueueFullError(
+            f'The queue is full: new runs would wait about {round(backlog / 60)} minutes, please try again later',
+            details={'backlog': round(backlog), 'max_backlog': limit},
+            retry_after=retry_after
+        )
+
+    @classmethod
+    def _get_snapshot(cls, force=False):
+        snapshot = cls._snapshot
+        now = datetime.utcnow()
+        if snapshot is not None and not force \
+                and (now - snapshot.taken_at).total_seconds() < current_app.config['QUEUE_ESTIMATE_REFRESH']:
+            return snapshot
+
+        with cls._lock:
+            # Another thread may have refreshed it while this one waited
+            if cls._snapshot is not snapshot and cls._snapshot is not None:
+                return cls._snapshot
+            cls._snapshot = cls._take_snapshot()
+            return cls._snapshot
+
+    @classmethod
+    def _take_snapshot(cls):
+        config = current_app.config
+        now = datetime.utcnow()
+        stage_means = cls._stage_means(config['QUEUE_ESTIMATE_HISTORY'])
+
+        running = db.session.execute(
+            select(Run.id, Run.start_time, Run.current_stage, Run.completed_stages)
+            .where(Run.status == RunStatus.RUNNING)
+        ).all()
+        stage_started = dict(db.session.execute(
+            select(StageTiming.run_id, StageTiming.started_at).where(
+                StageTiming.run_id.in_([row.id for row in running]),
+                StageTiming.finished_at.is_(None)
+            )
+        ).all()) if running else {}
+
+        pending = db.session.execute(
+            select(Run.id, Run.email, Run.priority, Run.created_at, Run.completed_stages)
+            .where(Run.status == RunStatus.PENDING)
+            .order_by(Run.created_at, Run.id)
+        ).all()
+
+        capacity = max(config['QUEUE_CAPACITY'] or config['MAX_CONCURRENT_RUNS'], len(running), 1)
+        estimates = {}
+        slots = []  # times at which an execution slot frees up, None if unknown
+
+        for row in running:
+            remaining = cls._remaining(stage_means, row.completed_stages, row.current_stage,
+                                       stage_started.get(row.id), now)
+            finish = now + timedelta(seconds=remaining) if remaining is not None else None
+            estimates[row.id] = (0, row.start_time, finish)
+            slots.append(finish)
+        slots.extend([now] * (capacity - len(slots)))
+
+        known = all(slot is not None for slot in slots)
+        slots = [slot for slot in slots if slot is not None] if known else []
+        heapq.heapify(slots)
+
+        for position, row in enumerate(cls._dispatch_order(pending, config), 1):
+            remaining = cls._remaining(stage_means, row.completed_stages)
+            if not known or remaining is None:
+                known = False
+                estimates[row.id] = (position, None, None)
+                continue
+            start = heapq.heappop(slots)
+            finish = start + timedelta(seconds=remaining)
+            heapq.heappush(slots, finish)
+            estimates[row.id] = (position, start, finish)
+
+        backlog = max((slots[0] - now).total_seconds(), 0.0) if known and slots else None
+        return _Snapshot(now, estimates, backlog, capacity)
+
+    @staticmethod
+    def _dispatch_order(pending, config):
+        """Pending runs sorted by an approximation of the RunScheduler score"""
+        queued_per_email = {}
+        scored = []
+        for row in pending:
+            ahead = queued_per_email.get(row.email, 0)
+            queued_per_email[row.email] = ahead + 1
+            score = (row.created_at - datetime(1970, 1, 1)).total_seconds() \
+                - (row.priority or 0) * config['SCHEDULER_PRIORITY_STEP'] \
+                + ahead * config['SCHEDULER_FAIR_SHARE_STEP']
+            scored.append((score, row.id, row))
+        scored.sort(key=lambda item: item[:2])
+        return [row for _, _, row in scored]
+
+    @staticmethod
+    def _stage_means(history):
+        """Mean duration of the last `history` completed timings of every stage; {} without any"""
+        means = {}
+        for stage in STAGES:
+            durations = db.session.execute(
+                select(StageTiming.duration)
+                .where(StageTiming.stage == stage, StageTiming.completed.is_(True))
+                .order_by(StageTiming.started_at.desc())
+                .limit(history)
+            ).scalars().all()
+            if durations:
+                means[stage] = sum(durations) / len(durations)
+
+        if means:
+            # Stages that never completed yet take as long as an average stage
+            fallback = sum(means.values()) / len(means)
+            for stage in STAGES:
+                means.setdefault(stage, fallback)
+        return means
+
+    @staticmethod
+    def _remaining(stage_means, completed_stages, current_stage=None, stage_started=None, now=None):
+        """Expected seconds of work left for a run, None without stage history"""
+        if not stage_means:
+            return None
+        done = set(json.loads(completed_stages or '[]'))
+        remaining = 0.0
+        for stage in STAGES:
+            if stage.value in done:
+                continue
+            if stage == current_stage and stage_started is not None:
+                remaining += max(stage_means[stage] - (now - stage_started).total_seconds(), 0.0)
+            else:
+                remaining += stage_means[stage]
+        return remaining
+
+
+registry.gauge(
+    'queue_backlog_seconds',
+    'Estimated wait of a newly submitted run as of the last queue snapshot',
+    lambda: QueueService._snapshot.backlog if QueueService._snapshot and QueueService._snapshot.backlog is not None else 0
+)
@@ -0,0 +1,91 @@
+import math
+import logging
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.exceptions import RunLimitExceededError
+from app.models.run import Run
+from app.services.run_summary_service import RunSummaryService
+
+
+logger = logging.getLogger(__name__)
+
+QUOTA_WINDOW = timedelta(days=1)
+
+
+class QuotaService:
+    """Per-email limits on queued runs and on runs created per day.
+
+    USER_MAX_ACTIVE_RUNS bounds the pending and running runs of an email,
+    USER_DAILY_RUN_QUOTA the runs created in the last 24 hours; 0 disables
+    a limit. How many runs execute at once is still decided by the
+    executor (MAX_CONCURRENT_RUNS, memory admission, fair share).
+    """
+
+    @staticmethod
+    def usage(email):
+        since = datetime.utcnow() - QUOTA_WINDOW
+        # Reread: enforce() runs after this transaction updated the summary
+        active = RunSummaryService.get(email, fresh=True).active
+        today = Run.query.filter(Run.email == email, Run.created_at >= since).count()
+        max_active = current_app.config['USER_MAX_ACTIVE_RUNS']
+        daily_quota = current_app.config['USER_DAILY_RUN_QUOTA']
+
+        remaining = [limit - used for limit, used in ((max_active, active), (daily_quota, today)) if limit]
+        return {
+            'active': active,
+            'max_active': max_active or None,
+            'today': today,
+            'daily_quota': daily_quota or None,
+            'remaining': max(0, min(remaining)) if remaining else None
+        }
+
+    @staticmethod
+    def check(email, new_runs=1):
+        """Raises RunLimitExceededError unless `new_runs` more runs fit the limits"""
+        usage = QuotaService.usage(email)
+
+        if usage['max_active'] and usage['active'] + new_runs > usage['max_active']:
+            raise RunLimitExceededError(
+                f"At most {usage['max_active']} runs can be queued or running at once, "
+                f"you have {usage['active']}" + (f" and request {new_runs} more" if new_runs > 1 else ''),
+                details=usage
+            )
+
+        if usage['daily_quota'] and usage['today'] + new_runs > usage['daily_quota']:
+            raise RunLimitExceededError(
+                f"Daily quota of {usage['daily_quota']} runs reached",
+                details=usage,
+                retry_after=QuotaService._quota_retry_after(email, usage['today'] + new_runs - usage['daily_quota'])
+            )
+
+    @staticmethod
+    def enforce(email):
+        """Checks the limits against runs added to the current transaction.
+
+        Call after flushing the new runs and before committing: the INSERT
+        holds the database write lock until the commit, so concurrent
+        submissions are counted one after another and cannot both take
+        the last slot. Rolls the transaction back when a limit is exceeded.
+        """
+        try:
+            QuotaService.check(email, new_runs=0)
+        except RunLimitExceededError as e:
+            db.session.rollback()
+            logger.info(f"Run limit for {email}: {e.message}")
+            raise
+
+    @staticmethod
+    def _quota_retry_after(email, excess):
+        """Seconds until `excess` runs of the user leave the 24 hour window"""
+        since = datetime.utcnow() - QUOTA_WINDOW
+        oldest = db.session.query(Run.created_at).filter(
+            Run.email == email,
+            Run.created_at >= since
+        ).order_by(Run.created_at).offset(max(excess - 1, 0)).limit(1).scalar()
+        if oldest is None:
+            return None
+        return max(1, math.ceil((oldest - since).total_seconds()))
@@ -0,0 +1,137 @@
+import os
+import stat
+import logging
+import mimetypes
+
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+from app.services.run_service import RunService
+
+
+logger = logging.getLogger(__name__)
+
+# Served inline as text/plain, everything else is an attachment
+TEXT_MIMETYPES = {'application/json', 'application/xml', 'application/x-yaml', 'application/x-sh'}
+TEXT_EXTENSIONS = {
+    '.log', '.rpt', '.txt', '.v', '.vh', '.sv', '.sdc', '.def', '.lef', '.lib',
+    '.tcl', '.yaml', '.yml', '.json', '.csv', '.conf', '.cfg', '.spice', '.spef', '.md'
+}
+
+
+class ResultsService:
+    """Read-only access to the files of a run directory"""
+
+    @staticmethod
+    def resolve_path(run_id, relative_path):
+        """Absolute path of relative_path inside the run directory.
+
+        Returns None for anything that escapes the directory: absolute
+        paths, '..' components and symlinks pointing outside.
+        """
+        base = os.path.realpath(RunService.get_project_folder(run_id))
+        relative_path = (relative_path or '').strip('/')
+        if '\x00' in relative_path:
+            return None
+        if not relative_path:
+            return base
+
+        joined = safe_join(base, relative_path)
+        if joined is None:
+            return None
+
+        resolved = os.path.realpath(joined)
+        if resolved != base and not resolved.startswith(base + os.sep):
+            return None
+        return resolved
+
+    @staticmethod
+    def list_directory(run_id, relative_path='', offset=0, limit=None):
+        """One level of the run directory, folders first, then by name"""
+        path = ResultsService.resolve_path(run_id, relative_path)
+        if path is None or not os.path.isdir(path):
+            return None
+
+        base = os.path.realpath(RunService.get_project_folder(run_id))
+        limit = limit or current_app.config['RESULTS_LIST_LIMIT']
+
+        entries = []
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    info = entry.stat(follow_symlinks=True)
+                except OSError:
+                    continue
+                # Symlinks are listed only when they stay inside the run directory
+                if entry.is_symlink() and ResultsService.resolve_path(
+                        run_id, os.path.relpath(entry.path, base)) is None:
+                    continue
+                entries.append((entry, info))
+
+        entries.sort(key=lambda item: (not stat.S_ISDIR(item[1].st_mode), item[0].name.lower()))
+        page = entries[offset:offset + limit]
+
+        items = []
+        for entry, info in page:
+            is_dir = stat.S_ISDIR(info.st_mode)
+            item = {
+                'name': entry.name,
+                'path': os.path.relpath(entry.path, base).replace(os.sep, '/'),
+                'type': 'folder' if is_dir else 'file',
+                'size': None if is_dir else info.st_size,
+                'modified': datetime.utcfromtimestamp(info.st_mtime).isoformat()
+            }
+            if is_dir:
+                item['entries'] = ResultsService._count_entries(entry.path)
+            items.append(item)
+
+        relative = os.path.relpath(path, base)
+        return {
+            'path': '' if relative == '.' else relative.replace(os.sep, '/'),
+            'items': items,
+            'total': len(entries),
+            'offset': offset,
+            'truncated': offset + len(page) < len(entries)
+        }
+
+    @staticmethod
+    def _count_entries(path):
+        try:
+            with os.scandir(path) as iterator:
+                return sum(1 for _ in iterator)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def resolve_file(run_id, relative_path):
+        path = ResultsService.resolve_path(run_id, relative_path)
+        if path is None or not os.path.isfile(path):
+            return None
+        return path
+
+    @staticmethod
+    def is_text(path):
+        mimetype, _ = mimetypes.guess_type(path)
+        if mimetype and (mimetype.startswith('text/') or mimetype in TEXT_MIMETYPES):
+            return True
+        return os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS
+
+    @staticmethod
+    def preview(path, max_bytes=None):
+        """Beginning of a file decoded as text, capped at max_bytes"""
+        max_bytes = max_bytes or current_app.config['RESULTS_PREVIEW_BYTES']
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            data = f.read(max_bytes)
+
+        if b'\x00' in data[:8192]:
+            return {'size': size, 'binary': True, 'content': None, 'truncated': size > 0}
+
+        return {
+            'size': size,
+            'binary': False,
+            'content': data.decode('utf-8', errors='replace'),
+            'truncated': size > len(data)
+        }
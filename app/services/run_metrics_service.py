@@ -0,0 +1,232 @@
+import os
+import glob
+import json
+import logging
+
+import numpy as np
+
+from sqlalchemy import delete, insert, select
+
+from app import db
+from app.models.run import Run
+from app.models.run_metric import RunMetric
+from app.services.run_service import RunService
+
+
+logger = logging.getLogger(__name__)
+
+# name: (keys in LibreLane's metrics.json, in order of preference; which direction is better)
+METRICS = {
+    'setup_wns': (('timing__setup__ws', 'timing__setup__wns'), 'max'),
+    'setup_tns': (('timing__setup__tns',), 'max'),
+    'hold_wns': (('timing__hold__ws', 'timing__hold__wns'), 'max'),
+    'cell_area': (('design__instance__area',), 'min'),
+    'core_area': (('design__core__area',), 'min'),
+    'utilization': (('design__instance__utilization',), None),
+    'power_total': (('power__total',), 'min'),
+    'wire_length': (('route__wirelength',), 'min'),
+    'drc_errors': (('route__drc_errors', 'magic__drc_error__count', 'klayout__drc_error__count'), 'min'),
+    'lvs_errors': (('design__lvs_error__count',), 'min'),
+    'antenna_violations': (('route__antenna_violation__count',), 'min'),
+}
+
+
+class RunMetricsService:
+    """PPA metrics of finished runs: extraction and cross-run comparison"""
+
+    @staticmethod
+    def find_metrics_file(run_id):
+        """final/metrics.json of the run, or of the newest LibreLane run below it"""
+        run_dir = RunService.get_project_folder(run_id)
+        path = os.path.join(run_dir, 'final', 'metrics.json')
+        if os.path.isfile(path):
+            return path
+
+        candidates = glob.glob(os.path.join(run_dir, '*', 'final', 'metrics.json')) \
+            + glob.glob(os.path.join(run_dir, 'runs', '*', 'final', 'metrics.json'))
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    @staticmethod
+    def parse_metrics(data):
+        """Key metrics from a metrics.json mapping, None for missing ones"""
+        result = {}
+        for name, (keys, _) in METRICS.items():
+            for key in keys:
+                value = data.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    result[name] = float(value)
+                    break
+                if isinstance(value, str):
+                    try:
+                        result[name] = float(value)
+                        break
+                    except ValueError:
+                        pass
+        return result
+
+    @staticmethod
+    def record_metrics(run_id):
+        """Stores the key metrics of a finished run, replacing earlier ones"""
+        run = Run.query.get(run_id)
+        if not run:
+            return None
+
+        config = RunService.load_config(run_id) or {}
+        design_name = config.get('DESIGN_NAME')
+
+        metrics = {}
+        path = RunMetricsService.find_metrics_file(run_id)
+        if path:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                metrics = RunMetricsService.parse_metrics(data)
+                design_name = design_name or data.get('design__name')
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read metrics of run {run_id} from {path}: {str(e)}")
+
+        run.design_name = design_name or run.design_name
+        db.session.execute(delete(RunMetric).where(RunMetric.run_id == run_id))
+        if metrics:
+            created_at = run.end_time or run.created_at
+            db.session.execute(insert(RunMetric), [
+                {
+                    'run_id': run_id,
+                    'email': run.email,
+                    'design_name': run.design_name,
+                    'name': name,
+                    'value': value,
+                    'created_at': created_at
+                }
+                for name, value in metrics.items()
+            ])
+        RunService._commit('record_metrics')
+        return metrics
+
+    @staticmethod
+    def compare(email, run_ids, names=None):
+        """Metrics of the given runs of one user as a runs x metrics matrix.
+
+        All aggregates are computed column-wise over the matrix with numpy,
+        NaN marking a metric that a run did not report.
+        """
+        names = list(names or METRICS)
+        runs = db.session.execute(
+            select(Run.id, Run.design_name, Run.created_at, Run.status)
+            .where(Run.id.in_(run_ids), Run.email == email)
+        ).all()
+        order = {run_id: index for index, run_id in enumerate(run_ids)}
+        runs.sort(key=lambda run: order[run.id])
+        row_of = {run.id: index for index, run in enumerate(runs)}
+        column_of = {name: index for index, name in enumerate(names)}
+
+        matrix = np.full((len(runs), len(names)), np.nan)
+        if runs:
+            rows = db.session.execute(
+                select(RunMetric.run_id, RunMetric.name, RunMetric.value)
+                .where(RunMetric.run_id.in_(row_of), RunMetric.name.in_(names))
+            ).all()
+            for run_id, name, value in rows:
+                if value is not None:
+                    matrix[row_of[run_id], column_of[name]] = value
+
+        present = ~np.isnan(matrix)
+        counts = present.sum(axis=0)
+        filled = np.where(present, matrix, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = filled.sum(axis=0) / counts
+            stds = np.sqrt(np.where(present, (matrix - means) ** 2, 0.0).sum(axis=0) / counts)
+            mins = np.where(present, matrix, np.inf).min(axis=0) if runs else np.full(len(names), np.nan)
+            maxs = np.where(present, matrix, -np.inf).max(axis=0) if runs else np.full(len(names), np.nan)
+            baseline = matrix[0] if runs else np.full(len(names), np.nan)
+            relative = (matrix - baseline) / np.abs(baseline) * 100.0
+        relative[~np.isfinite(relative)] = np.nan
+
+        summary = {}
+        for column, name in enumerate(names):
+            if not counts[column]:
+                summary[name] = None
+                continue
+            better = METRICS.get(name, (None, None))[1]
+            best_run = None
+            if better:
+                values = matrix[:, column]
+                index = np.nanargmax(values) if better == 'max' else np.nanargmin(values)
+                best_run = runs[int(index)].id
+            summary[name] = {
+                'count': int(counts[column]),
+                'min': float(mins[column]),
+                'max': float(maxs[column]),
+                'mean': float(means[column]),
+                'std': float(stds[column]),
+                'best_run_id': best_run
+            }
+
+        return {
+            'metrics': names,
+            'runs': [
+                {
+                    'id': run.id,
+                    'design_name': run.design_name,
+                    'status': run.status.value,
+                    'created_at': run.created_at.isoformat() if run.created_at else None
+                }
+                for run in runs
+            ],
+            'values': {name: _column(matrix, column) for column, name in enumerate(names)},
+            'relative_to_first': {name: _column(relative, column) for column, name in enumerate(names)},
+            'summary': summary
+        }
+
+    @staticmethod
+    def trend(email, design_name, name, limit=100, window=5):
+        """History of one metric for a design, oldest first, with a rolling mean and slope"""
+        rows = db.session.execute(
+            select(RunMetric.run_id, RunMetric.created_at, RunMetric.value)
+            .where(
+                RunMetric.email == email,
+                RunMetric.design_name == design_name,
+                RunMetric.name == name,
+                RunMetric.value.is_not(None)
+            )
+            .order_by(RunMetric.created_at.desc())
+            .limit(limit)
+        ).all()
+        rows.reverse()
+
+        values = np.array([row.value for row in rows], dtype=np.float64)
+        result = {
+            'design_name': design_name,
+            'metric': name,
+            'runs': [row.run_id for row in rows],
+            'created_at': [row.created_at.isoformat() for row in rows],
+            'values': values.tolist(),
+            'rolling_mean': [],
+            'delta': [],
+            'slope_per_run': None,
+            'best': None
+        }
+        if not values.size:
+            return result
+
+        window = max(1, min(window, values.size))
+        cumulative = np.cumsum(np.insert(values, 0, 0.0))
+        rolling = np.empty_like(values)
+        rolling[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+        # Shorter windows at the start of the history
+        rolling[:window - 1] = cumulative[1:window] / np.arange(1, window)
+
+        result['rolling_mean'] = rolling.tolist()
+        result['delta'] = np.diff(values).tolist()
+        if values.size >= 2:
+            result['slope_per_run'] = float(np.polyfit(np.arange(values.size), values, 1)[0])
+
+        better = METRICS.get(name, (None, None))[1]
+        if better:
+            index = int(values.argmax() if better == 'max' else values.argmin())
+            result['best'] = {'run_id': rows[index].run_id, 'value': float(values[index])}
+        return result
+
+
+def _column(matrix, column):
+    return [None if np.isnan(value) else float(value) for value in matrix[:, column]]
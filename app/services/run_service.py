@@ -1,21 +1,46 @@
 import os
 import json
+import time
+import hashlib
 import logging
 import zipfile
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 
 from flask import current_app
+from sqlalchemy.orm import load_only
 
 from app import db
 from app.models.run import Run, RunStatus, RunStage
+from app.models.stage_timing import StageTiming
+from app.services.log_service import LogService
+from app.services.quota_service import QuotaService
+from app.services.run_summary_service import ACTIVE_STATUSES, RunSummaryService
+from app.utils.metrics import DB_COMMIT_LATENCY, LOG_BYTES, LOG_LINES, RUN_DURATION
+from app.utils.pagination import decode_cursor, encode_cursor
 
 
 logger = logging.getLogger(__name__)
 
+# Columns behind Run.HISTORY_FIELDS
+HISTORY_COLUMNS = (
+    Run.id, Run.status, Run.current_stage, Run.progress, Run.priority,
+    Run.design_name, Run.sweep_id, Run.parent_run_id, Run.rerun_from_stage,
+    Run.created_at, Run.start_time, Run.end_time, Run.peak_memory_mb
+)
+
 
 class RunService:
+    @staticmethod
+    def _commit(operation):
+        """Commits the session and records the commit latency"""
+        started = time.perf_counter()
+        try:
+            db.session.commit()
+        finally:
+            DB_COMMIT_LATENCY.observe(time.perf_counter() - started, operation)
+
     @staticmethod
     def get_runs_folder():
         return current_app.config.get('RUNS_FOLDER', 'runs')
@@ -25,10 +50,43 @@ class RunService:
         return os.path.join(RunService.get_runs_folder(), f'run_{run_id}')
     
     @staticmethod
-    def create_run(session_id, email):
-        run = Run(session_id=session_id, email=email)
+    def load_config(run_id):
+        """Parsed LibreLane configuration of a run, None if it is not JSON/YAML"""
+        run = Run.query.get(run_id)
+        if not run or not run.config_filename:
+            return None
+
+        path = os.path.join(RunService.get_project_folder(run_id), run.config_filename)
+        try:
+            with open(path, 'rb') as f:
+                return RunService.parse_config(f.read(), run.config_filename)
+        except Exception as e:
+            logger.warning(f"Failed to read config of run {run_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def parse_config(data, filename):
+        """Parses a JSON or YAML configuration, None for other formats"""
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.json':
+            return json.loads(data)
+        if extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                return None
+            return yaml.safe_load(data)
+        return None
+
+    @staticmethod
+    def create_run(session_id, email, priority=0):
+        """Queues a new run, RunLimitExceededError if the user's limits are reached"""
+        run = Run(session_id=session_id, email=email, priority=priority)
         db.session.add(run)
-        db.session.commit()
+        db.session.flush()
+        RunSummaryService.runs_created(email, [run])
+        QuotaService.enforce(email)
+        RunService._commit('create_run')
         return run
     
     @staticmethod
@@ -55,7 +113,7 @@ class RunService:
             # FIXME: save path to rtl dir
             run.config_filename = config_filename
             run.sources_filenames = json.dumps(source_filenames)
-            db.session.commit()
+            RunService._commit('save_uploaded_files')
             
             logger.info(f"Saved files for run {run_id}: config={config_filename}, sources={source_filenames}")
             return True
@@ -64,12 +122,35 @@ class RunService:
             logger.error(f"Error saving files for run {run_id}: {str(e)}")
             return False
     
+    @staticmethod
+    def save_project_dir(run_id, project_dir, config_filename, input_filenames):
+        """Moves an assembled project (UploadService.build_project) into the run directory"""
+        run = Run.query.get(run_id)
+        if not run:
+            return False
+
+        try:
+            os.rename(project_dir, RunService.get_project_folder(run_id))
+            run.config_filename = config_filename
+            run.sources_filenames = json.dumps(input_filenames)
+            RunService._commit('save_project_dir')
+
+            logger.info(f"Saved project for run {run_id}: config={config_filename}, {len(input_filenames)} files")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving project for run {run_id}: {str(e)}")
+            return False
+
     @staticmethod
     def update_run_stage(run_id, current_stage, completed_stages=None, progress=0):
         run = Run.query.get(run_id)
         if not run:
             return None
 
+        previous_stage = run.current_stage
+        previous_completed = run.completed_stages_list
+
         if current_stage:
             run.current_stage = RunStage(current_stage)
         
@@ -78,13 +159,48 @@ class RunService:
         
         run.progress = progress
 
+        newly_completed = [
+            stage for stage in (completed_stages or []) if stage not in previous_completed
+        ]
+        if run.current_stage != previous_stage or newly_completed:
+            RunService._record_stage_timings(run, newly_completed)
+
         try:
-            db.session.commit()
+            RunService._commit('update_run_stage')
             return run
         except Exception as e:
             db.session.rollback()
             return None
     
+    @staticmethod
+    def _record_stage_timings(run, newly_completed):
+        """Opens a timing for the current stage and closes finished ones"""
+        now = datetime.utcnow()
+        open_timings = {
+            timing.stage: timing
+            for timing in StageTiming.query.filter_by(run_id=run.id, finished_at=None)
+        }
+
+        for stage, timing in open_timings.items():
+            if stage.value in newly_completed or stage != run.current_stage:
+                timing.finish(now)
+
+        if run.current_stage != RunStage.NONE \
+                and run.current_stage not in open_timings \
+                and run.current_stage.value not in newly_completed:
+            db.session.add(StageTiming(
+                run_id=run.id,
+                email=run.email,
+                stage=run.current_stage,
+                started_at=now
+            ))
+
+    @staticmethod
+    def _close_stage_timings(run, finished_at):
+        """Closes timings left open by a failed or cancelled run"""
+        for timing in StageTiming.query.filter_by(run_id=run.id, finished_at=None):
+            timing.finish(finished_at, completed=False)
+
     @staticmethod
     def update_run_logs(run_id, log_content=None):
         run = Run.query.get(run_id)
@@ -93,15 +209,17 @@ class RunService:
         
         if log_content is not None:
             # FIXME
-            timestamp = datetime.utcnow().strftime('%H:%M:%S')
+            now = datetime.utcnow()
+            timestamp = now.strftime('%H:%M:%S')
             formatted_output = f"[{timestamp}] {log_content}"
             
-            if run.log_content:
-                run.log_content += formatted_output
-            else:
-                run.log_content = formatted_output
+            old_length = LogService.append(run, formatted_output)
+            LogService.index_appended(run, old_length, timestamp=now)
+
+            LOG_LINES.inc(amount=formatted_output.count('\n'))
+            LOG_BYTES.inc(amount=len(formatted_output.encode('utf-8')))
 
-        db.session.commit()
+        RunService._commit('update_run_logs')
         return run
     
     @staticmethod
@@ -110,14 +228,32 @@ class RunService:
         if not run:
             return None
         
+        old_status = run.status
         run.status = RunStatus(status)
         
         if start_time:
             run.start_time = start_time
         if end_time:
             run.end_time = end_time
+            RunService._close_stage_timings(run, end_time)
+        RunSummaryService.status_changed(run, old_status)
         
-        db.session.commit()
+        RunService._commit('set_run_status')
+
+        if end_time and run.start_time:
+            RUN_DURATION.observe((run.end_time - run.start_time).total_seconds(), run.status.value)
+        return run
+
+    @staticmethod
+    def compress_logs(run_id):
+        """Compresses the log of a finished run, once nothing appends to it anymore"""
+        if not current_app.config['LOG_COMPRESSION']:
+            return None
+        run = Run.query.get(run_id)
+        if not run or not run.is_finished:
+            return None
+        LogService.compress(run)
+        RunService._commit('compress_logs')
         return run
 
     @staticmethod
@@ -137,51 +273,250 @@ class RunService:
         if not os.path.exists(run_dir):
             return None
         
-        archive_path = os.path.join(run_dir, f'results_{run_id}.zip')
+        archive_name = f'results_{run_id}.zip'
+        archive_path = os.path.join(run_dir, archive_name)
+        tmp_path = f'{archive_path}.tmp'
         
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # Written next to the final name and renamed, so a download never
+        # sees a half-written archive
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for root, dirs, files in os.walk(run_dir):
                 for file in files:
+                    if root == run_dir and file.startswith(archive_name):
+                        continue
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, run_dir)
                     zipf.write(file_path, arcname)
         
-        run.archive_filename = f'results_{run_id}.zip'
-        db.session.commit()
+        digest = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        os.replace(tmp_path, archive_path)
+        
+        run.archive_filename = archive_name
+        run.archive_etag = digest.hexdigest()
+        RunService._commit('create_results_archive')
         
         return archive_path
     
     @staticmethod
-    def has_active_run(session_id):
-        """Проверяет, есть ли у пользователя активный запуск"""
-        active_statuses = [RunStatus.PENDING, RunStatus.RUNNING]
-        active_run = Run.query.filter(
-            Run.session_id == session_id,
-            Run.status.in_(active_statuses)
-        ).first()
-        return active_run is not None
+    def get_expected_runtime(email, history=20):
+        """Average duration in seconds of the user's last completed runs"""
+        rows = db.session.query(Run.start_time, Run.end_time).filter(
+            Run.email == email,
+            Run.status == RunStatus.COMPLETED,
+            Run.start_time.isnot(None),
+            Run.end_time.isnot(None)
+        ).order_by(Run.created_at.desc()).limit(history).all()
+
+        if not rows:
+            return None
+        return sum((end - start).total_seconds() for start, end in rows) / len(rows)
+
+    @staticmethod
+    def get_expected_memory(email, history=10):
+        """Predicted memory in MB: highest peak of the user's recent runs"""
+        peaks = db.session.query(Run.peak_memory_mb).filter(
+            Run.email == email,
+            Run.peak_memory_mb.isnot(None)
+        ).order_by(Run.created_at.desc()).limit(history).all()
+
+        if not peaks:
+            return current_app.config['RUN_DEFAULT_MEMORY_MB']
+        return max(peak for peak, in peaks)
+
+    @staticmethod
+    def set_run_resources(run_id, limits=None, peak_memory_mb=None):
+        run = Run.query.get(run_id)
+        if not run:
+            return None
+
+        if limits is not None:
+            run.resource_limits = json.dumps(limits)
+        if peak_memory_mb is not None:
+            run.peak_memory_mb = peak_memory_mb
+
+        RunService._commit('set_run_resources')
+        return run
 
     @staticmethod
-    def get_last_run(session_id):
+    def claim_run(run_id, owner, ttl):
+        """Atomically takes a pending run with a lease, False if someone else did"""
+        now = datetime.utcnow()
+        claimed = Run.query.filter(
+            Run.id == run_id,
+            Run.status == RunStatus.PENDING,
+            db.or_(Run.lease_owner.is_(None), Run.lease_expires_at < now)
+        ).update({
+            Run.status: RunStatus.RUNNING,
+            Run.lease_owner: owner,
+            Run.lease_expires_at: now + timedelta(seconds=ttl)
+        }, synchronize_session=False)
+        if claimed == 1:
+            email = db.session.query(Run.email).filter(Run.id == run_id).scalar()
+            RunSummaryService.transition(email, run_id, RunStatus.PENDING, RunStatus.RUNNING)
+        RunService._commit('claim_run')
+        return claimed == 1
+
+    @staticmethod
+    def renew_leases(run_ids, owner, ttl):
+        """Extends the leases `owner` still holds, returns the ids of those runs"""
+        Run.query.filter(
+            Run.id.in_(run_ids),
+            Run.lease_owner == owner
+        ).update({
+            Run.lease_expires_at: datetime.utcnow() + timedelta(seconds=ttl)
+        }, synchronize_session=False)
+        # Read in the same transaction, after the UPDATE took the write lock
+        renewed = [run_id for run_id, in db.session.query(Run.id).filter(
+            Run.id.in_(run_ids),
+            Run.lease_owner == owner
+        )]
+        RunService._commit('renew_leases')
+        return renewed
+
+    @staticmethod
+    def release_lease(run_id, owner):
+        Run.query.filter(
+            Run.id == run_id,
+            Run.lease_owner == owner
+        ).update({Run.lease_expires_at: None}, synchronize_session=False)
+        RunService._commit('release_lease')
+
+    @staticmethod
+    def requeue_run(run_id):
+        """Returns an interrupted run to the queue unless it was cancelled meanwhile"""
+        requeued = Run.query.filter(Run.id == run_id, Run.status == RunStatus.RUNNING).update({
+            Run.status: RunStatus.PENDING,
+            Run.lease_owner: None,
+            Run.lease_expires_at: None
+        }, synchronize_session=False)
+        if requeued == 1:
+            email = db.session.query(Run.email).filter(Run.id == run_id).scalar()
+            RunSummaryService.transition(email, run_id, RunStatus.RUNNING, RunStatus.PENDING)
+        RunService._commit('requeue_run')
+
+    @staticmethod
+    def requeue_expired_runs():
+        """Requeues runs whose worker stopped renewing the lease"""
+        now = datetime.utcnow()
+        expired = dict(db.session.query(Run.id, Run.email).filter(
+            Run.status == RunStatus.RUNNING,
+            Run.lease_expires_at < now
+        ))
+        if not expired:
+            return []
+
+        requeued = Run.query.filter(
+            Run.id.in_(expired),
+            Run.status == RunStatus.RUNNING,
+            Run.lease_expires_at < now
+        ).update({
+            Run.status: RunStatus.PENDING,
+            Run.lease_owner: None,
+            Run.lease_expires_at: None
+        }, synchronize_session=False)
+        if requeued == len(expired):
+            for run_id, email in expired.items():
+                RunSummaryService.transition(email, run_id, RunStatus.RUNNING, RunStatus.PENDING)
+        else:
+            # Some runs changed in between, count those users again
+            for email in set(expired.values()):
+                RunSummaryService.refresh(email)
+        RunService._commit('requeue_expired_runs')
+        return list(expired)
+
+    @staticmethod
+    def get_claimable_runs(limit=100, per_email=None):
+        """Oldest claimable runs, at most `per_email` of each user, interleaved between users.
+
+        Without the per-email bound one user's backlog would fill the whole
+        prefetch window and the fair-share scheduler would see no one else.
+        """
+        claimable = (
+            Run.status == RunStatus.PENDING,
+            db.or_(Run.lease_owner.is_(None), Run.lease_expires_at < datetime.utcnow())
+        )
+        email_rank = db.func.row_number().over(
+            partition_by=Run.email,
+            order_by=(Run.created_at, Run.id)
+        ).label('email_rank')
+        ranked = db.session.query(Run.id.label('id'), email_rank).filter(*claimable).subquery()
+
+        query = Run.query.options(load_only(Run.id, Run.email, Run.priority, Run.created_at)) \
+            .join(ranked, ranked.c.id == Run.id)
+        if per_email:
+            query = query.filter(ranked.c.email_rank <= per_email)
+        return query.order_by(ranked.c.email_rank, Run.created_at, Run.id).limit(limit).all()
+
+    @staticmethod
+    def get_cancelled_run_ids(run_ids):
+        return [run_id for run_id, in db.session.query(Run.id).filter(
+            Run.id.in_(run_ids),
+            Run.status == RunStatus.CANCELLED
+        )]
+
+    @staticmethod
+    def count_runs(status):
+        """Number of runs of all users in `status` (ix_run_status_created)"""
+        return db.session.query(db.func.count(Run.id)).filter(Run.status == status).scalar()
+
+    @staticmethod
+    def get_last_run(email, session_id):
         """Получает последний запуск для сессии"""
-        return Run.query.filter_by(
-            session_id=session_id
-        ).order_by(Run.created_at.desc()).first()
+        run = RunService._session_run(RunSummaryService.get(email).last_run_id, session_id)
+        if run is not None:
+            return run
+        # The user's latest run was started from another session
+        return Run.query.options(load_only(Run.id, Run.session_id, Run.status)).filter(
+            Run.session_id == session_id
+        ).order_by(Run.created_at.desc(), Run.id.desc()).first()
     
     @staticmethod
-    def get_active_run(session_id):
+    def get_active_run(email, session_id):
         """Возвращает активный запуск пользователя"""
-        active_statuses = [RunStatus.PENDING, RunStatus.RUNNING]
-        return Run.query.filter(
+        summary = RunSummaryService.get(email)
+        run = RunService._session_run(summary.active_run_id, session_id)
+        if run is not None or not summary.active:
+            return run
+        # The oldest active run belongs to another session, this one may still have one
+        return Run.query.options(load_only(Run.id, Run.session_id, Run.status)).filter(
             Run.session_id == session_id,
-            Run.status.in_(active_statuses)
-        ).first()
+            Run.status.in_(ACTIVE_STATUSES)
+        ).order_by(Run.id).first()
 
     @staticmethod
-    def get_user_runs(session_id, limit=None):
-        """Возвращает все запуски пользователя"""
-        query = Run.query.filter_by(session_id=session_id).order_by(Run.created_at.desc())
-        if limit:
-            query = query.limit(limit)
-        return query.all()
+    def _session_run(run_id, session_id):
+        """Run `run_id` (status columns only) if it belongs to the session"""
+        if run_id is None:
+            return None
+        run = db.session.get(Run, run_id, options=[load_only(Run.id, Run.session_id, Run.status)])
+        return run if run is not None and run.session_id == session_id else None
+
+    @staticmethod
+    def get_run_history(email, limit, cursor=None, statuses=None, since=None, until=None):
+        """One page of the user's runs, newest first: (runs, cursor of the next page or None).
+
+        Keyset pagination on (created_at, id): a page continues strictly
+        after the cursor row, so its cost does not depend on how many runs
+        came before it (ix_run_email_created / ix_run_email_status_created).
+        Only HISTORY_COLUMNS are loaded, logs never are.
+        """
+        query = Run.query.options(load_only(*HISTORY_COLUMNS)).filter(Run.email == email)
+        if statuses:
+            query = query.filter(Run.status.in_(statuses))
+        if since:
+            query = query.filter(Run.created_at >= since)
+        if until:
+            query = query.filter(Run.created_at < until)
+        if cursor:
+            created_at, run_id = decode_cursor(cursor)
+            query = query.filter(db.tuple_(Run.created_at, Run.id) < (created_at, run_id))
+
+        runs = query.order_by(Run.created_at.desc(), Run.id.desc()).limit(limit + 1).all()
+        if len(runs) <= limit:
+            return runs, None
+        runs = runs[:limit]
+        return runs, encode_cursor(runs[-1].created_at, runs[-1].id)
 
@@ -0,0 +1,152 @@
+import logging
+
+from datetime import datetime
+
+from sqlalchemy import func, update
+from sqlalchemy.orm.util import identity_key
+
+from app import db
+from app.models.run import Run, RunStatus
+from app.models.user_run_summary import UserRunSummary
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (RunStatus.PENDING, RunStatus.RUNNING)
+
+
+class RunSummaryService:
+    """Per-email UserRunSummary rows, maintained incrementally.
+
+    Every change of a run's existence or status calls runs_created() or
+    transition() in the same transaction, after the change was flushed,
+    so the summary commits or rolls back together with it. Updates are
+    relative (pending = pending + 1, ...) and never read the row first.
+    A user without a row yet (e.g. runs from before the table existed) is
+    rebuilt from Run once; that already includes the change, so no delta
+    is applied on top of it.
+    """
+
+    @staticmethod
+    def get(email, fresh=False):
+        """The user's summary; `fresh` rereads it instead of using the session's copy.
+
+        Users that never ran anything since the table exists get an
+        unsaved summary computed from Run.
+        """
+        summary = db.session.get(UserRunSummary, email, populate_existing=fresh)
+        return summary if summary is not None else RunSummaryService.build(email)
+
+    @staticmethod
+    def runs_created(email, runs):
+        """Counts new pending runs of `email`"""
+        if not runs:
+            return
+        newest = max(run.id for run in runs)
+        oldest = min(run.id for run in runs)
+        RunSummaryService._apply(email, {
+            UserRunSummary.pending: UserRunSummary.pending + len(runs),
+            UserRunSummary.total: UserRunSummary.total + len(runs),
+            UserRunSummary.last_run_id: db.case(
+                (UserRunSummary.last_run_id > newest, UserRunSummary.last_run_id), else_=newest
+            ),
+            UserRunSummary.active_run_id: db.case(
+                (UserRunSummary.active_run_id < oldest, UserRunSummary.active_run_id), else_=oldest
+            ),
+        })
+
+    @staticmethod
+    def status_changed(run, old_status):
+        """Moves `run` from `old_status` to its current status"""
+        if old_status == RunStatus.COMPLETED and run.status != RunStatus.COMPLETED:
+            # Not a transition the executor makes; the runtime counted for it is unknown now
+            RunSummaryService.refresh(run.email)
+            return
+        duration = None
+        if run.status == RunStatus.COMPLETED and run.start_time and run.end_time:
+            duration = (run.end_time - run.start_time).total_seconds()
+        RunSummaryService.transition(run.email, run.id, old_status, run.status, duration)
+
+    @staticmethod
+    def transition(email, run_id, old_status, new_status, duration=None):
+        """Moves one run between status counters; `duration` counts a completed run's runtime"""
+        old_status, new_status = RunStatus(old_status), RunStatus(new_status)
+        if old_status == new_status:
+            return
+
+        old_column = getattr(UserRunSummary, old_status.value)
+        new_column = getattr(UserRunSummary, new_status.value)
+        values = {old_column: old_column - 1, new_column: new_column + 1}
+        if duration is not None:
+            values[UserRunSummary.completed_duration] = UserRunSummary.completed_duration + duration
+            values[UserRunSummary.timed_runs] = UserRunSummary.timed_runs + 1
+
+        if old_status in ACTIVE_STATUSES and new_status not in ACTIVE_STATUSES:
+            # The oldest active run left the queue: the next oldest takes its place
+            next_active = db.session.query(func.min(Run.id)).filter(
+                Run.email == email,
+                Run.status.in_(ACTIVE_STATUSES)
+            ).scalar_subquery()
+            values[UserRunSummary.active_run_id] = db.case(
+                (UserRunSummary.active_run_id == run_id, next_active), else_=UserRunSummary.active_run_id
+            )
+        elif new_status in ACTIVE_STATUSES and old_status not in ACTIVE_STATUSES:
+            values[UserRunSummary.active_run_id] = db.case(
+                (UserRunSummary.active_run_id < run_id, UserRunSummary.active_run_id), else_=run_id
+            )
+
+        RunSummaryService._apply(email, values)
+
+    @staticmethod
+    def refresh(email):
+        """Recomputes the user's row from Run, e.g. after a bulk change of unknown runs"""
+        db.session.flush()
+        db.session.merge(RunSummaryService.build(email))
+
+    @staticmethod
+    def build(email):
+        """Summary of `email` computed from Run (not added to the session)"""
+        summary = UserRunSummary(email=email, completed_duration=0.0, timed_runs=0, total=0)
+        for status in RunStatus:
+            setattr(summary, status.value, 0)
+
+        for status, count in db.session.query(Run.status, func.count(Run.id)) \
+                .filter(Run.email == email).group_by(Run.status):
+            setattr(summary, status.value, count)
+            summary.total += count
+
+        for start_time, end_time in db.session.query(Run.start_time, Run.end_time).filter(
+            Run.email == email,
+            Run.status == RunStatus.COMPLETED,
+            Run.start_time.isnot(None),
+            Run.end_time.isnot(None)
+        ):
+            summary.completed_duration += (end_time - start_time).total_seconds()
+            summary.timed_runs += 1
+
+        summary.last_run_id = db.session.query(func.max(Run.id)).filter(Run.email == email).scalar()
+        summary.active_run_id = db.session.query(func.min(Run.id)).filter(
+            Run.email == email,
+            Run.status.in_(ACTIVE_STATUSES)
+        ).scalar()
+        return summary
+
+    @staticmethod
+    def _apply(email, values):
+        db.session.flush()
+        result = db.session.execute(
+            update(UserRunSummary)
+            .where(UserRunSummary.email == email)
+            .values({UserRunSummary.updated_at: datetime.utcnow(), **values})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            logger.info(f"Building the run summary of {email}")
+            db.session.add(RunSummaryService.build(email))
+            db.session.flush()
+            return
+
+        # A copy loaded earlier in this session no longer matches the row
+        loaded = db.session.identity_map.get(identity_key(UserRunSummary, email))
+        if loaded is not None:
+            db.session.expire(loaded)
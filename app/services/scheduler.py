@@ -0,0 +1,150 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+class _Entry:
+    __slots__ = ('score', 'seq', 'run_id', 'email', 'start_tag', 'memory_mb', 'removed')
+
+    def __init__(self, score, seq, run_id, email, start_tag, memory_mb=None):
+        self.score = score
+        self.seq = seq
+        self.run_id = run_id
+        self.email = email
+        self.start_tag = start_tag
+        self.memory_mb = memory_mb
+        self.removed = False
+
+    def __lt__(self, other):
+        return (self.score, self.seq) < (other.score, other.seq)
+
+
+class RunScheduler:
+    """Queue of pending runs ordered by fair share, priority and age.
+
+    Every run gets a static score expressed in seconds of waiting:
+
+        score = submitted_at
+                - priority * priority_step
+                + runs of the same email ahead of it * fair_share_step
+                + expected_runtime * sjf_weight
+
+    The lowest score is dispatched first. Because all pending runs age at
+    the same rate, aging is just the submitted_at term: a newer run can
+    only get ahead of an older one by its bounded priority and fair share
+    advantage, so nobody starves, and scores never have to be recomputed.
+    The fair share term uses start-time fair queuing tags per email, so a
+    bulk submission only delays its own tail.
+    put/get/remove are O(log n); removal is lazy.
+
+    get() accepts an admission check. When the best run is not admitted
+    (e.g. its predicted memory does not fit) workers wait for it instead
+    of skipping it, so large runs are not starved by small ones.
+    """
+
+    def __init__(self, priority_step=600.0, fair_share_step=300.0, sjf_weight=0.0):
+        self.priority_step = priority_step
+        self.fair_share_step = fair_share_step
+        self.sjf_weight = sjf_weight
+
+        self._heap = []
+        self._entries = {}
+        self._last_tag = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def configure(self, priority_step=None, fair_share_step=None, sjf_weight=None):
+        with self._condition:
+            if priority_step is not None:
+                self.priority_step = priority_step
+            if fair_share_step is not None:
+                self.fair_share_step = fair_share_step
+            if sjf_weight is not None:
+                self.sjf_weight = sjf_weight
+
+    def put(self, run_id, email, priority=0, expected_runtime=None, submitted_at=None,
+            memory_mb=None):
+        with self._condition:
+            if run_id in self._entries:
+                return
+
+            start_tag = max(self._virtual_time, self._last_tag.get(email, 0.0))
+            self._last_tag[email] = start_tag + 1.0
+
+            score = (submitted_at or time.time()) \
+                - priority * self.priority_step \
+                + (start_tag - self._virtual_time) * self.fair_share_step
+            if expected_runtime:
+                score += expected_runtime * self.sjf_weight
+
+            entry = _Entry(score, next(self._seq), run_id, email, start_tag, memory_mb)
+            self._entries[run_id] = entry
+            heapq.heappush(self._heap, entry)
+            self._condition.notify()
+
+    def get(self, timeout=None, admit=None, recheck_interval=1.0):
+        """Blocks until a run is available and admitted, returns its id.
+
+        Returns None when the scheduler is closed or the timeout expires.
+        admit is called with the best entry under the scheduler lock.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                entry = self._peek()
+                if entry is not None and (admit is None or admit(entry)):
+                    return self._pop().run_id
+
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                if entry is not None:
+                    # Admission depends on external state, so poll for it
+                    remaining = recheck_interval if remaining is None else min(remaining, recheck_interval)
+                self._condition.wait(remaining)
+
+    def _peek(self):
+        while self._heap and self._heap[0].removed:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def _pop(self):
+        entry = self._peek()
+        if entry is None:
+            return None
+        heapq.heappop(self._heap)
+        del self._entries[entry.run_id]
+        self._virtual_time = max(self._virtual_time, entry.start_tag)
+        if self._last_tag.get(entry.email, 0.0) <= self._virtual_time:
+            self._last_tag.pop(entry.email, None)
+        return entry
+
+    def notify(self):
+        """Wakes up waiting workers, e.g. after memory has been freed"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def remove(self, run_id):
+        """Drops a pending run; returns False if it is not queued"""
+        with self._condition:
+            entry = self._entries.pop(run_id, None)
+            if entry is None:
+                return False
+            entry.removed = True
+            return True
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def qsize(self):
+        return len(self._entries)
+
+    def __contains__(self, run_id):
+        return run_id in self._entries
@@ -0,0 +1,54 @@
+import numpy as np
+
+from sqlalchemy import select
+
+from app import db
+from app.models.run import RunStage
+from app.models.stage_timing import StageTiming
+
+
+class StatsService:
+    PERCENTILES = (50, 90, 95, 99)
+
+    @staticmethod
+    def stage_duration_stats(since=None, until=None, email=None):
+        """Aggregate duration statistics of completed stages.
+
+        Only the duration column is fetched, one indexed query per stage,
+        and every aggregate is computed with numpy over the whole array.
+        """
+        filters = [StageTiming.completed.is_(True)]
+        if since:
+            filters.append(StageTiming.started_at >= since)
+        if until:
+            filters.append(StageTiming.started_at < until)
+        if email:
+            filters.append(StageTiming.email == email)
+
+        result = []
+        for stage in RunStage:
+            if stage == RunStage.NONE:
+                continue
+
+            durations = np.array(
+                db.session.execute(
+                    select(StageTiming.duration).where(StageTiming.stage == stage, *filters)
+                ).scalars().all(),
+                dtype=np.float64
+            )
+            if not durations.size:
+                continue
+
+            percentiles = np.percentile(durations, StatsService.PERCENTILES)
+            result.append({
+                'stage': stage.value,
+                'count': int(durations.size),
+                'mean': float(durations.mean()),
+                'min': float(durations.min()),
+                'max': float(durations.max()),
+                'percentiles': {
+                    f'p{p}': float(value)
+                    for p, value in zip(StatsService.PERCENTILES, percentiles)
+                }
+            })
+        return result
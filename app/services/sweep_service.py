@@ -0,0 +1,195 @@
+import io
+import os
+import re
+import csv
+import json
+import logging
+import itertools
+
+from collections import Counter
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.run import Run
+from app.models.run_metric import RunMetric
+from app.models.sweep import Sweep
+from app.services.quota_service import QuotaService
+from app.services.run_service import RunService
+from app.services.run_summary_service import RunSummaryService
+from app.utils.files import link_or_copy
+
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEY_PATTERN = re.compile(r'^[A-Z][A-Z0-9_]*$')
+CHILD_CONFIG_FILENAME = 'config.json'
+
+
+class SweepService:
+    """Expands one upload and a parameter grid into parallel child runs"""
+
+    @staticmethod
+    def get_sweep_folder(sweep_id):
+        return os.path.join(RunService.get_runs_folder(), f'sweep_{sweep_id}')
+
+    @staticmethod
+    def expand_grid(grid):
+        """All combinations of a {CONFIG_KEY: [values]} grid, in key order"""
+        if not isinstance(grid, dict) or not grid:
+            raise ValueError('Grid must be a non-empty object of configuration keys')
+
+        keys = list(grid)
+        for key in keys:
+            if not CONFIG_KEY_PATTERN.match(key):
+                raise ValueError(f'Invalid configuration key: {key}')
+            values = grid[key]
+            if not isinstance(values, list) or not values:
+                raise ValueError(f'Values of {key} must be a non-empty list')
+            if any(isinstance(value, dict) for value in values):
+                raise ValueError(f'Values of {key} must be scalars or lists')
+
+        total = 1
+        for key in keys:
+            total *= len(grid[key])
+        if total > current_app.config['SWEEP_MAX_RUNS']:
+            raise ValueError(f"Grid expands to {total} runs, at most {current_app.config['SWEEP_MAX_RUNS']} allowed")
+
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+    @staticmethod
+    def create_sweep(session_id, email, config_file, source_files, grid, name=None, priority=0):
+        """Saves the sources once and creates a pending child run per grid point.
+
+        Sources are stored in the sweep folder and hard-linked into every
+        child run directory; each child gets the base configuration with
+        its grid values applied, written as JSON.
+        """
+        points = SweepService.expand_grid(grid)
+        QuotaService.check(email, new_runs=len(points))
+
+        config_filename = secure_filename(config_file.filename)
+        try:
+            base_config = RunService.parse_config(config_file.read(), config_filename)
+        except Exception as e:
+            raise ValueError(f'Invalid configuration: {str(e)}')
+        config_file.seek(0)
+        if not isinstance(base_config, dict):
+            raise ValueError('Sweeps need a JSON or YAML configuration')
+
+        sweep = Sweep(
+            email=email,
+            session_id=session_id,
+            name=name,
+            design_name=base_config.get('DESIGN_NAME'),
+            parameters=json.dumps(grid)
+        )
+        db.session.add(sweep)
+        RunService._commit('create_sweep')
+
+        shared_dir = SweepService.get_sweep_folder(sweep.id)
+        os.makedirs(shared_dir, exist_ok=True)
+        config_file.save(os.path.join(shared_dir, config_filename))
+        source_filenames = []
+        for source_file in source_files:
+            source_filename = secure_filename(source_file.filename)
+            source_file.save(os.path.join(shared_dir, source_filename))
+            source_filenames.append(source_filename)
+
+        runs = []
+        try:
+            for point in points:
+                run = Run(
+                    session_id=session_id,
+                    email=email,
+                    priority=priority,
+                    sweep_id=sweep.id,
+                    sweep_params=json.dumps(point),
+                    design_name=sweep.design_name,
+                    config_filename=CHILD_CONFIG_FILENAME,
+                    sources_filenames=json.dumps(source_filenames)
+                )
+                db.session.add(run)
+                runs.append(run)
+            db.session.flush()
+            RunSummaryService.runs_created(email, runs)
+            QuotaService.enforce(email)
+
+            for run, point in zip(runs, points):
+                project_dir = RunService.get_project_folder(run.id)
+                os.makedirs(project_dir, exist_ok=True)
+                for source_filename in source_filenames:
+                    link_or_copy(
+                        os.path.join(shared_dir, source_filename),
+                        os.path.join(project_dir, source_filename)
+                    )
+                with open(os.path.join(project_dir, CHILD_CONFIG_FILENAME), 'w') as f:
+                    json.dump({**base_config, **point}, f, indent=2)
+
+            RunService._commit('create_sweep_runs')
+        except Exception:
+            db.session.rollback()
+            raise
+
+        logger.info(f"Created sweep {sweep.id} with {len(runs)} runs over {', '.join(grid)}")
+        return sweep, runs
+
+    @staticmethod
+    def get_runs(sweep_id):
+        return Run.query.filter_by(sweep_id=sweep_id).order_by(Run.id).all()
+
+    @staticmethod
+    def summary(sweep):
+        """Status counts and one row per child run with its grid values and metrics"""
+        runs = SweepService.get_runs(sweep.id)
+
+        metrics = {}
+        for run_id, name, value in db.session.query(RunMetric.run_id, RunMetric.name, RunMetric.value) \
+                .join(Run, Run.id == RunMetric.run_id) \
+                .filter(Run.sweep_id == sweep.id):
+            metrics.setdefault(run_id, {})[name] = value
+
+        statuses = Counter(run.status.value for run in runs)
+        rows = [
+            {
+                'run_id': run.id,
+                'parameters': json.loads(run.sweep_params or '{}'),
+                'status': run.status.value,
+                'progress': run.progress,
+                'duration': (run.end_time - run.start_time).total_seconds()
+                if run.start_time and run.end_time else None,
+                'metrics': metrics.get(run.id, {})
+            }
+            for run in runs
+        ]
+
+        result = sweep.to_dict()
+        result.update({
+            'total': len(runs),
+            'statuses': dict(statuses),
+            'finished': all(run.is_finished for run in runs),
+            'metric_names': sorted({name for values in metrics.values() for name in values}),
+            'runs': rows
+        })
+        return result
+
+    @staticmethod
+    def summary_csv(summary):
+        """The summary rows as CSV: run, status, grid keys, then metrics"""
+        keys = list(summary['parameters'])
+        names = summary['metric_names']
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['run_id', 'status', 'duration'] + keys + names)
+        for row in summary['runs']:
+            writer.writerow(
+                [row['run_id'], row['status'], row['duration']]
+                + [_csv_value(row['parameters'].get(key)) for key in keys]
+                + [row['metrics'].get(name) for name in names]
+            )
+        return output.getvalue()
+
+
+def _csv_value(value):
+    return json.dumps(value) if isinstance(value, (list, bool)) or value is None else value
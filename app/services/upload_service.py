@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import secrets
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.services.run_service import RunService
+from app.services.validation_service import FileValidationService
+from app.utils.archives import ArchiveError, extract_tar, is_archive, member_path
+from app.utils.files import link_or_copy
+
+try:
+    import fcntl
+except ImportError:  # Windows: chunks of one upload are not written concurrently
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = '_uploads'
+META_FILENAME = 'meta.json'
+DATA_FILENAME = 'data'
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+DEFAULT_CONFIG_NAMES = ('config.json', 'config.yaml', 'config.yml')
+COPY_BUFFER = 64 * 1024
+
+
+class UploadService:
+    """Chunked, resumable uploads and assembly of project directories.
+
+    Every upload lives in RUNS_FOLDER/_uploads/<id>: meta.json with the
+    declared name, size and owner, and the data file the chunks are
+    written into. The received offset is the size of the data file, so
+    it survives restarts and needs no bookkeeping of its own.
+    """
+
+    @staticmethod
+    def get_uploads_folder():
+        return os.path.join(RunService.get_runs_folder(), UPLOADS_DIR)
+
+    @staticmethod
+    def _upload_dir(upload_id):
+        return os.path.join(UploadService.get_uploads_folder(), upload_id)
+
+    @staticmethod
+    def _data_path(meta):
+        return os.path.join(UploadService._upload_dir(meta['id']), DATA_FILENAME)
+
+    @staticmethod
+    def create(email, filename, size, sha256=None):
+        """Starts an upload of `size` bytes; ValueError on an unacceptable file"""
+        filename = secure_filename(filename or '')
+        extension = os.path.splitext(filename)[1].lower()
+        if not filename or not (is_archive(filename)
+                                or extension in FileValidationService.ALLOWED_CONFIG_EXTENSIONS
+                                or extension in FileValidationService.ALLOWED_SOURCES_EXTENSIONS):
+            raise ValueError(f'Неподдерживаемый формат файла: {filename}')
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError('size must be a positive number of bytes')
+        if size > current_app.config['UPLOAD_MAX_SIZE']:
+            raise ValueError(f"File is larger than {current_app.config['UPLOAD_MAX_SIZE']} bytes")
+        if sha256 is not None and not re.match(r'^[0-9a-fA-F]{64}$', str(sha256)):
+            raise ValueError('sha256 must be a hex digest')
+
+        UploadService.cleanup_expired()
+
+        meta = {
+            'id': secrets.token_urlsafe(18),
+            'email': email,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time(),
+            'completed': False
+        }
+        upload_dir = UploadService._upload_dir(meta['id'])
+        os.makedirs(upload_dir)
+        open(os.path.join(upload_dir, DATA_FILENAME), 'wb').close()
+        UploadService._save_meta(meta)
+
+        logger.info(f"Upload {meta['id']} started by {email}: {filename}, {size} bytes")
+        return meta
+
+    @staticmethod
+    def get(upload_id, email):
+        """Upload of the user, None if it does not exist or belongs to someone else"""
+        if not upload_id or not UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        try:
+            with open(os.path.join(UploadService._upload_dir(upload_id), META_FILENAME)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('email') == email else None
+
+    @staticmethod
+    def _save_meta(meta):
+        path = os.path.join(UploadService._upload_dir(meta['id']), META_FILENAME)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(f'{path}.tmp', path)
+
+    @staticmethod
+    def offset(meta):
+        """Bytes received so far"""
+        try:
+            return os.path.getsize(UploadService._data_path(meta))
+        except OSError:
+            return 0
+
+    @staticmethod
+    def status(meta):
+        return {
+            'upload_id': meta['id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': UploadService.offset(meta),
+            'completed': meta['completed']
+        }
+
+    @staticmethod
+    def write_chunk(meta, start, stream, length):
+        """Writes `length` bytes of `stream` at `start`, returns the new offset.
+
+        A chunk may repeat data already received but must not leave a gap;
+        ValueError if `start` is past the current offset. Whatever arrives
+        before the client disconnects is kept, so the upload resumes from
+        the returned offset.
+        """
+        if meta['completed']:
+            raise ValueError('Upload is already complete')
+
+        with open(UploadService._data_path(meta), 'r+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            received = os.fstat(f.fileno()).st_size
+            if start > received:
+                raise ValueError(f'Chunk starts at {start}, but only {received} bytes were received')
+
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = stream.read(min(COPY_BUFFER, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+            f.flush()
+            return max(received, f.tell())
+
+    @staticmethod
+    def complete(meta):
+        """Marks a fully received upload complete after checking its size and sha256"""
+        received = UploadService.offset(meta)
+        if received != meta['size']:
+            raise ValueError(f"Received {received} of {meta['size']} bytes")
+
+        if meta['sha256'] and not meta['completed']:
+            digest = hashlib.sha256()
+            with open(UploadService._data_path(meta), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            if digest.hexdigest() != meta['sha256']:
+                UploadService.discard(meta['id'])
+                raise ValueError('Checksum mismatch, the upload was discarded')
+
+        meta['completed'] = True
+        UploadService._save_meta(meta)
+        return meta
+
+    @staticmethod
+    def discard(upload_id):
+        shutil.rmtree(UploadService._upload_dir(upload_id), ignore_errors=True)
+
+    @staticmethod
+    def cleanup_expired():
+        """Removes uploads and unfinished project directories older than UPLOAD_SESSION_TTL"""
+        folder = UploadService.get_uploads_folder()
+        if not os.path.isdir(folder):
+            return
+        expires = time.time() - current_app.config['UPLOAD_SESSION_TTL']
+        for entry in os.scandir(folder):
+            try:
+                if entry.is_dir() and _last_modified(entry.path) < expires:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    logger.info(f"Removed expired upload {entry.name}")
+            except OSError:
+                continue
+
+    @staticmethod
+    def build_project(email, upload_ids, files, config_name=None):
+        """Assembles completed uploads and multipart files into a project directory.
+
+        Archives are extracted (see app.utils.archives) with a single top
+        level directory stripped; other files are placed at the top level.
+        The configuration is `config_name`, or the top level config.json /
+        config.yaml / the only top level configuration file.
+
+        Returns (project directory, config filename, other input files,
+        warnings). The directory is moved into place by
+        RunService.save_project_dir; the uploads stay until the caller
+        discards them. ValueError (ArchiveError) on invalid input.
+        """
+        uploads = []
+        for upload_id in upload_ids:
+            meta = UploadService.get(upload_id, email)
+            if not meta or not meta['completed']:
+                raise ValueError(f'Upload {upload_id} not found or not complete')
+            uploads.append(meta)
+
+        project_dir = os.path.join(UploadService.get_uploads_folder(), f'project_{secrets.token_hex(8)}')
+        os.makedirs(project_dir)
+        warnings = []
+        try:
+            for meta in uploads:
+                UploadService._add_file(project_dir, UploadService._data_path(meta), meta['filename'], warnings)
+
+            for file in files:
+                path = os.path.join(project_dir, f'.upload_{secrets.token_hex(4)}')
+                file.save(path)
+                UploadService._add_file(project_dir, path, file.filename, warnings)
+
+            config_filename, input_filenames = UploadService._project_files(project_dir, config_name)
+        except Exception:
+            shutil.rmtree(project_dir, ignore_errors=True)
+            raise
+
+        return project_dir, config_filename, input_filenames, warnings
+
+    @staticmethod
+    def _add_file(project_dir, path, filename, warnings):
+        """Links a received file into the project, extracting archives"""
+        if is_archive(filename):
+            UploadService._add_archive(project_dir, path, filename, warnings)
+            return
+
+        filename = secure_filename(filename)
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in FileValidationService.ALLOWED_CONFIG_EXTENSIONS \
+                and extension not in FileValidationService.ALLOWED_SOURCES_EXTENSIONS:
+            raise ValueError(f'Неподдерживаемый формат файла: {filename}')
+        destination = os.path.join(project_dir, filename)
+        if os.path.exists(destination):
+            raise ValueError(f'Duplicate file: {filename}')
+        link_or_copy(path, destination)
+        if os.path.dirname(path) == project_dir:
+            os.remove(path)
+
+    @staticmethod
+    def _add_archive(project_dir, path, filename, warnings):
+        config = current_app.config
+        extract_dir = os.path.join(project_dir, f'.extract_{secrets.token_hex(4)}')
+        os.makedirs(extract_dir)
+        try:
+            extracted, skipped = extract_tar(
+                path,
+                extract_dir,
+                allowed_extensions=config['ARCHIVE_ALLOWED_EXTENSIONS'],
+                max_members=config['ARCHIVE_MAX_MEMBERS'],
+                max_member_size=config['ARCHIVE_MAX_MEMBER_SIZE'],
+                max_total_size=config['ARCHIVE_MAX_TOTAL_SIZE'],
+                max_ratio=config['ARCHIVE_MAX_RATIO']
+            )
+            if not extracted:
+                raise ArchiveError(f'{filename}: no design files in the archive')
+            if skipped:
+                shown = ', '.join(skipped[:5]) + (f' (+{len(skipped) - 5})' if len(skipped) > 5 else '')
+                warnings.append(f'{filename}: пропущены файлы неподдерживаемых форматов: {shown}')
+
+            # tar czf design.tgz design/ puts everything under one directory
+            root = extract_dir
+            entries = os.listdir(root)
+            while len(entries) == 1 and os.path.isdir(os.path.join(root, entries[0])):
+                root = os.path.join(root, entries[0])
+                entries = os.listdir(root)
+
+            for name in entries:
+                destination = os.path.join(project_dir, name)
+                if os.path.exists(destination):
+                    raise ValueError(f'{filename}: {name} already exists in the project')
+                os.replace(os.path.join(root, name), destination)
+        finally:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+            if os.path.dirname(path) == project_dir:
+                os.remove(path)
+
+        logger.info(f"Extracted {len(extracted)} files from {filename}")
+
+    @staticmethod
+    def _project_files(project_dir, config_name=None):
+        """(config filename, other files) of an assembled project"""
+        files = []
+        for root, dirs, names in os.walk(project_dir):
+            for name in names:
+                files.append(os.path.relpath(os.path.join(root, name), project_dir).replace(os.sep, '/'))
+
+        config_extensions = FileValidationService.ALLOWED_CONFIG_EXTENSIONS
+        if config_name:
+            config_filename = member_path(config_name)
+            if config_filename not in files or os.path.splitext(config_filename)[1].lower() not in config_extensions:
+                raise ValueError(f'Configuration {config_name} not found in the project')
+        else:
+            candidates = sorted(
+                name for name in files
+                if '/' not in name and os.path.splitext(name)[1].lower() in config_extensions
+            )
+            defaults = [name for name in DEFAULT_CONFIG_NAMES if name in candidates]
+            if defaults:
+                config_filename = defaults[0]
+            elif len(candidates) == 1:
+                config_filename = candidates[0]
+            elif candidates:
+                raise ValueError(f"Several configurations found ({', '.join(candidates)}), choose one with `config`")
+            else:
+                raise ValueError('Не найден конфигурационный файл (.json, .yaml, .conf) в корне проекта')
+
+        if os.path.getsize(os.path.join(project_dir, config_filename)) > FileValidationService.MAX_CONFIG_SIZE:
+            raise ValueError(f'Конфигурационный файл {config_filename} слишком большой')
+
+        sources_extensions = FileValidationService.ALLOWED_SOURCES_EXTENSIONS
+        if not any(os.path.splitext(name)[1].lower() in sources_extensions for name in files):
+            raise ValueError('Не предоставлены исходные файлы Verilog')
+
+        return config_filename, sorted(name for name in files if name != config_filename)
+
+
+def _last_modified(path):
+    """Latest mtime of a directory and the files directly in it"""
+    latest = os.path.getmtime(path)
+    for entry in os.scandir(path):
+        latest = max(latest, entry.stat().st_mtime)
+    return latest
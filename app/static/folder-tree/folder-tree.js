@@ -8,8 +8,14 @@ class FolderTreeManager {
         this.refreshButton = options.refreshButton || document.getElementById('refreshBtn');
         this.cleanupButton = options.cleanupButton || document.getElementById('cleanupBtn');
         
+        // Remote mode: directories are fetched one level at a time
+        this.listUrl = options.listUrl || this.container.dataset.listUrl || null;
+        this.fileUrl = options.fileUrl || this.container.dataset.fileUrl || null;
+        this.onPreview = options.onPreview || null;
+        this.remote = Boolean(this.listUrl);
+        
         this.currentView = 'grid'; // 'grid' | 'list'
-        this.currentSort = 'date-desc';
+        this.currentSort = options.sort || this.container.dataset.sort || 'date-desc';
         this.currentSearch = '';
         this.selectedItem = null;
         this.expandedFolders = new Set();
@@ -21,8 +27,41 @@ class FolderTreeManager {
     
     init() {
         this.bindEvents();
-        this.loadSampleData();
-        this.render();
+        if (this.remote) {
+            this.loadRoot();
+        } else {
+            this.loadSampleData();
+            this.render();
+        }
+    }
+    
+    async loadRoot() {
+        this.showLoadingState();
+        try {
+            this.data = await this.fetchDirectory('');
+            this.expandedFolders.clear();
+            this.render();
+        } catch (error) {
+            this.data = [];
+            this.render();
+            this.showNotification(`Ошибка загрузки: ${error.message}`, 'error');
+        }
+    }
+    
+    async fetchDirectory(path) {
+        const response = await fetch(`${this.listUrl}?path=${encodeURIComponent(path)}`);
+        const listing = await response.json();
+        if (!response.ok || listing.error) {
+            throw new Error(listing.error || `HTTP ${response.status}`);
+        }
+        if (listing.truncated) {
+            this.showNotification(`Показаны первые ${listing.items.length} из ${listing.total} элементов`, 'info');
+        }
+        return listing.items.map(item => ({
+            ...item,
+            id: item.path,
+            children: item.type === 'folder' ? null : undefined
+        }));
     }
     
     bindEvents() {
@@ -109,6 +148,11 @@ class FolderTreeManager {
     }
     
     handleRefresh() {
+        if (this.remote) {
+            this.loadRoot();
+            return;
+        }
+        
         // Simulate API call
         this.showLoadingState();
         
@@ -186,6 +230,9 @@ class FolderTreeManager {
             case 'открыть':
                 this.openItem(itemData);
                 break;
+            case 'просмотр':
+                this.previewItem(itemData);
+                break;
             case 'удалить':
                 this.deleteItem(itemData);
                 break;
@@ -198,15 +245,32 @@ class FolderTreeManager {
         }
     }
     
-    toggleFolder(folderId) {
+    async toggleFolder(folderId) {
         if (this.expandedFolders.has(folderId)) {
             this.expandedFolders.delete(folderId);
         } else {
+            const folder = this.findItemById(folderId);
+            if (this.remote && folder && folder.children === null) {
+                try {
+                    folder.children = await this.fetchDirectory(folder.path);
+                } catch (error) {
+                    this.showNotification(`Ошибка загрузки: ${error.message}`, 'error');
+                    return;
+                }
+            }
             this.expandedFolders.add(folderId);
         }
         this.render();
     }
     
+    previewItem(item) {
+        if (this.onPreview) {
+            this.onPreview(item);
+        } else if (this.fileUrl) {
+            window.open(`${this.fileUrl}?path=${encodeURIComponent(item.path)}`, '_blank');
+        }
+    }
+    
     openItem(item) {
         if (item.type === 'folder') {
             this.toggleFolder(item.id);
@@ -241,6 +305,11 @@ class FolderTreeManager {
     }
     
     downloadItem(item) {
+        if (this.remote && this.fileUrl) {
+            window.location.href = `${this.fileUrl}?path=${encodeURIComponent(item.path)}&download=1`;
+            return;
+        }
+        
         this.showNotification(`Начато скачивание "${item.name}"`, 'info');
         // Simulate download
         setTimeout(() => {
@@ -345,7 +414,8 @@ class FolderTreeManager {
     renderItems(items, level = 0) {
         return items.map(item => {
             const isExpanded = this.expandedFolders.has(item.id);
-            const hasChildren = item.children && item.children.length > 0;
+            const hasChildren = (item.children && item.children.length > 0)
+                || (item.children === null && item.entries > 0);
             const isSelected = this.selectedItem === item.id;
             
             const itemClasses = [
@@ -369,7 +439,7 @@ class FolderTreeManager {
                     <div class="folder-tree__info">
                         <div class="folder-tree__name">${this.escapeHtml(item.name)}</div>
                         <div class="folder-tree__meta">
-                            <span class="folder-tree__size">${this.formatFileSize(item.size)}</span>
+                            <span class="folder-tree__size">${item.size === null ? `${item.entries} эл.` : this.formatFileSize(item.size)}</span>
                             <span class="folder-tree__date">${this.formatDate(item.modified)}</span>
                             ${item.status ? `<span class="folder-tree__status folder-tree__status--${item.status}">${this.getStatusText(item.status)}</span>` : ''}
                         </div>
@@ -379,7 +449,7 @@ class FolderTreeManager {
                         ${this.renderActions(item)}
                     </div>
                 </div>
-                ${hasChildren && isExpanded ? `
+                ${hasChildren && isExpanded && item.children ? `
                     <div class="folder-tree__children">
                         ${this.renderItems(item.children, level + 1)}
                     </div>
@@ -391,6 +461,17 @@ class FolderTreeManager {
     renderActions(item) {
         const actions = [];
         
+        if (this.remote) {
+            // Results are read-only
+            if (item.type === 'folder') {
+                actions.push('<button class="button button--small button--secondary">Открыть</button>');
+            } else {
+                actions.push('<button class="button button--small button--secondary">Просмотр</button>');
+                actions.push('<button class="button button--small button--primary">Скачать</button>');
+            }
+            return actions.join('');
+        }
+        
         if (item.type === 'folder') {
             actions.push('<button class="button button--small button--secondary">Открыть</button>');
         } else {
@@ -639,7 +720,11 @@ class FolderTreeManager {
 
 // ===== Initialization =====
 document.addEventListener('DOMContentLoaded', function() {
-    const folderTreeManager = new FolderTreeManager();
+    if (!document.querySelector('.folder-tree')) return;
+    
+    const folderTreeManager = new FolderTreeManager({
+        onPreview: window.folderTreePreview || null
+    });
     window.folderTreeManager = folderTreeManager;
     
     // Make it globally available for HTML onclick handlers
@@ -0,0 +1,125 @@
+import os
+import tarfile
+import posixpath
+
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+COPY_BUFFER = 64 * 1024
+
+# Metadata written by archivers, never part of a design
+_IGNORED_PARTS = ('__MACOSX', '.git', '.svn')
+
+
+class ArchiveError(ValueError):
+    """The archive is unsafe or exceeds a limit; nothing of it should be used"""
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def member_path(name):
+    """Normalized relative path of an archive member, ArchiveError if it escapes"""
+    path = name.replace('\\', '/')
+    if path.startswith('/') or (len(path) > 1 and path[1] == ':'):
+        raise ArchiveError(f'{name}: absolute paths are not allowed')
+
+    parts = [part for part in path.split('/') if part not in ('', '.')]
+    if any(part == '..' for part in parts):
+        raise ArchiveError(f'{name}: paths outside the project are not allowed')
+    return posixpath.join(*parts) if parts else ''
+
+
+class _CountingReader:
+    """Counts the compressed bytes tarfile pulls from the underlying file"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.count += len(data)
+        return data
+
+
+def extract_tar(path, destination, allowed_extensions, max_members, max_member_size,
+                max_total_size, max_ratio, ratio_threshold=1024 * 1024):
+    """Streams a tar/tar.gz/tar.bz2/tar.xz archive into `destination`.
+
+    Members are read in order without seeking or listing the archive
+    first. Only regular files and directories are extracted; links,
+    devices and paths leaving `destination` reject the whole archive.
+    Files with other extensions than `allowed_extensions` are skipped.
+    Sizes are counted on the bytes actually written, and once more than
+    `ratio_threshold` bytes are out, the archive is rejected as a
+    decompression bomb when it expands over `max_ratio` times.
+
+    Returns (extracted relative paths, skipped member names). `destination`
+    is left partially filled on ArchiveError; callers remove it.
+    """
+    extracted = []
+    skipped = []
+    total = 0
+    members = 0
+
+    with open(path, 'rb') as raw:
+        reader = _CountingReader(raw)
+        try:
+            archive = tarfile.open(fileobj=reader, mode='r|*')
+        except tarfile.TarError as e:
+            raise ArchiveError(f'Not a tar archive: {str(e)}')
+
+        with archive:
+            try:
+                for member in archive:
+                    members += 1
+                    if members > max_members:
+                        raise ArchiveError(f'Archive has more than {max_members} entries')
+
+                    relative = member_path(member.name)
+                    parts = relative.split('/')
+                    if not relative or any(part in _IGNORED_PARTS for part in parts) \
+                            or parts[-1].startswith('._'):
+                        continue
+
+                    target = os.path.join(destination, *parts)
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    if not member.isreg():
+                        raise ArchiveError(f'{member.name}: links and special files are not allowed')
+
+                    if os.path.splitext(relative)[1].lower() not in allowed_extensions:
+                        skipped.append(relative)
+                        continue
+                    if member.size > max_member_size:
+                        raise ArchiveError(f'{member.name}: file is larger than {max_member_size} bytes')
+                    if total + member.size > max_total_size:
+                        raise ArchiveError(f'Archive expands to more than {max_total_size} bytes')
+
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    source = archive.extractfile(member)
+                    try:
+                        # O_EXCL: a repeated member must not overwrite an earlier one
+                        fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                    except FileExistsError:
+                        raise ArchiveError(f'{member.name}: duplicate entry')
+                    with os.fdopen(fd, 'wb') as out:
+                        while True:
+                            chunk = source.read(COPY_BUFFER)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+                            total += len(chunk)
+                            if total > ratio_threshold and total > max_ratio * max(reader.count, 1):
+                                raise ArchiveError(
+                                    f'Archive expands more than {max_ratio} times, refusing to extract it'
+                                )
+                    extracted.append(relative)
+            except (tarfile.TarError, EOFError) as e:
+                raise ArchiveError(f'Corrupted archive: {str(e)}')
+            except (FileExistsError, NotADirectoryError) as e:
+                raise ArchiveError(f'Conflicting file and directory entries: {str(e)}')
+
+    return extracted, skipped
@@ -0,0 +1,289 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+
+from flask import Blueprint, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+try:
+    import rcssmin
+except ImportError:  # optional dependency
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # optional dependency
+    rjsmin = None
+
+
+logger = logging.getLogger(__name__)
+
+# Bundles per page, sources are relative to the static folder.
+# CSS @import rules are inlined, so style.css stays the single list of styles.
+BUNDLES = {
+    'base.css': ['style.css'],
+    'base.js': ['header/header.js'],
+    'help.js': ['sidebar/sidebar.js', 'accordion/accordion.js', 'back2top/back2top.js'],
+    'results.js': ['folder-tree/folder-tree.js'],
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+}
+
+_IMPORT_RE = re.compile(r"""@import\s+(?:url\()?\s*['"]?([^'")\s]+)['"]?\s*\)?\s*;""")
+
+assets_bp = Blueprint('assets', __name__)
+
+
+def init_assets(app):
+    """Builds the bundles and registers the asset_tags template helper.
+
+    With ASSETS_BUNDLE unset bundling follows the debug flag, so
+    development keeps serving the original files.
+    """
+    bundle = app.config['ASSETS_BUNDLE']
+    if bundle is None:
+        bundle = not app.debug
+
+    manifest = {}
+    if bundle:
+        manifest = build_bundles(app.static_folder, app.config['ASSETS_DIR'])
+        app.register_blueprint(assets_bp, url_prefix=f"{app.static_url_path}/dist")
+    app.extensions['assets_manifest'] = manifest
+
+    @app.context_processor
+    def assets_processor():
+        return {'asset_tags': asset_tags}
+
+
+def asset_tags(name):
+    """<link>/<script> tags of a bundle, or of its sources when not bundled"""
+    from flask import current_app
+    manifest = current_app.extensions.get('assets_manifest') or {}
+
+    if name in manifest:
+        urls = [url_for('assets.bundle', filename=manifest[name])]
+    else:
+        urls = [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    if name.endswith('.css'):
+        tags = [f'<link rel="stylesheet" href="{escape(url)}">' for url in urls]
+    else:
+        tags = [f'<script src="{escape(url)}"></script>' for url in urls]
+    return Markup('\n'.join(tags))
+
+
+@assets_bp.route('/<path:filename>')
+def bundle(filename):
+    from flask import current_app
+    directory = current_app.config['ASSETS_DIR']
+    mimetype = MIMETYPES.get(os.path.splitext(filename)[1])
+
+    gzipped = f'{filename}.gz'
+    if (request.accept_encodings['gzip']
+            and os.path.exists(os.path.join(directory, gzipped))):
+        response = send_from_directory(directory, gzipped, mimetype=mimetype,
+                                       max_age=IMMUTABLE_MAX_AGE)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype,
+                                       max_age=IMMUTABLE_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def build_bundles(static_folder, output_dir):
+    """Writes fingerprinted, minified and gzipped bundles.
+
+    Returns the manifest {bundle name: built file name}. Files are
+    written atomically and only when missing, so several processes
+    can build at the same time.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+
+    for name, sources in BUNDLES.items():
+        base, ext = os.path.splitext(name)
+        if ext == '.css':
+            content = minify_css('\n'.join(
+                _read_css(static_folder, source, set()) for source in sources
+            ))
+        else:
+            content = minify_js(';\n'.join(
+                _read(os.path.join(static_folder, source)) for source in sources
+            ))
+
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f'{base}.{digest}{ext}'
+
+        _write_once(os.path.join(output_dir, filename), data)
+        _write_once(os.path.join(output_dir, f'{filename}.gz'),
+                    gzip.compress(data, compresslevel=9, mtime=0))
+        manifest[name] = filename
+
+    _write_json(os.path.join(output_dir, 'manifest.json'), manifest)
+    logger.info(f"Built static bundles: {', '.join(manifest.values())}")
+    return manifest
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def _read_css(static_folder, source, seen):
+    """Reads a stylesheet with its @import rules inlined"""
+    path = os.path.normpath(os.path.join(static_folder, source))
+    if path in seen:
+        return ''
+    seen.add(path)
+
+    directory = os.path.dirname(source)
+
+    def inline(match):
+        target = match.group(1)
+        if '://' in target or target.startswith('//'):
+            return match.group(0)
+        return _read_css(static_folder, os.path.join(directory, target), seen)
+
+    return _IMPORT_RE.sub(inline, _read(path))
+
+
+def _write_once(path, data):
+    if os.path.exists(path):
+        return
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, value):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+# Characters after which a '/' starts a regular expression, not a division
+_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void')
+
+
+def minify_js(text):
+    """Removes comments and indentation, keeping line breaks.
+
+    Strings, template literals and regular expressions are copied as is.
+    Line breaks are kept so automatic semicolon insertion still works.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+
+    out = []
+    i = 0
+    length = len(text)
+
+    def last_significant():
+        return ''.join(out[-16:]).rstrip()
+
+    while i < length:
+        char = text[i]
+
+        if char in '\'"`':
+            end = _skip_quoted(text, i, char)
+            out.append(text[i:end])
+            i = end
+        elif char == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = length if end == -1 else end
+        elif char == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            out.append(' ')
+        elif char == '/' and _starts_regex(last_significant()):
+            end = _skip_regex(text, i)
+            out.append(text[i:end])
+            i = end
+        elif char.isspace():
+            end = i
+            while end < length and text[end].isspace():
+                end += 1
+            if out:
+                out.append('\n' if '\n' in text[i:end] else ' ')
+            i = end
+        else:
+            out.append(char)
+            i += 1
+
+    return re.sub(r'[ ]*\n[ \n]*', '\n', ''.join(out)).strip()
+
+
+def _starts_regex(previous):
+    if not previous:
+        return True
+    if previous[-1] in _REGEX_PREFIX:
+        return True
+    for keyword in _REGEX_KEYWORDS:
+        if not previous.endswith(keyword):
+            continue
+        before = previous[-len(keyword) - 1:-len(keyword)]
+        # `a_in`, `$return` or `x.in` end with an identifier or property, not a keyword
+        if not before or not (before.isalnum() or before in '_$.'):
+            return True
+    return False
+
+
+def _skip_quoted(text, start, quote):
+    i = start + 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return len(text)
+
+
+def _skip_regex(text, start):
+    i = start + 1
+    in_class = False
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            return i
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            while i < len(text) and text[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return len(text)
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process is assumed
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {'started': False, 'lock_fd': None, 'next_attempt': 0.0}
+
+
+def _reset_after_fork():
+    # Threads and the services they ran stay behind in the parent
+    global _lock
+    _lock = threading.Lock()
+    if _state['lock_fd'] is not None:
+        # The lock stays with the parent as long as it keeps its descriptor
+        os.close(_state['lock_fd'])
+    _state.update(started=False, lock_fd=None, next_attempt=0.0)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def init_background_services(app):
+    """Starts background services lazily, on the first request of a process.
+
+    create_app itself starts no threads, so the app can be created before
+    a fork (gunicorn --preload). Servers with a post-fork hook can call
+    start_background_services() right away instead.
+    """
+    if app.config['RUN_EXECUTOR'] != 'inline':
+        return
+
+    @app.before_request
+    def ensure_background_services():
+        if not _state['started']:
+            start_background_services(app)
+
+
+def start_background_services(app):
+    """Starts the services if this process is the designated one.
+
+    Among processes sharing BACKGROUND_SERVICES_LOCK only the holder of
+    the exclusive lock runs them; the others retry every
+    BACKGROUND_SERVICES_RETRY seconds in case the holder exits.
+    """
+    if app.config['RUN_EXECUTOR'] != 'inline':
+        return False
+
+    with _lock:
+        if _state['started']:
+            return True
+        now = time.monotonic()
+        if now < _state['next_attempt']:
+            return False
+        if not _acquire_lock(app):
+            _state['next_attempt'] = now + app.config['BACKGROUND_SERVICES_RETRY']
+            return False
+
+        from app.services.librelane_service import LibreLaneService
+        LibreLaneService.start_background_services(app)
+        _state['started'] = True
+
+    logger.info(f"Background services started in process {os.getpid()}")
+    return True
+
+
+def _acquire_lock(app):
+    if fcntl is None:
+        return True
+
+    path = app.config['BACKGROUND_SERVICES_LOCK'] \
+        or os.path.join(app.config['RUNS_FOLDER'], '.services.lock')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+
+    # Held until the process exits; the descriptor is not inherited by children
+    os.ftruncate(fd, 0)
+    os.write(fd, f'{os.getpid()}\n'.encode())
+    _state['lock_fd'] = fd
+    return True
@@ -0,0 +1,86 @@
+import gzip
+import zlib
+import logging
+
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ('gzip', 'deflate')
+
+
+def init_compression(app):
+    """Compresses JSON and text responses for clients that accept it.
+
+    Files served with send_file are passed through untouched, as are
+    responses that are already encoded or smaller than COMPRESS_MIN_SIZE.
+    """
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    level = app.config['COMPRESS_LEVEL']
+    mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(compress(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+        if response.get_etag()[0]:
+            # The representation differs from the uncompressed one
+            response.set_etag(response.get_etag()[0], weak=True)
+        return response
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_block(data, codec, level=None):
+    """Compresses a self-contained block of stored data"""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd requires the zstandard package")
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+    if codec == 'zlib':
+        return zlib.compress(data, level or 6)
+    raise ValueError(f"Unsupported codec: {codec}")
+
+
+def decompress_block(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unsupported codec: {codec}")
@@ -1,9 +1,13 @@
 from functools import wraps
 
-from flask import flash, redirect, url_for, session
+from flask import flash, redirect, url_for, session, g
+from sqlalchemy.orm import defer
 
-from app.models.session import Session
+from app import db
+
+from app.exceptions import RunLimitExceededError
 from app.models.run import Run, RunStatus
+from app.services.quota_service import QuotaService
 from app.services.run_service import RunService
 from app.services.auth_service import AuthService
 
@@ -15,25 +19,32 @@ def login_required(f):
             flash('Please log in first', 'error')
             return redirect(url_for('auth.email_login'))
         
-        session_obj = Session.query.get(session['session_id'])
-        if not session_obj or not session_obj.is_valid():
-            session.clear()
-            flash('Session expired, please log in again', 'error')
-            return redirect(url_for('auth.email_login'))
-        
+        # Nested decorators (e.g. run_ownership_required) check only once per request
+        if not g.get('login_checked'):
+            if not AuthService.check_login(session):
+                session.clear()
+                flash('Session expired, please log in again', 'error')
+                return redirect(url_for('auth.email_login'))
+            g.login_checked = True
+
         return f(*args, **kwargs)
     return decorated_function
 
 
-def no_active_run_required(f):
-    """Denies access if there is an active startup"""
+def run_quota_required(f):
+    """Denies access if the user cannot queue another run (see QuotaService)"""
     @wraps(f)
     @login_required
     def decorated_function(*args, **kwargs):
-        if RunService.has_active_run(session['session_id']):
-            active_run = RunService.get_active_run(session['session_id'])
-            flash('You already have an active run. Please wait for it to complete.', 'warning')
-            return redirect(url_for('website.status', run_id=active_run.id))
+        try:
+            QuotaService.check(session['email'])
+        except RunLimitExceededError as e:
+            flash(f'{e.message}. Please wait for your runs to complete.', 'warning')
+            run = RunService.get_active_run(session['email'], session['session_id']) \
+                or RunService.get_last_run(session['email'], session['session_id'])
+            if run is None:
+                return redirect(url_for('website.help'))
+            return redirect(url_for('website.status', run_id=run.id))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -43,7 +54,8 @@ def run_ownership_required(f):
     @wraps(f)
     @login_required
     def decorated_function(run_id, *args, **kwargs):
-        run = Run.query.get(run_id)
+        # The log is loaded only by the views that read it
+        run = db.session.get(Run, run_id, options=[defer(Run.log_content)])
         
         if not run or run.session_id != session['session_id']:
             flash('Run not found or access denied', 'error')
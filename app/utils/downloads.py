@@ -0,0 +1,53 @@
+import os
+import mimetypes
+
+from urllib.parse import quote
+
+from flask import current_app, send_file
+
+
+def send_run_file(path, download_name, as_attachment=True, mimetype=None, etag=True):
+    """Sends a file of RUNS_FOLDER, directly or through the front proxy.
+
+    Served from Python, send_file answers Range and If-Range requests;
+    etag may be a precomputed value that stays the same as long as the
+    file content does. With DOWNLOAD_OFFLOAD the response only carries
+    X-Accel-Redirect / X-Sendfile and the proxy transfers the bytes
+    (including ranges) itself, so the access checks stay in the app.
+    """
+    mode = current_app.config['DOWNLOAD_OFFLOAD']
+    if not mode:
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            max_age=0
+        )
+        # Advertised on full responses too, so clients know they can resume
+        response.headers.setdefault('Accept-Ranges', 'bytes')
+        return response
+
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers.set(
+        'Content-Disposition',
+        'attachment' if as_attachment else 'inline',
+        filename=download_name
+    )
+    if isinstance(etag, str):
+        response.set_etag(etag)
+
+    if mode == 'x-accel-redirect':
+        runs_folder = os.path.realpath(current_app.config['RUNS_FOLDER'])
+        relative = os.path.relpath(os.path.realpath(path), runs_folder).replace(os.sep, '/')
+        prefix = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = quote(f'{prefix}/{relative}')
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = os.path.realpath(path)
+    else:
+        raise ValueError(f"Unknown DOWNLOAD_OFFLOAD mode: {mode}")
+    return response
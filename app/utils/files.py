@@ -0,0 +1,16 @@
+import os
+import shutil
+
+
+def link_or_copy(source, destination):
+    """Hard-links a file, copying it when the filesystem does not allow links.
+
+    Run directories only read their inputs, so sharing one inode between
+    runs is safe and costs no space.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
@@ -0,0 +1,240 @@
+import bisect
+import threading
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    """Base metric with per-thread shards.
+
+    Every thread writes only into its own shard, so updates on the hot path
+    take no lock. The lock is taken once per thread (shard creation) and on
+    scrape, where the shards are merged.
+    """
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) pairs
+        self._retired = {}  # merged shards of finished threads
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead_shards(self):
+        """Folds shards of finished threads so short-lived threads don't accumulate"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = alive
+
+    def collect(self):
+        totals = {}
+        with self._lock:
+            self._merge(totals, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            self._merge(totals, shard)
+        return totals
+
+    def _merge(self, totals, shard):
+        raise NotImplementedError
+
+    def _format_labels(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+    def _header(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    type_name = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, totals, shard):
+        for labels, value in list(shard.items()):
+            totals[labels] = totals.get(labels, 0) + value
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{self._format_labels(labels)} {value}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self._callback = callback
+
+    def render(self):
+        try:
+            value = self._callback()
+        except Exception:
+            return []
+        return self._header() + [f'{self.name} {value}']
+
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [bucket counts..., +Inf count, sum]
+            state = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = state
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merge(self, totals, shard):
+        for labels, state in list(shard.items()):
+            merged = totals.get(labels)
+            if merged is None:
+                totals[labels] = list(state)
+            else:
+                for i, value in enumerate(state):
+                    merged[i] += value
+
+    def render(self):
+        lines = self._header()
+        for labels, state in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(
+                    f'{self.name}_bucket{self._format_labels(labels, ("le", le))} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{self._format_labels(labels)} {state[-1]}')
+            lines.append(f'{self.name}_count{self._format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Registry of application metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback):
+        return self._register(Gauge(name, documentation, callback))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Runs
+RUN_STAGE_DURATION = registry.histogram(
+    'librelane_stage_duration_seconds',
+    'Duration of LibreLane run stages',
+    labelnames=('stage',),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+RUN_DURATION = registry.histogram(
+    'librelane_run_duration_seconds',
+    'Duration of LibreLane runs by final status',
+    labelnames=('status',),
+    buckets=(10, 30, 60, 300, 600, 1800, 3600, 7200, 14400),
+)
+
+# Logs
+LOG_LINES = registry.counter(
+    'librelane_log_lines_total',
+    'Log lines ingested from runs',
+)
+LOG_BYTES = registry.counter(
+    'librelane_log_bytes_total',
+    'Log bytes ingested from runs',
+)
+
+# Database
+DB_COMMIT_LATENCY = registry.histogram(
+    'db_commit_duration_seconds',
+    'Latency of database commits in RunService',
+    labelnames=('operation',),
+)
+
+# Uploads
+UPLOAD_SIZE = registry.histogram(
+    'upload_size_bytes',
+    'Total size of uploaded project files',
+    buckets=(1024, 10240, 102400, 1048576, 5242880, 10485760, 52428800, 104857600),
+)
+VALIDATION_DURATION = registry.histogram(
+    'upload_validation_duration_seconds',
+    'Time spent validating uploaded files',
+)
+
+# HTTP
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds',
+    'Request latency per endpoint',
+    labelnames=('endpoint', 'method', 'status'),
+)
@@ -0,0 +1,21 @@
+import json
+import base64
+import binascii
+
+from datetime import datetime
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for keyset pagination on (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, ValueError if it was not made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
@@ -0,0 +1,140 @@
+import io
+import os
+import time
+import random
+import pstats
+import cProfile
+import logging
+
+from datetime import datetime
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+slow_logger = logging.getLogger('app.slow_requests')
+
+
+def init_profiling(app):
+    """Enables per-request instrumentation.
+
+    Nothing is registered unless PROFILING_ENABLED is set, so a disabled
+    profiler costs nothing on the request path.
+    """
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    threshold = app.config['SLOW_REQUEST_THRESHOLD']
+    sample_rate = app.config['PROFILING_SAMPLE_RATE']
+    profiles_dir = app.config['PROFILING_DIR']
+
+    _setup_slow_log(app)
+    if sample_rate > 0:
+        os.makedirs(profiles_dir, exist_ok=True)
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_profiling():
+        g.profile_started = time.perf_counter()
+        g.profile_queries = []
+        g.profiler = None
+        if sample_rate > 0 and random.random() < sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_profiling(response):
+        started = g.pop('profile_started', None)
+        if started is None:
+            return response
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        elapsed = time.perf_counter() - started
+        queries = g.pop('profile_queries', [])
+        sql_time = sum(duration for _, duration in queries)
+        size = response.calculate_content_length()
+
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, sql;dur={sql_time * 1000:.1f}'
+        )
+        logger.debug(
+            f"{request.method} {request.path} {response.status_code} "
+            f"time={elapsed * 1000:.1f}ms queries={len(queries)} "
+            f"sql={sql_time * 1000:.1f}ms size={size}"
+        )
+
+        if elapsed >= threshold:
+            _log_slow_request(response, elapsed, queries, sql_time, size)
+
+        if profiler is not None:
+            _dump_profile(profiler, profiles_dir, elapsed)
+
+        return response
+
+
+def _setup_slow_log(app):
+    if slow_logger.handlers:
+        return
+    try:
+        log_folder = app.config['LOG_FOLDER']
+        os.makedirs(log_folder, exist_ok=True)
+        handler = logging.FileHandler(os.path.join(log_folder, 'slow_requests.log'))
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_logger.addHandler(handler)
+    except Exception as e:
+        logger.error(f"Failed to setup slow request log: {str(e)}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    queries = g.get('profile_queries')
+    if queries is not None:
+        queries.append((statement, duration))
+
+
+def _log_slow_request(response, elapsed, queries, sql_time, size):
+    lines = [
+        f"SLOW {request.method} {request.full_path} -> {response.status_code} "
+        f"time={elapsed * 1000:.1f}ms queries={len(queries)} "
+        f"sql={sql_time * 1000:.1f}ms size={size}"
+    ]
+    for statement, duration in queries:
+        lines.append(f"    [{duration * 1000:.1f}ms] {' '.join(statement.split())}")
+    slow_logger.warning('\n'.join(lines))
+
+
+def _dump_profile(profiler, profiles_dir, elapsed):
+    """Writes the raw profile and a readable summary next to it"""
+    endpoint = (request.endpoint or 'unknown').replace('.', '_')
+    timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    base_path = os.path.join(profiles_dir, f'{timestamp}_{endpoint}_{elapsed * 1000:.0f}ms')
+
+    try:
+        profiler.dump_stats(f'{base_path}.prof')
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(30)
+        with open(f'{base_path}.txt', 'w') as f:
+            f.write(f"{request.method} {request.full_path}\n")
+            f.write(summary.getvalue())
+    except Exception as e:
+        logger.error(f"Failed to write profile {base_path}: {str(e)}")
@@ -0,0 +1,215 @@
+import os
+import re
+import math
+import time
+import sqlite3
+import logging
+import threading
+
+from flask import request, session
+from werkzeug.exceptions import TooManyRequests
+
+from app.utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = registry.counter(
+    'http_rate_limited_total',
+    'Requests rejected by the rate limiter',
+    labelnames=('endpoint',),
+)
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_RATE = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(second|minute|hour|day)s?\s*$', re.IGNORECASE)
+
+
+def parse_rate(value):
+    """'100 per hour' or '100/hour' -> (capacity, tokens per second); None/'' -> None"""
+    if not value:
+        return None
+    match = _RATE.match(value)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {value!r}, expected e.g. '100 per hour'")
+    count = int(match.group(1))
+    return count, count / _PERIODS[match.group(2).lower()]
+
+
+class MemoryBackend:
+    """Token buckets in a dict of the current process.
+
+    Each gunicorn worker keeps its own buckets, so the effective limit is
+    multiplied by the number of workers.
+    """
+
+    MAX_KEYS = 100000
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Takes one token, returns 0 or the seconds until one is available"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._evict(now)
+                self._buckets[key] = [capacity - 1.0, now, capacity, rate]
+                return 0.0
+
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0.0
+            bucket[0] = tokens
+            return (1.0 - tokens) / rate
+
+    def _evict(self, now):
+        # Refilled buckets carry no state worth keeping
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]
+        }
+        if len(self._buckets) >= self.MAX_KEYS:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Token buckets shared by all processes of a host through one SQLite file.
+
+    Placed on /dev/shm by default, the file lives in shared memory; every
+    check is a single short write transaction.
+    """
+
+    CLEANUP_EVERY = 10000
+    clock = staticmethod(time.time)  # shared between processes
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._operations = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self._connect()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS bucket '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)'
+        )
+        connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        return connection
+
+    def _connection(self):
+        # Connections are per thread and must not cross a fork
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.connection = self._connect()
+            self._local.pid = pid
+        return self._local.connection
+
+    def take(self, key, capacity, rate, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / rate
+            connection.execute(
+                'INSERT OR REPLACE INTO bucket (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._operations += 1
+        if self._operations % self.CLEANUP_EVERY == 0:
+            connection.execute('DELETE FROM bucket WHERE full_at < ?', (now,))
+        return wait
+
+
+class RateLimiter:
+    """Per-endpoint token buckets keyed by session, or by IP for anonymous clients"""
+
+    def __init__(self, backend, default=None, limits=None, blueprints=('api',)):
+        self.backend = backend
+        self.default = parse_rate(default)
+        self.overrides = {endpoint: parse_rate(value) for endpoint, value in (limits or {}).items()}
+        self.blueprints = set(blueprints)
+        self._limits = {}
+
+    def limit_for(self, endpoint):
+        """(capacity, rate) of an endpoint, None if it is not limited"""
+        try:
+            return self._limits[endpoint]
+        except KeyError:
+            pass
+        if endpoint in self.overrides:
+            limit = self.overrides[endpoint]
+        elif endpoint and endpoint.split('.', 1)[0] in self.blueprints:
+            limit = self.default
+        else:
+            limit = None
+        self._limits[endpoint] = limit
+        return limit
+
+    def check(self, endpoint, client):
+        """Seconds to wait before the client may call the endpoint again, 0 if allowed"""
+        limit = self.limit_for(endpoint)
+        if limit is None:
+            return 0.0
+        return self.backend.take(f'{endpoint}|{client}', limit[0], limit[1], self.backend.clock())
+
+
+def create_backend(app):
+    storage = app.config['RATE_LIMIT_STORAGE']
+    if storage == 'memory':
+        return MemoryBackend()
+    if storage == 'sqlite':
+        path = app.config['RATE_LIMIT_SQLITE_PATH']
+        if not path:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else app.config['RUNS_FOLDER']
+            path = os.path.join(directory, f"{app.config['APP_NAME'].lower().replace(' ', '_')}_rate_limit.sqlite")
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown RATE_LIMIT_STORAGE: {storage}")
+
+
+def init_rate_limit(app):
+    """Rejects requests over API_RATE_LIMIT / RATE_LIMITS with 429 and Retry-After.
+
+    The check is a dict lookup and a few float operations per request with
+    the default in-memory backend.
+    """
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return
+
+    limiter = RateLimiter(
+        create_backend(app),
+        default=app.config['API_RATE_LIMIT'],
+        limits=app.config['RATE_LIMITS']
+    )
+    app.extensions['rate_limiter'] = limiter
+
+    @app.before_request
+    def check_rate_limit():
+        endpoint = request.endpoint
+        if limiter.limit_for(endpoint) is None:
+            return
+
+        session_id = session.get('session_id')
+        client = f's{session_id}' if session_id is not None else request.remote_addr
+        wait = limiter.check(endpoint, client)
+        if wait:
+            RATE_LIMITED.inc(endpoint)
+            raise TooManyRequests(retry_after=max(1, math.ceil(wait)))
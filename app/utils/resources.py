@@ -0,0 +1,180 @@
+import os
+import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, None where it can't be read"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_group_rss_mb(pgid):
+    """Resident memory of all processes in a process group"""
+    total_pages = 0
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    try:
+        pids = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return None
+
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, fields start after ')'
+        fields = stat[stat.rfind(')') + 2:].split()
+        if int(fields[2]) == pgid:
+            total_pages += int(fields[21])
+    return total_pages * page_size // (1024 * 1024)
+
+
+def parse_cpu_list(value):
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+class CgroupLimiter:
+    """Per-run cgroup v2 under a delegated parent directory.
+
+    The memory (and, where available, cpu) controllers are enabled for the
+    parent's children when the limiter is detected. A run's cgroup gets its
+    limits before the run starts, and the run enters it before exec (see
+    wrap_command), so no part of it ever runs unlimited.
+    """
+
+    def __init__(self, parent, controllers):
+        self.parent = parent
+        self.controllers = controllers
+
+    @classmethod
+    def detect(cls, parent):
+        """A limiter for `parent`, None if cgroup v2 limits cannot be used there"""
+        if not parent:
+            return None
+        if not os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers')):
+            logger.error(f"RUN_CGROUP_PARENT is set but {CGROUP_ROOT} is not a cgroup v2 hierarchy")
+            return None
+        try:
+            os.makedirs(parent, exist_ok=True)
+            with open(os.path.join(parent, 'cgroup.controllers')) as f:
+                available = f.read().split()
+        except OSError as e:
+            logger.error(f"cgroup v2 parent {parent} is not usable: {str(e)}")
+            return None
+        if 'memory' not in available:
+            logger.error(f"The memory controller is not delegated to {parent}")
+            return None
+
+        controllers = [name for name in ('memory', 'cpu') if name in available]
+        try:
+            # Child cgroups only get memory.max/cpu.max with the controllers enabled here
+            with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as f:
+                f.write(' '.join(f'+{name}' for name in controllers))
+        except OSError as e:
+            # EBUSY: the parent itself holds processes ("no internal processes" rule)
+            logger.error(f"Failed to enable {controllers} in {parent}/cgroup.subtree_control: {str(e)}")
+            return None
+        return cls(parent, controllers)
+
+    def path(self, run_id):
+        return os.path.join(self.parent, f'run_{run_id}')
+
+    def prepare(self, run_id, memory_mb=None, cpus=None):
+        """Creates the run's cgroup with its limits; OSError if a limit cannot be set"""
+        path = self.path(run_id)
+        os.makedirs(path, exist_ok=True)
+        if memory_mb:
+            self._write(path, 'memory.max', str(memory_mb * 1024 * 1024))
+            if os.path.exists(os.path.join(path, 'memory.swap.max')):
+                self._write(path, 'memory.swap.max', '0')
+        if cpus and 'cpu' in self.controllers:
+            self._write(path, 'cpu.max', f'{len(cpus) * 100000} 100000')
+        return path
+
+    def wrap_command(self, run_id, cmd):
+        """`cmd` run by a shell that moves itself into the run's cgroup before exec.
+
+        Unlike a preexec_fn this is safe in a multithreaded parent; if the
+        cgroup cannot be joined the command is not started at all.
+        """
+        return ['/bin/sh', '-c', 'echo 0 > "$0/cgroup.procs" && exec "$@"', self.path(run_id)] + list(cmd)
+
+    def peak_memory_mb(self, run_id):
+        try:
+            with open(os.path.join(self.path(run_id), 'memory.peak')) as f:
+                return int(f.read()) // (1024 * 1024)
+        except (OSError, ValueError):
+            return None
+
+    def release(self, run_id):
+        try:
+            os.rmdir(self.path(run_id))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _write(path, name, value):
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(value)
+
+
+def apply_process_limits(pid, memory_mb=None, nice=None, cpus=None):
+    """Applies rlimits, nice level and CPU affinity to a freshly started process.
+
+    Limits are set from the parent right after the spawn instead of in a
+    preexec_fn, which is not safe in a multithreaded process. Child tools
+    started later by LibreLane inherit them.
+    """
+    applied = {}
+
+    if memory_mb and resource is not None and hasattr(resource, 'prlimit'):
+        limit = memory_mb * 1024 * 1024
+        try:
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            applied['address_space_mb'] = memory_mb
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to set RLIMIT_AS for {pid}: {str(e)}")
+
+    if nice is not None and hasattr(os, 'setpriority'):
+        try:
+            os.setpriority(os.PRIO_PGRP, pid, nice)
+            applied['nice'] = nice
+        except OSError as e:
+            logger.warning(f"Failed to renice {pid}: {str(e)}")
+
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(pid, cpus)
+            applied['cpus'] = sorted(cpus)
+        except OSError as e:
+            logger.warning(f"Failed to set CPU affinity for {pid}: {str(e)}")
+
+    return applied
@@ -0,0 +1,49 @@
+from flask import Response, jsonify, request
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def parse_fields(allowed):
+    """Reads the `fields=` query parameter.
+
+    Returns None when all fields are requested, raises ValueError
+    listing the unknown names otherwise.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None
+
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def wants_msgpack():
+    if request.args.get('format') == 'msgpack':
+        return True
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+def api_response(data, status=200):
+    """JSON response, or MessagePack when the client asks for it"""
+    if not wants_msgpack():
+        response = jsonify(data)
+        response.status_code = status
+    elif msgpack is None:
+        response = jsonify({'error': 'MessagePack encoding is not available'})
+        response.status_code = 406
+    else:
+        response = Response(msgpack.packb(data, use_bin_type=True), status=status,
+                            mimetype=MSGPACK_MIMETYPE)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,137 @@
+"""Payload size and serialization time of the polling API endpoints.
+
+Usage: python benchmarks/api_payloads.py [--log-lines N] [--repeat N]
+
+Creates a throwaway database with one finished run and measures the
+status and logs endpoints as JSON, with ?fields=, as MessagePack and
+with gzip/deflate compression.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix='bench_api_')
+os.environ.setdefault('FLASK_CONFIG', 'development')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ['RUNS_FOLDER'] = os.path.join(WORK_DIR, 'runs')
+os.environ['RUN_EXECUTOR'] = 'external'
+os.environ['PROFILING_ENABLED'] = 'False'
+
+import logging  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models.run import Run, RunStage, RunStatus  # noqa: E402
+from app.services.auth_service import AuthService  # noqa: E402
+from app.utils import serialization  # noqa: E402
+
+
+CASES = [
+    # (endpoint, query string, Accept-Encoding)
+    ('status', '', None),
+    ('status', '', 'gzip'),
+    ('status', '?fields=status,progress,current_stage', None),
+    ('status', '?format=msgpack', None),
+    ('logs', '', None),
+    ('logs', '', 'gzip'),
+    ('logs', '', 'deflate'),
+    ('logs', '?fields=status', None),
+    ('logs', '?format=msgpack', None),
+    ('logs', '?format=msgpack', 'gzip'),
+]
+
+
+def create_run(log_lines):
+    session = AuthService.create_session('bench@example.com')
+    started = datetime.utcnow() - timedelta(minutes=15)
+    stages = [stage.value for stage in RunStage if stage not in (RunStage.NONE, RunStage.FINISHED)]
+    log = '\n'.join(
+        f"[{(started + timedelta(seconds=i)).strftime('%H:%M:%S')}] "
+        f"[{stages[i % len(stages)].upper()}] step {i}: checking net n{i * 7 % 9973} slack=0.{i % 1000:03d}ns"
+        for i in range(log_lines)
+    )
+    run = Run(
+        email=session.email,
+        session_id=session.id,
+        status=RunStatus.COMPLETED,
+        current_stage=RunStage.FINISHED,
+        progress=100,
+        start_time=started,
+        end_time=datetime.utcnow(),
+        log_content=log
+    )
+    run.completed_stages_list = stages
+    db.session.add(run)
+    db.session.commit()
+    return session.token, run.id
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log-lines', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+    client = app.test_client()
+
+    with app.app_context():
+        db.create_all()
+        token, run_id = create_run(args.log_lines)
+    client.get(f'/login/{token}')
+
+    print(f"{args.log_lines} log lines, median of {args.repeat} requests, "
+          f"msgpack {'available' if serialization.msgpack else 'not installed'}\n")
+    print(f"{'endpoint':<10} {'query':<38} {'encoding':<9} {'bytes':>10} {'request ms':>11}")
+
+    for endpoint, query, encoding in CASES:
+        headers = {'Accept-Encoding': encoding or 'identity'}
+        url = f'/api/{run_id}/{endpoint}{query}'
+        response, elapsed = measure(lambda: client.get(url, headers=headers), args.repeat)
+        size = len(response.get_data()) if response.status_code == 200 else f'HTTP {response.status_code}'
+        print(f"{endpoint:<10} {query or '-':<38} {encoding or '-':<9} {size:>10} {elapsed:>11.2f}")
+
+    print(f"\n{'serialization only':<40} {'ms':>8}")
+    with app.app_context():
+        run = db.session.get(Run, run_id)
+        status_fields = [name for name in Run.DICT_FIELDS if name != 'log_content']
+        serializers = [
+            ('status to_dict + json', lambda: json.dumps(run.to_dict(status_fields))),
+            ('status fields=3 + json',
+             lambda: json.dumps(run.to_dict(['status', 'progress', 'current_stage']))),
+            ('logs to_dict + json', lambda: json.dumps(run.to_dict(['id', 'status', 'log_content']))),
+        ]
+        if serialization.msgpack:
+            serializers.append((
+                'logs to_dict + msgpack',
+                lambda: serialization.msgpack.packb(run.to_dict(['id', 'status', 'log_content']))
+            ))
+        for name, func in serializers:
+            _, elapsed = measure(func, args.repeat)
+            print(f"{name:<40} {elapsed:>8.3f}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
@@ -0,0 +1,65 @@
+"""Per-request cost of the rate limiter.
+
+Usage: python benchmarks/rate_limit.py [--requests N] [--clients N]
+
+Times the before_request hook inside a request context, for the
+in-memory and the SQLite backend, with buckets that never run out.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix='bench_rate_limit_')
+os.environ.setdefault('FLASK_CONFIG', 'development')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+os.environ['RUNS_FOLDER'] = os.path.join(WORK_DIR, 'runs')
+os.environ['RUN_EXECUTOR'] = 'external'
+
+import logging  # noqa: E402
+
+from app import create_app  # noqa: E402
+
+
+def measure(storage, requests, clients):
+    app = create_app()
+    app.config.update(RATE_LIMIT_STORAGE=storage, RATE_LIMIT_SQLITE_PATH=os.path.join(WORK_DIR, 'rl.sqlite'))
+    app.before_request_funcs[None] = [
+        func for func in app.before_request_funcs[None] if func.__name__ != 'check_rate_limit'
+    ]
+    from app.utils.rate_limit import init_rate_limit
+    app.config['RATE_LIMITS'] = {'api.status': f'{requests * 10} per second'}
+    init_rate_limit(app)
+    hook = app.before_request_funcs[None][-1]
+
+    timings = []
+    for client in range(clients):
+        with app.test_request_context('/api/1/status', environ_base={'REMOTE_ADDR': f'10.0.{client // 256}.{client % 256}'}):
+            started = time.perf_counter()
+            for _ in range(requests // clients):
+                hook()
+            timings.append((time.perf_counter() - started) / (requests // clients))
+    return sum(timings) / len(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    try:
+        for storage in ('memory', 'sqlite'):
+            print(f"{storage:<8} {measure(storage, args.requests, args.clients):8.2f} us per request")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
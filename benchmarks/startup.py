@@ -0,0 +1,107 @@
+"""Cold start of a web process: imports, create_app and the first request.
+
+Usage: python benchmarks/startup.py [--repeat N] [--top N]
+
+Every sample runs in a fresh interpreter, as a gunicorn worker without
+--preload would. It also reports the threads alive after create_app,
+which must be only the main thread for the app to be safe to fork.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = r'''
+import os, sys, json, time, threading
+started = time.perf_counter()
+import app
+from app import create_app
+imported = time.perf_counter()
+application = create_app()
+created = time.perf_counter()
+threads_after_create = threading.active_count()
+client = application.test_client()
+response = client.get(sys.argv[1])
+first_request = time.perf_counter()
+client.get(sys.argv[1])
+second_request = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': first_request - created,
+    'second_request': second_request - first_request,
+    'status': response.status_code,
+    'threads_after_create': threads_after_create,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def run_sample(env, path):
+    output = subprocess.run(
+        [sys.executable, '-c', SAMPLE, path],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(env, count):
+    """Slowest modules by cumulative import time (python -X importtime)"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--path', default='/', help='URL of the first request')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(
+        os.environ,
+        FLASK_CONFIG='production',
+        SECRET_KEY='bench',
+        DATABASE_URL=f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        RUNS_FOLDER=os.path.join(work_dir, 'runs'),
+        LOG_FOLDER=os.path.join(work_dir, 'logs'),
+        PROFILING_ENABLED='False'
+    )
+    try:
+        samples = [run_sample(env, args.path) for _ in range(args.repeat)]
+
+        print(f"{'phase':<16} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+        for phase in ('import', 'create_app', 'first_request', 'second_request'):
+            values = [sample[phase] * 1000 for sample in samples]
+            print(f"{phase:<16} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+
+        last = samples[-1]
+        print(f"\nfirst request status {last['status']}, {last['modules']} modules loaded, "
+              f"{last['threads_after_create']} thread(s) alive after create_app")
+
+        if args.top:
+            print(f"\nslowest imports (cumulative ms):")
+            for cumulative, name in top_imports(env, args.top):
+                print(f"{cumulative / 1000:>8.1f}  {name}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""One-off migration: compresses the logs of finished runs.
+
+Usage: python compress_logs.py [--batch 100] [--vacuum]
+
+Indexes log lines where missing and moves the log text of every finished
+run into compressed RunLogBlock rows. Run init_db.py first so older
+databases have the run_log_block table and the run.log_compressed
+column. Safe to run repeatedly.
+"""
+import sys
+import argparse
+
+sys.path.insert(0, '.')
+
+from sqlalchemy import select, text
+
+from run import app, db
+from app.models.run import Run, RunStatus
+from app.services.log_service import LogService
+
+FINISHED = (RunStatus.COMPLETED, RunStatus.FAILED, RunStatus.CANCELLED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--vacuum', action='store_true', help='reclaim space (SQLite)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        compressed = raw_bytes = 0
+        last_id = 0
+        while True:
+            run_ids = db.session.execute(
+                select(Run.id)
+                .where(Run.id > last_id, Run.status.in_(FINISHED), Run.log_compressed.is_(False))
+                .order_by(Run.id)
+                .limit(args.batch)
+            ).scalars().all()
+            if not run_ids:
+                break
+
+            for run_id in run_ids:
+                run = db.session.get(Run, run_id)
+                raw_bytes += len((run.log_content or '').encode('utf-8'))
+                if not LogService.is_indexed(run):
+                    LogService.index_appended(run, run.log_length)
+                LogService.compress(run)
+                db.session.commit()
+                compressed += 1
+            last_id = run_ids[-1]
+            db.session.expunge_all()
+            print(f"Compressed {compressed} runs")
+
+        print(f"Done: {compressed} runs, {raw_bytes / (1024 * 1024):.1f} MB of raw log text compressed")
+
+        if args.vacuum and db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as connection:
+                connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+            print("Database vacuumed")
+
+
+if __name__ == '__main__':
+    main()
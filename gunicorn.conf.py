@@ -0,0 +1,28 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+The application is imported once in the master (preload_app) and the
+workers are forked from it, sharing the imported code. Background
+services start after the fork, in the one worker that takes their lock.
+"""
+import os
+
+
+bind = f"{os.environ.get('FLASK_HOST', '0.0.0.0')}:{os.environ.get('FLASK_PORT', '5000')}"
+wsgi_app = 'wsgi:app'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from app import db
+    from app.utils.background import start_background_services
+    from wsgi import app
+
+    # Connections opened in the master must not be shared between workers
+    with app.app_context():
+        db.engine.dispose()
+
+    if start_background_services(app):
+        server.log.info(f"Worker {worker.pid} runs the background services")
@@ -1,10 +1,54 @@
 import sys
 sys.path.insert(0, '.')
 
+from sqlalchemy import inspect, literal, text
+
 from run import app, db
 import os
 
+
+def add_missing_columns():
+    """Brings tables created by older versions up to the current models.
+
+    db.create_all() creates missing tables but never alters existing ones,
+    so columns and indexes added to a model since (priority, resource
+    limits, leases, sweeps, checkpoints, log compression, ...) are added
+    here. Only additive changes are handled: a column whose type or
+    constraints changed needs its table recreated.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        with db.engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in columns:
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column)}'))
+                    print(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    print(f"Added index {index.name}")
+
+
+def _column_ddl(column):
+    dialect = db.engine.dialect
+    ddl = f'{column.name} {column.type.compile(dialect=dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is None:
+        # Existing rows get NULL; NOT NULL without a default cannot be added to them
+        return ddl
+    default = literal(default, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+    ddl += f' DEFAULT {default}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    return ddl
+
+
 with app.app_context():
     db.create_all()
+    add_missing_columns()
     print("Database initialized")
-
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+# Read by app.config at import time
+os.environ['FLASK_CONFIG'] = 'testing'
+os.environ['RUN_EXECUTOR'] = 'external'
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config.update(RUNS_FOLDER=str(tmp_path / 'runs'))
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def app_context(app):
+    """Application context for tests calling services directly; requests push their own"""
+    with app.app_context():
+        yield
+        db.session.remove()
@@ -0,0 +1,103 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from app.utils.archives import ArchiveError, extract_tar, member_path
+
+LIMITS = dict(
+    allowed_extensions={'.v', '.json'},
+    max_members=100,
+    max_member_size=64 * 1024 * 1024,
+    max_total_size=128 * 1024 * 1024,
+    max_ratio=200,
+)
+
+
+def file_member(name, data=b'module top; endmodule\n'):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    return info, data
+
+
+def link_member(name, target, kind=tarfile.SYMTYPE):
+    info = tarfile.TarInfo(name)
+    info.type = kind
+    info.linkname = target
+    return info, None
+
+
+def make_tar(tmp_path, members, mode='w:gz'):
+    path = tmp_path / 'design.tar.gz'
+    with tarfile.open(path, mode) as archive:
+        for info, data in members:
+            archive.addfile(info, io.BytesIO(data) if data is not None else None)
+    return str(path)
+
+
+def extract(tmp_path, members, **limits):
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    return extract_tar(make_tar(tmp_path, members), str(destination), **{**LIMITS, **limits})
+
+
+def test_extracts_regular_files(tmp_path):
+    extracted, skipped = extract(tmp_path, [
+        file_member('./src/top.v'),
+        file_member('config.json', b'{}'),
+        file_member('README.md', b'# top'),
+    ])
+
+    assert extracted == ['src/top.v', 'config.json']
+    assert skipped == ['README.md']
+    assert (tmp_path / 'out' / 'src' / 'top.v').read_bytes() == b'module top; endmodule\n'
+
+
+@pytest.mark.parametrize('name', ['../top.v', 'src/../../top.v', '..\\top.v'])
+def test_parent_directory_is_rejected(tmp_path, name):
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [file_member(name)])
+    assert not (tmp_path / 'top.v').exists()
+
+
+@pytest.mark.parametrize('name', ['/tmp/top.v', 'C:/top.v', '\\top.v'])
+def test_absolute_path_is_rejected(tmp_path, name):
+    with pytest.raises(ArchiveError):
+        member_path(name)
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [file_member(name)])
+
+
+@pytest.mark.parametrize('kind', [tarfile.SYMTYPE, tarfile.LNKTYPE])
+def test_links_are_rejected(tmp_path, kind):
+    # A link followed by a file written through it would leave the destination
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [link_member('src', '/tmp', kind), file_member('src/top.v')])
+
+
+def test_duplicate_entry_is_rejected(tmp_path):
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [file_member('top.v'), file_member('./top.v', b'module evil; endmodule\n')])
+    assert (tmp_path / 'out' / 'top.v').read_bytes() == b'module top; endmodule\n'
+
+
+def test_decompression_bomb_is_rejected(tmp_path):
+    data = b'\0' * (16 * 1024 * 1024)
+    path = make_tar(tmp_path, [file_member('top.v', data)])
+    assert os.path.getsize(path) * LIMITS['max_ratio'] < len(data)
+
+    destination = tmp_path / 'out'
+    destination.mkdir()
+    with pytest.raises(ArchiveError):
+        extract_tar(path, str(destination), **LIMITS)
+    assert os.path.getsize(destination / 'top.v') < len(data)
+
+
+def test_size_and_member_limits(tmp_path):
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [file_member('top.v', b'x' * 1025)], max_member_size=1024)
+
+    (tmp_path / 'out').rename(tmp_path / 'first')
+    with pytest.raises(ArchiveError):
+        extract(tmp_path, [file_member(f'{n}.v') for n in range(3)], max_members=2)
@@ -0,0 +1,65 @@
+import pytest
+
+from app import db
+from app.models.session import Session
+from app.services.auth_service import AuthService
+from tests.utils import login
+
+
+@pytest.fixture(autouse=True)
+def claims(app):
+    app.config.update(SESSION_CLAIMS=True, SESSION_DENYLIST_REFRESH=0)
+    AuthService._revoked = {}
+    AuthService._revoked_cursor = 0
+    AuthService._revoked_refreshed = None
+
+
+def is_logged_in(client):
+    return client.get('/api/runs/summary').status_code == 200
+
+
+def test_relogin_is_accepted(app):
+    first = login(app, 'a@example.com')
+    assert is_logged_in(first)
+
+    second = login(app, 'a@example.com')
+    assert is_logged_in(second)
+    # The new login replaced the previous session
+    assert not is_logged_in(first)
+
+
+def test_login_after_logout(app):
+    first = login(app, 'a@example.com')
+    with first.session_transaction() as flask_session:
+        stale_cookie = dict(flask_session)
+    first.get('/logout')
+    assert not is_logged_in(first)
+
+    other = login(app, 'b@example.com')
+    assert is_logged_in(other)
+
+    again = login(app, 'a@example.com')
+    assert is_logged_in(again)
+
+    # The cookie from before the logout stays revoked
+    with first.session_transaction() as flask_session:
+        flask_session.update(stale_cookie)
+    assert not is_logged_in(first)
+
+
+def test_reused_session_id_does_not_match_old_cookie(app, app_context):
+    """Cookies without claims are checked against the row they were issued for"""
+    app.config['SESSION_CLAIMS'] = False
+    first = login(app, 'a@example.com')
+    with first.session_transaction() as flask_session:
+        session_id = flask_session['session_id']
+
+    # Another user's session ends up with the same id (e.g. SQLite without AUTOINCREMENT)
+    db.session.delete(db.session.get(Session, session_id))
+    db.session.flush()
+    reused = Session('b@example.com')
+    reused.id = session_id
+    db.session.add(reused)
+    db.session.commit()
+
+    assert not is_logged_in(first)
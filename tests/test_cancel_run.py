@@ -0,0 +1,50 @@
+from app import db
+from app.models.run import Run, RunStatus
+from app.services.librelane_service import LibreLaneService, _ActiveRun
+from app.services.log_service import LogService
+from app.services.run_service import RunService
+
+
+def get_run(run_id):
+    return db.session.get(Run, run_id, populate_existing=True)
+
+
+def test_cancelling_active_run_leaves_status_and_log_to_worker(app, app_context):
+    app.config['LOG_COMPRESSION'] = 'zlib'
+    run = RunService.create_run(None, 'user@example.com')
+    db.session.commit()
+    RunService.claim_run(run.id, 'test-worker', 60)
+    RunService.update_run_logs(run.id, log_content='Running synthesis\n')
+    active = _ActiveRun(run.id)
+    LibreLaneService._active_runs[run.id] = active
+    try:
+        assert LibreLaneService.cancel_run(run.id)
+
+        # The worker is still appending output until it stops
+        assert active.stop_reason == 'cancelled'
+        assert get_run(run.id).status == RunStatus.RUNNING
+        RunService.update_run_logs(run.id, log_content='Last output line\n')
+        assert not get_run(run.id).log_compressed
+
+        LibreLaneService._finish_run(active, succeeded=False)
+    finally:
+        LibreLaneService._active_runs.pop(run.id, None)
+
+    run = get_run(run.id)
+    assert run.status == RunStatus.CANCELLED
+    assert run.log_compressed
+    texts = [line['text'] for line in LogService.query_lines(run)['lines']]
+    assert any('Last output line' in text for text in texts)
+    assert any('RUN CANCELLED' in text for text in texts)
+
+
+def test_cancelling_queued_run_compresses_log(app, app_context):
+    app.config['LOG_COMPRESSION'] = 'zlib'
+    run = RunService.create_run(None, 'user@example.com')
+    db.session.commit()
+
+    assert LibreLaneService.cancel_run(run.id)
+
+    run = get_run(run.id)
+    assert run.status == RunStatus.CANCELLED
+    assert run.log_compressed
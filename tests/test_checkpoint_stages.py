@@ -0,0 +1,129 @@
+import os
+import json
+import stat
+
+import pytest
+
+from app import db
+from app.models.run import Run, RunStage, RunStatus
+from app.services import checkpoint_service
+from app.services.checkpoint_service import STAGES, CheckpointService
+from app.services.librelane_service import LibreLaneService
+from app.services.run_service import RunService
+
+# Step directories of a LibreLane Classic flow run, in the order they are created
+CLASSIC_STEPS = (
+    'Verilator.Lint', 'Checker.LintTimingConstructs', 'Checker.LintErrors', 'Checker.LintWarnings',
+    'Yosys.JsonHeader', 'Yosys.Synthesis', 'Checker.YosysUnmappedCells', 'Checker.YosysSynthChecks',
+    'Checker.NetlistAssignStatements', 'OpenROAD.CheckSDCFiles', 'OpenROAD.CheckMacroInstances',
+    'OpenROAD.STAPrePNR', 'OpenROAD.Floorplan', 'Odb.CheckMacroAntennaProperties',
+    'Odb.SetPowerConnections', 'OpenROAD.GlobalPlacement', 'OpenROAD.DetailedPlacement',
+    'OpenROAD.CTS', 'OpenROAD.GlobalRouting', 'OpenROAD.DetailedRouting', 'OpenROAD.RCX',
+    'OpenROAD.STAPostPNR', 'OpenROAD.IRDropReport', 'Magic.StreamOut', 'KLayout.DRC',
+)
+RUN_TAG = 'RUN_2026-10-19_10-00-00'
+
+# Prints LibreLane's console lines (no `=== STAGE ===` markers) and creates its step directories
+FAKE_LIBRELANE = '''#!/bin/sh
+while [ $# -gt 0 ]; do
+    [ "$1" = "--run-dir" ] && run_dir="$2"
+    shift
+done
+n=0
+for step in {steps}; do
+    n=$((n + 1))
+    dir="$run_dir/runs/{tag}/$(printf %02d $n)-$(echo $step | tr 'A-Z.' 'a-z-')"
+    echo "[10:00:00] VERBOSE  Running '$step' at '$dir'…"
+    mkdir -p "$dir"
+    echo '{{"step": "'$step'"}}' > "$dir/state_out.json"
+done
+echo "[10:00:01] INFO     Flow complete."
+'''
+
+
+def make_step_dirs(run_dir, steps):
+    for number, step in enumerate(steps, 1):
+        path = os.path.join(run_dir, 'runs', RUN_TAG, f"{number:02d}-{step.lower().replace('.', '-')}")
+        os.makedirs(path)
+        with open(os.path.join(path, 'state_out.json'), 'w') as f:
+            json.dump({'step': step}, f)
+
+
+def create_run(app):
+    run = RunService.create_run(None, 'user@example.com')
+    run.config_filename = 'config.json'
+    db.session.commit()
+    project_dir = RunService.get_project_folder(run.id)
+    os.makedirs(project_dir)
+    with open(os.path.join(project_dir, 'config.json'), 'w') as f:
+        json.dump({'DESIGN_NAME': 'top'}, f)
+    return run
+
+
+def test_started_stages_follow_step_directories(app, app_context, tmp_path):
+    run_dir = str(tmp_path / 'run')
+    os.makedirs(run_dir)
+    assert CheckpointService.started_stages(run_dir) == []
+
+    make_step_dirs(run_dir, CLASSIC_STEPS[:14])
+    assert CheckpointService.started_stages(run_dir) == [RunStage.SYNTHESIS, RunStage.PLACEMENT]
+
+
+def test_real_run_checkpoints_every_stage(app, app_context, tmp_path):
+    script = tmp_path / 'librelane'
+    script.write_text(FAKE_LIBRELANE.format(steps=' '.join(CLASSIC_STEPS), tag=RUN_TAG))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    app.config['LIBRELANE_COMMAND'] = str(script)
+
+    run = create_run(app)
+    RunService.claim_run(run.id, 'test-worker', 60)
+    LibreLaneService._librelane(run.id)
+
+    run = db.session.get(Run, run.id, populate_existing=True)
+    assert run.status == RunStatus.COMPLETED
+    assert run.completed_stages_list == [stage.value for stage in STAGES]
+    assert CheckpointService.list_checkpoints(run.id) == list(STAGES)
+    assert CheckpointService.resumable_stages(run.id) == list(STAGES)
+
+    # Synthesis ends where the first placement step (13-openroad-floorplan) begins
+    manifest = CheckpointService.load(run.id, RunStage.SYNTHESIS)
+    assert f'runs/{RUN_TAG}/06-yosys-synthesis/state_out.json' in manifest['paths']
+    assert not any('13-openroad-floorplan' in path for path in manifest['paths'])
+    assert manifest['state'] == f'runs/{RUN_TAG}/12-openroad-staprepnr/state_out.json'
+
+
+def test_rerun_starts_from_stage_step(app, app_context, tmp_path):
+    run = create_run(app)
+    run_dir = RunService.get_project_folder(run.id)
+    make_step_dirs(run_dir, CLASSIC_STEPS)
+    for stage in STAGES:
+        CheckpointService.save(run.id, stage)
+    run.status = RunStatus.COMPLETED
+    db.session.commit()
+
+    rerun = CheckpointService.create_rerun(run, RunStage.ROUTING)
+
+    assert rerun.rerun_from_stage == RunStage.ROUTING
+    assert CheckpointService.stage_step(RunStage.ROUTING) == 'OpenROAD.GlobalRouting'
+    assert CheckpointService.initial_state(rerun).endswith(
+        f'runs/{RUN_TAG}/18-openroad-cts/state_out.json'
+    )
+
+
+def test_failed_rerun_leaves_no_run_directory(app, app_context, tmp_path, monkeypatch):
+    run = create_run(app)
+    make_step_dirs(RunService.get_project_folder(run.id), CLASSIC_STEPS)
+    CheckpointService.save(run.id, RunStage.SYNTHESIS)
+    run.status = RunStatus.COMPLETED
+    db.session.commit()
+
+    def fail(source, destination):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(checkpoint_service, 'link_or_copy', fail)
+
+    next_id = run.id + 1
+    with pytest.raises(OSError):
+        CheckpointService.create_rerun(run, RunStage.PLACEMENT)
+
+    assert db.session.get(Run, next_id) is None
+    assert not os.path.exists(RunService.get_project_folder(next_id))
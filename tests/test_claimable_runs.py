@@ -0,0 +1,23 @@
+from app.services.run_service import RunService
+
+
+def test_prefetch_is_bounded_per_email(app, app_context):
+    app.config['USER_MAX_ACTIVE_RUNS'] = 0
+    app.config['USER_DAILY_RUN_QUOTA'] = 0
+    busy = [RunService.create_run(None, 'busy@example.com').id for _ in range(30)]
+    other = RunService.create_run(None, 'other@example.com').id
+
+    runs = RunService.get_claimable_runs(limit=10, per_email=5)
+
+    assert [run.id for run in runs] == [busy[0], other] + busy[1:5]
+
+
+def test_prefetch_interleaves_users(app, app_context):
+    app.config['USER_MAX_ACTIVE_RUNS'] = 0
+    app.config['USER_DAILY_RUN_QUOTA'] = 0
+    first = [RunService.create_run(None, 'a@example.com').id for _ in range(3)]
+    second = RunService.create_run(None, 'b@example.com').id
+
+    runs = RunService.get_claimable_runs(limit=3)
+
+    assert [run.id for run in runs] == [first[0], second, first[1]]
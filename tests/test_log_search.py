@@ -0,0 +1,46 @@
+import re
+import time
+
+import pytest
+
+from app.services import log_service
+from app.services.log_service import LogService
+
+LONG_LINE = 'a' * 3000
+
+
+@pytest.fixture(autouse=True)
+def without_re2(monkeypatch):
+    monkeypatch.setattr(log_service, 're2', None)
+
+
+@pytest.mark.parametrize('pattern', [
+    '.*.*X',
+    '[ab]{1,60}[ab]{1,60}[ab]{1,60}c',
+    '(a+)+$',
+    r'(\w+)\1',
+    r'\S+\s+',
+])
+def test_backtracking_patterns_are_rejected(pattern):
+    with pytest.raises(re.error):
+        LogService._compile_search(pattern)
+
+
+@pytest.mark.parametrize('pattern', [
+    'error.*stage',
+    r'\[\d{2}:\d{2}:\d{2}\] (ERROR|WARN)',
+    r'\d+[a-z]{1,60}X',
+    '[^x]*y',
+])
+def test_allowed_patterns_match_quickly(app, app_context, pattern):
+    matcher = LogService._matcher(pattern, regex=True)
+    started = time.monotonic()
+    matcher(LONG_LINE)
+    matcher('1' * 3000)
+    assert time.monotonic() - started < 0.5
+
+
+def test_allowed_pattern_still_matches(app, app_context):
+    matcher = LogService._matcher(r'\[\d{2}:\d{2}:\d{2}\] (ERROR|WARN)', regex=True)
+    assert matcher('[10:00:00] ERROR    Flow failed')
+    assert not matcher('[10:00:00] INFO     Flow complete.')
@@ -0,0 +1,122 @@
+import socketserver
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models.session import Session
+from app.services.mail_service import MailService
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib; the first `server.failures` messages get a 451"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost ESMTP test')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip('<> '))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in iter(self.rfile.readline, b''):
+                    if raw == b'.\r\n':
+                        break
+                    data.append(raw)
+                self.server.attempts += 1
+                if self.server.failures:
+                    self.server.failures -= 1
+                    self.reply('451 Try again later')
+                else:
+                    self.server.messages.append((recipients, b''.join(data).decode()))
+                    self.reply('250 Queued')
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(app):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.attempts = 0
+    server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app.config.update(
+        MAIL_ENABLED=True,
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=server.server_address[1],
+        MAIL_USE_TLS=False,
+        MAIL_USE_SSL=False,
+        MAIL_USERNAME=None,
+        MAIL_TIMEOUT=5,
+        MAIL_IDLE_TIMEOUT=0.2,
+        MAIL_RETRY_BACKOFF=0.05,
+    )
+    MailService.init_app(app)
+    MailService._pending = []
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    MailService.flush(timeout=1.0)
+    MailService._config = None
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_magic_link_is_delivered(app, smtp_server):
+    with app.test_request_context():
+        assert MailService.send_magic_link('user@example.com', 'http://localhost/login/token', datetime.utcnow())
+
+    assert wait_for(lambda: smtp_server.messages)
+    recipients, data = smtp_server.messages[0]
+    assert recipients == ['user@example.com']
+    assert 'To: user@example.com' in data
+
+
+def test_delivery_is_retried_after_failure(app, app_context, smtp_server):
+    smtp_server.failures = 2
+    assert MailService.send('user@example.com', 'Subject', 'Body')
+
+    assert wait_for(lambda: smtp_server.messages)
+    assert smtp_server.attempts == 3
+    assert len(smtp_server.messages) == 1
+
+
+def test_line_break_in_recipient_is_refused(app, app_context, smtp_server):
+    assert not MailService.send('user@example.com\r\nBcc: other@example.com', 'Subject', 'Body')
+    assert not MailService._pending
+
+
+def test_login_rejects_line_break_in_email(app, smtp_server):
+    response = app.test_client().post('/', data={'email': 'user@example.com\r\nBcc: other@example.com'})
+
+    assert response.status_code == 200
+    assert not MailService._pending
+    with app.app_context():
+        assert Session.query.count() == 0
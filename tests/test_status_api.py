@@ -0,0 +1,32 @@
+from sqlalchemy import event
+
+from app import db
+from app.services.run_service import RunService
+from tests.utils import login
+
+
+def test_status_poll_does_not_read_the_log(app):
+    client = login(app, 'a@example.com')
+    with client.session_transaction() as flask_session:
+        session_id = flask_session['session_id']
+    with app.app_context():
+        run = RunService.create_run(session_id, 'a@example.com')
+        RunService.update_run_logs(run.id, log_content='x' * 100000)
+        run_id = run.id
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(f'/api/{run_id}/status')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    assert response.get_json()['id'] == run_id
+    assert not any('log_content' in statement for statement in statements)
@@ -0,0 +1,11 @@
+from app.services.auth_service import AuthService
+
+
+def login(app, email):
+    """Test client logged in through a magic link"""
+    client = app.test_client()
+    with app.app_context():
+        token = AuthService.create_session(email).token
+    response = client.get(f'/login/{token}')
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,12 @@
+from app import create_app, db
+from app.services.librelane_service import LibreLaneService
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+
+    LibreLaneService.run_worker(app)